@@ -31,6 +31,18 @@ ROOT_HELPER_OPTS = [
                help=_('Root helper application.')),
 ]
 
+ROOT_HELPER_DAEMON_OPTS = [
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Command starting a rootwrap daemon, e.g. "sudo '
+                      'neutron-rootwrap-daemon /etc/neutron/rootwrap.conf". '
+                      'When set, commands requiring root privileges are run '
+                      'through this long-lived daemon instead of spawning '
+                      'root_helper for each of them.')),
+    cfg.IntOpt('root_helper_daemon_concurrency', default=16,
+               help=_('Maximum number of commands run concurrently through '
+                      'the rootwrap daemon.')),
+]
+
 AGENT_STATE_OPTS = [
     cfg.FloatOpt('report_interval', default=4,
                  help=_('Seconds between nodes reporting state to server; '
@@ -80,6 +92,7 @@ def register_root_helper(conf):
     # The first call is to ensure backward compatibility
     conf.register_opts(ROOT_HELPER_OPTS)
     conf.register_opts(ROOT_HELPER_OPTS, 'AGENT')
+    conf.register_opts(ROOT_HELPER_DAEMON_OPTS, 'AGENT')
 
 
 def register_agent_state_opts_helper(conf):
@@ -60,6 +60,16 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.IntOpt('sync_page_size', default=100,
+                   help=_('Number of networks retrieved by each call to the '
+                          'server during the sync process. 0 retrieves all '
+                          'the networks at once.')),
+        cfg.FloatOpt('event_coalesce_delay', default=0.5,
+                     help=_("Seconds to wait after a port or subnet event "
+                            "before updating the DHCP configuration of its "
+                            "network, so that the events received meanwhile "
+                            "are handled by a single update. 0 updates "
+                            "immediately.")),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -71,6 +81,10 @@ class DhcpAgent(manager.Manager):
         self.needs_resync = False
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        # The networks whose DHCP configuration has to be updated once the
+        # event_coalesce_delay expired, mapped to the update to do: either
+        # 'reload_allocations' from the cache or 'refresh' from the server
+        self.dirty_networks = {}
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
@@ -149,9 +163,12 @@ class DhcpAgent(manager.Manager):
         LOG.info(_('Synchronizing state'))
         pool = eventlet.GreenPool(cfg.CONF.num_sync_threads)
         known_network_ids = set(self.cache.get_network_ids())
+        # All the networks are configured from their current state
+        self.dirty_networks = {}
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
+            active_networks = self.plugin_rpc.get_active_networks_info(
+                page_size=self.conf.sync_page_size)
             active_network_ids = set(network.id for network in active_networks)
             for deleted_id in known_network_ids - active_network_ids:
                 try:
@@ -277,7 +294,7 @@ class DhcpAgent(manager.Manager):
     def subnet_update_end(self, context, payload):
         """Handle the subnet.update.end notification event."""
         network_id = payload['subnet']['network_id']
-        self.refresh_dhcp_helper(network_id)
+        self.mark_network_dirty(network_id, 'refresh')
 
     # Use the update handler for the subnet create event.
     subnet_create_end = subnet_update_end
@@ -288,7 +305,7 @@ class DhcpAgent(manager.Manager):
         subnet_id = payload['subnet_id']
         network = self.cache.get_network_by_subnet_id(subnet_id)
         if network:
-            self.refresh_dhcp_helper(network.id)
+            self.mark_network_dirty(network.id, 'refresh')
 
     @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
@@ -297,7 +314,7 @@ class DhcpAgent(manager.Manager):
         network = self.cache.get_network_by_id(updated_port.network_id)
         if network:
             self.cache.put_port(updated_port)
-            self.call_driver('reload_allocations', network)
+            self.mark_network_dirty(network.id, 'reload_allocations')
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -309,8 +326,41 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
+            self.mark_network_dirty(network.id, 'reload_allocations')
+
+    def mark_network_dirty(self, network_id, action):
+        """Update the DHCP configuration of a network after a delay.
+
+        The events received for the network until event_coalesce_delay
+        expired are handled by a single update. Refreshing the network
+        from the server supersedes reloading its allocations.
+        """
+        if self.conf.event_coalesce_delay <= 0:
+            self._update_network(network_id, action)
+            return
+        if not self.dirty_networks:
+            eventlet.spawn_after(self.conf.event_coalesce_delay,
+                                 self._process_dirty_networks)
+        if self.dirty_networks.get(network_id) != 'refresh':
+            self.dirty_networks[network_id] = action
+
+    def _update_network(self, network_id, action):
+        if action == 'refresh':
+            self.refresh_dhcp_helper(network_id)
+            return
+        # The network may have been disabled in the meantime
+        network = self.cache.get_network_by_id(network_id)
+        if network:
             self.call_driver('reload_allocations', network)
 
+    @utils.synchronized('dhcp-agent')
+    def _process_dirty_networks(self):
+        dirty_networks, self.dirty_networks = self.dirty_networks, {}
+        pool = eventlet.GreenPool(self.conf.num_sync_threads)
+        for network_id, action in dirty_networks.iteritems():
+            pool.spawn(self._update_network, network_id, action)
+        pool.waitall()
+
     def enable_isolated_metadata_proxy(self, network):
 
         # The proxy might work for either a single network
@@ -384,13 +434,37 @@ class DhcpPluginApi(proxy.RpcProxy):
         self.host = cfg.CONF.host
         self.use_namespaces = use_namespaces
 
-    def get_active_networks_info(self):
-        """Make a remote process call to retrieve all network info."""
-        networks = self.call(self.context,
+    def get_active_networks_info(self, page_size=0):
+        """Make remote process calls to retrieve all network info.
+
+        With a page_size, the networks are retrieved page_size at a time.
+        """
+        if not page_size:
+            networks = self.call(self.context,
+                                 self.make_msg('get_active_networks_info',
+                                               host=self.host),
+                                 topic=self.topic)
+            return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
+
+        networks = []
+        network_ids = set()
+        marker = None
+        while True:
+            page = self.call(self.context,
                              self.make_msg('get_active_networks_info',
-                                           host=self.host),
+                                           host=self.host,
+                                           limit=page_size,
+                                           marker=marker),
                              topic=self.topic)
-        return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
+            # A server which doesn't support paging ignores limit and
+            # marker and returns all the networks each time
+            page = [n for n in page if n['id'] not in network_ids]
+            networks.extend(dhcp.NetModel(self.use_namespaces, n)
+                            for n in page)
+            network_ids.update(n['id'] for n in page)
+            if len(page) != page_size:
+                return networks
+            marker = page[-1]['id']
 
     def get_network_info(self, network_id):
         """Make a remote process call to retrieve network info."""
@@ -85,6 +85,23 @@ class FirewallDriver(object):
         """Stop filtering port."""
         raise NotImplementedError()
 
+    def update_security_group_rules(self, sg_id, sg_rules):
+        """Update the rules of a security group.
+
+        Only called for drivers matching the members of the remote groups
+        by themselves, the rules of the security groups of a port are then
+        not part of the port.
+        """
+        pass
+
+    def update_security_group_members(self, sg_id, sg_members):
+        """Update the member IPs of a remote security group.
+
+        Only called for drivers matching the members of the remote groups
+        by themselves, sg_members maps ethertypes to lists of member IPs.
+        """
+        pass
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule."""
         pass
@@ -13,7 +13,11 @@
 #    under the License.
 #
 
+import datetime
+import random
+
 import eventlet
+from eventlet import queue
 import netaddr
 from oslo.config import cfg
 
@@ -32,7 +36,6 @@ from neutron import context
 from neutron import manager
 from neutron.openstack.common import excutils
 from neutron.openstack.common import importutils
-from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
@@ -40,6 +43,7 @@ from neutron.openstack.common import processutils
 from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import service
+from neutron.openstack.common import timeutils
 from neutron import service as neutron_service
 from neutron.services.firewall.agents.l3reference import firewall_l3_agent
 
@@ -47,9 +51,13 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
-RPC_LOOP_INTERVAL = 1
 FLOATING_IP_CIDR_SUFFIX = '/32'
 
+# Lower value is higher priority
+PRIORITY_RPC = 0
+PRIORITY_SYNC_ROUTERS_TASK = 1
+DELETE_ROUTER = 1
+
 
 class L3PluginApi(proxy.RpcProxy):
     """Agent side of the l3 agent RPC API.
@@ -57,6 +65,8 @@ class L3PluginApi(proxy.RpcProxy):
     API version history:
         1.0 - Initial version.
         1.1 - Floating IP operational status updates
+        1.2 - Retrieval of the ids of the routers hosted by the agent
+        1.3 - Retrieval of the routers whose revision changed
 
     """
 
@@ -67,12 +77,33 @@ class L3PluginApi(proxy.RpcProxy):
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.host = host
 
-    def get_routers(self, context, router_ids=None):
-        """Make a remote process call to retrieve the sync data for routers."""
+    def get_routers(self, context, router_ids=None, revisions=None):
+        """Make a remote process call to retrieve the sync data for routers.
+
+        When the revisions of the routers held by the agent are given, only
+        the routers whose revision changed are returned.
+        """
+        if revisions is None:
+            return self.call(context,
+                             self.make_msg('sync_routers', host=self.host,
+                                           router_ids=router_ids),
+                             topic=self.topic)
         return self.call(context,
                          self.make_msg('sync_routers', host=self.host,
-                                       router_ids=router_ids),
-                         topic=self.topic)
+                                       router_ids=router_ids,
+                                       revisions=revisions),
+                         topic=self.topic,
+                         version='1.3')
+
+    def get_router_ids(self, context):
+        """Make a remote process call to retrieve the ids of the routers.
+
+        Only the ids of the routers scheduled to this agent are returned.
+        """
+        return self.call(context,
+                         self.make_msg('get_router_ids', host=self.host),
+                         topic=self.topic,
+                         version='1.2')
 
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
@@ -105,6 +136,8 @@ class RouterInfo(object):
         self._snat_action = None
         self.internal_ports = []
         self.floating_ips = set()
+        # revision of the router data last processed successfully
+        self.revision = None
         self.root_helper = root_helper
         self.use_namespaces = use_namespaces
         # Invoke the setter for establishing initial SNAT action
@@ -147,6 +180,113 @@ class RouterInfo(object):
         self._snat_action = None
 
 
+class RouterUpdate(object):
+    """Encapsulates a router update.
+
+    Updates are ordered by priority first, and then by the time they were
+    made, so that they can be queued in a priority queue.
+    """
+
+    def __init__(self, router_id, priority,
+                 action=None, router=None, timestamp=None):
+        self.priority = priority
+        self.timestamp = timestamp or timeutils.utcnow()
+        self.id = router_id
+        self.action = action
+        self.router = router
+
+    def __lt__(self, other):
+        if self.priority != other.priority:
+            return self.priority < other.priority
+        return self.timestamp < other.timestamp
+
+
+class ExclusiveRouterProcessor(object):
+    """Manages the processing of the updates of one router.
+
+    The first processor created for a router becomes its master: the
+    updates queued by the other processors of this router are handed over
+    to it, so that a router is only ever processed by one worker at a time.
+    Updates made before the router data was last fetched are redundant and
+    are skipped.
+    """
+
+    _masters = {}
+    _router_timestamps = {}
+
+    def __init__(self, router_id):
+        self._router_id = router_id
+
+        if router_id not in self._masters:
+            self._masters[router_id] = self
+            self._queue = []
+
+        self._master = self._masters[router_id]
+
+    def _i_am_master(self):
+        return self == self._master
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self._i_am_master():
+            del self._masters[self._router_id]
+
+    def _get_router_data_timestamp(self):
+        return self._router_timestamps.get(self._router_id,
+                                           datetime.datetime.min)
+
+    def fetched_and_processed(self, timestamp):
+        """Records the time of the router data that was last processed."""
+        if timestamp > self._get_router_data_timestamp():
+            self._router_timestamps[self._router_id] = timestamp
+
+    def queue_update(self, update):
+        self._master._queue.append(update)
+
+    def updates(self):
+        """Yields the updates of the router to process.
+
+        Only the master yields updates, including the ones handed over by
+        the other processors while it was processing the router.
+        """
+        while self._i_am_master():
+            if not self._queue:
+                return
+            update = self._queue.pop()
+            if update.timestamp < self._get_router_data_timestamp():
+                LOG.debug(_("Skipping outdated update for router %s"),
+                          update.id)
+                continue
+            yield update
+
+
+class RouterProcessingQueue(object):
+    """Priority queue of the router updates waiting to be processed."""
+
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+
+    def add(self, update):
+        self._queue.put(update)
+
+    def each_update_to_next_router(self):
+        """Yields the updates of the next router to process.
+
+        Blocks until an update is available.
+        """
+        next_update = self._queue.get()
+
+        with ExclusiveRouterProcessor(next_update.id) as rp:
+            # Queue the update whether this is the master or not.
+            rp.queue_update(next_update)
+
+            # Only the master processes the updates of a router
+            for update in rp.updates():
+                yield (rp, update)
+
+
 class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     """Manager for L3NatAgent
 
@@ -190,6 +330,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Maximum number of routers processed "
+                          "concurrently.")),
+        cfg.IntOpt('sync_routers_chunk_size', default=64,
+                   help=_("Number of routers fetched per request when "
+                          "synchronizing all the routers of the agent.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -216,16 +362,13 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         self.context = context.get_admin_context_without_session()
         self.plugin_rpc = L3PluginApi(topics.L3PLUGIN, host)
         self.fullsync = True
-        self.updated_routers = set()
-        self.removed_routers = set()
-        self.sync_progress = False
+        # Only the routers whose revision changed are fetched on resync
+        self.sync_revisions_supported = True
 
         self._delete_stale_namespaces = (self.conf.use_namespaces and
                                          self.conf.router_delete_namespaces)
 
-        self.rpc_loop = loopingcall.FixedIntervalLoopingCall(
-            self._rpc_loop)
-        self.rpc_loop.start(interval=RPC_LOOP_INTERVAL)
+        self._queue = RouterProcessingQueue()
         super(L3NATAgent, self).__init__(conf=self.conf)
 
         self.target_ex_net_id = None
@@ -246,13 +389,13 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             LOG.error(msg)
             raise SystemExit(msg)
 
-    def _cleanup_namespaces(self, routers):
+    def _cleanup_namespaces(self, router_ids):
         """Destroy stale router namespaces on host when L3 agent restarts
 
         This routine is called when self._delete_stale_namespaces is True.
 
-        The argument routers is the list of routers that are recorded in
-        the database as being hosted on this node.
+        The argument router_ids is the list of the ids of the routers that
+        are recorded in the database as being hosted on this node.
         """
         try:
             root_ip = ip_lib.IPWrapper(self.root_helper)
@@ -260,7 +403,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             host_namespaces = root_ip.get_namespaces(self.root_helper)
             router_namespaces = set(ns for ns in host_namespaces
                                     if ns.startswith(NS_PREFIX))
-            ns_to_ignore = set(NS_PREFIX + r['id'] for r in routers)
+            ns_to_ignore = set(NS_PREFIX + router_id
+                               for router_id in router_ids)
             ns_to_destroy = router_namespaces - ns_to_ignore
         except RuntimeError:
             LOG.exception(_('RuntimeError in obtaining router list '
@@ -704,7 +848,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         LOG.debug(_('Got router deleted notification for %s'), router_id)
-        self.removed_routers.add(router_id)
+        update = RouterUpdate(router_id, PRIORITY_RPC, action=DELETE_ROUTER)
+        self._queue.add(update)
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -713,18 +858,21 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             # This is needed for backward compatibility
             if isinstance(routers[0], dict):
                 routers = [router['id'] for router in routers]
-            self.updated_routers.update(routers)
+            for id in routers:
+                update = RouterUpdate(id, PRIORITY_RPC)
+                self._queue.add(update)
 
     def router_removed_from_agent(self, context, payload):
         LOG.debug(_('Got router removed from agent :%r'), payload)
-        self.removed_routers.add(payload['router_id'])
+        update = RouterUpdate(payload['router_id'], PRIORITY_RPC,
+                              action=DELETE_ROUTER)
+        self._queue.add(update)
 
     def router_added_to_agent(self, context, payload):
         LOG.debug(_('Got router added to agent :%r'), payload)
         self.routers_updated(context, payload)
 
     def _process_routers(self, routers, all_routers=False):
-        pool = eventlet.GreenPool()
         if (self.conf.external_network_bridge and
             not ip_lib.device_exists(self.conf.external_network_bridge)):
             LOG.error(_("The external network bridge '%s' does not exist"),
@@ -766,45 +914,102 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                 self._router_added(r['id'], r)
             ri = self.router_info[r['id']]
             ri.router = r
-            pool.spawn_n(self.process_router, ri)
+            ri.revision = None
+            self.process_router(ri)
+            ri.revision = r.get('revision')
         # identify and remove routers that no longer exist
         for router_id in prev_router_ids - cur_router_ids:
-            pool.spawn_n(self._router_removed, router_id)
-        pool.waitall()
-
-    @lockutils.synchronized('l3-agent', 'neutron-')
-    def _rpc_loop(self):
-        # _rpc_loop and _sync_routers_task will not be
-        # executed in the same time because of lock.
-        # so we can clear the value of updated_routers
-        # and removed_routers
-        try:
-            LOG.debug(_("Starting RPC loop for %d updated routers"),
-                      len(self.updated_routers))
-            if self.updated_routers:
-                router_ids = list(self.updated_routers)
-                self.updated_routers.clear()
-                routers = self.plugin_rpc.get_routers(
-                    self.context, router_ids)
-                self._process_routers(routers)
-            self._process_router_delete()
-            LOG.debug(_("RPC loop successfully completed"))
-        except Exception:
-            LOG.exception(_("Failed synchronizing routers"))
-            self.fullsync = True
-
-    def _process_router_delete(self):
-        current_removed_routers = list(self.removed_routers)
-        for router_id in current_removed_routers:
             self._router_removed(router_id)
-            self.removed_routers.remove(router_id)
+
+    def _process_router_update(self):
+        for rp, update in self._queue.each_update_to_next_router():
+            LOG.debug(_("Starting router update for %s"), update.id)
+            router = update.router
+            if update.action != DELETE_ROUTER and not router:
+                try:
+                    update.timestamp = timeutils.utcnow()
+                    routers = self.plugin_rpc.get_routers(self.context,
+                                                          [update.id])
+                except Exception:
+                    LOG.exception(_("Failed to fetch router information "
+                                    "for '%s'"), update.id)
+                    self.fullsync = True
+                    continue
+
+                if routers:
+                    router = routers[0]
+
+            try:
+                if not router:
+                    self._router_removed(update.id)
+                else:
+                    self._process_routers([router])
+            except Exception:
+                LOG.exception(_("Failed processing router '%s'"), update.id)
+                self.fullsync = True
+                continue
+
+            LOG.debug(_("Finished a router update for %s"), update.id)
+            rp.fetched_and_processed(update.timestamp)
+
+    def _process_routers_loop(self):
+        LOG.debug(_("Starting _process_routers_loop"))
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
+        while True:
+            pool.spawn_n(self._process_router_update)
 
     def _router_ids(self):
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
 
+    def _fetch_routers(self, context):
+        """Fetch the routers of the agent, in chunks if possible.
+
+        Returns the fetched routers and the ids of all the routers of the
+        agent. When these ids are known beforehand, only the routers which
+        changed since they were last processed are fetched.
+        """
+        router_ids = self._router_ids()
+        if router_ids is not None:
+            routers = self.plugin_rpc.get_routers(context, router_ids)
+            return routers, [r['id'] for r in routers]
+        try:
+            router_ids = self.plugin_rpc.get_router_ids(context)
+        except rpc_common.RPCException:
+            # Servers not supporting get_router_ids return all the
+            # routers in one reply
+            LOG.debug(_("Router ids could not be retrieved, fetching "
+                        "all routers at once"))
+            routers = self.plugin_rpc.get_routers(context)
+            return routers, [r['id'] for r in routers]
+        routers = []
+        chunk_size = max(1, self.conf.sync_routers_chunk_size)
+        for i in range(0, len(router_ids), chunk_size):
+            routers.extend(self._fetch_changed_routers(
+                context, router_ids[i:i + chunk_size]))
+        return routers, router_ids
+
+    def _fetch_changed_routers(self, context, router_ids):
+        revisions = {}
+        for router_id in router_ids:
+            ri = self.router_info.get(router_id)
+            if ri and ri.revision is not None:
+                revisions[router_id] = ri.revision
+        if not revisions or not self.sync_revisions_supported:
+            return self.plugin_rpc.get_routers(context, router_ids)
+        try:
+            return self.plugin_rpc.get_routers(context, router_ids,
+                                               revisions)
+        except rpc_common.RPCException as e:
+            if not (isinstance(e, rpc_common.UnsupportedRpcVersion) or
+                    getattr(e, 'exc_type', None) == 'UnsupportedRpcVersion'):
+                raise
+            LOG.warning(_("Router revisions are not supported by the "
+                          "server, fetching all the routers on resync."))
+            self.sync_revisions_supported = False
+            return self.plugin_rpc.get_routers(context, router_ids)
+
     @periodic_task.periodic_task
-    @lockutils.synchronized('l3-agent', 'neutron-')
     def _sync_routers_task(self, context):
         if self.services_sync:
             super(L3NATAgent, self).process_services_sync(context)
@@ -812,17 +1017,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                   self.fullsync)
         if not self.fullsync:
             return
+
+        # Updates notified after this time supersede the fetched data
+        timestamp = timeutils.utcnow()
         try:
-            router_ids = self._router_ids()
-            self.updated_routers.clear()
-            self.removed_routers.clear()
-            routers = self.plugin_rpc.get_routers(
-                context, router_ids)
-
-            LOG.debug(_('Processing :%r'), routers)
-            self._process_routers(routers, all_routers=True)
-            self.fullsync = False
-            LOG.debug(_("_sync_routers_task successfully completed"))
+            routers, router_ids = self._fetch_routers(context)
         except rpc_common.RPCException:
             LOG.exception(_("Failed synchronizing routers due to RPC error"))
             self.fullsync = True
@@ -830,13 +1029,32 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
             self.fullsync = True
+            return
+
+        LOG.debug(_('Processing :%r'), routers)
+        # The routers are queued with a lower priority than the RPC
+        # notifications, which are not delayed by the resync.
+        for r in routers:
+            update = RouterUpdate(r['id'], PRIORITY_SYNC_ROUTERS_TASK,
+                                  router=r, timestamp=timestamp)
+            self._queue.add(update)
+        self.fullsync = False
+        LOG.debug(_("_sync_routers_task successfully completed"))
+
+        # Delete the routers which are no longer hosted by the agent, the
+        # ones which did not change are not fetched but still hosted
+        for router_id in set(self.router_info) - set(router_ids):
+            update = RouterUpdate(router_id, PRIORITY_SYNC_ROUTERS_TASK,
+                                  action=DELETE_ROUTER, timestamp=timestamp)
+            self._queue.add(update)
 
         # Resync is not necessary for the cleanup of stale
         # namespaces.
         if self._delete_stale_namespaces:
-            self._cleanup_namespaces(routers)
+            self._cleanup_namespaces(router_ids)
 
     def after_start(self):
+        eventlet.spawn_n(self._process_routers_loop)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -889,7 +1107,11 @@ class L3NATAgentWithStateReport(L3NATAgent):
         if report_interval:
             self.heartbeat = loopingcall.FixedIntervalLoopingCall(
                 self._report_state)
-            self.heartbeat.start(interval=report_interval)
+            # Spread over the interval the reports of the agents started at
+            # the same time
+            self.heartbeat.start(
+                interval=report_interval,
+                initial_delay=random.uniform(0, report_interval))
 
     def _report_state(self):
         LOG.debug(_("Report state task started"))
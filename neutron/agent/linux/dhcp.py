@@ -75,6 +75,7 @@ METADATA_DEFAULT_CIDR = '%s/%d' % (METADATA_DEFAULT_IP,
 METADATA_PORT = 80
 WIN2k3_STATIC_DNS = 249
 NS_PREFIX = 'qdhcp-'
+HOST_NAME_SEPARATORS = re.compile('[:.]')
 
 
 class DictModel(object):
@@ -153,6 +154,11 @@ class DhcpBase(object):
 class DhcpLocalProcess(DhcpBase):
     PORTS = []
 
+    # Content of the config files last written for each network, keyed by
+    # network id and kind, used to skip rewriting files which didn't change.
+    # It is shared by all the driver instances of the agent.
+    _conf_files = {}
+
     def _enable_dhcp(self):
         """check if there is a subnet within the network with dhcp enabled."""
         for subnet in self.network.subnets:
@@ -202,6 +208,20 @@ class DhcpLocalProcess(DhcpBase):
         confs_dir = os.path.abspath(os.path.normpath(self.conf.dhcp_confs))
         conf_dir = os.path.join(confs_dir, self.network.id)
         shutil.rmtree(conf_dir, ignore_errors=True)
+        self._conf_files.pop(self.network.id, None)
+
+    def _write_conf_file(self, kind, data):
+        """Write a config file unless it already holds data.
+
+        Returns True if the file was written.
+        """
+        file_name = self.get_conf_file_name(kind)
+        conf_files = self._conf_files.setdefault(self.network.id, {})
+        if conf_files.get(kind) == data and os.path.exists(file_name):
+            return False
+        utils.replace_file(file_name, data)
+        conf_files[kind] = data
+        return True
 
     def get_conf_file_name(self, kind, ensure_conf_dir=False):
         """Returns the file name for a given kind of config file."""
@@ -277,6 +297,13 @@ class Dnsmasq(DhcpLocalProcess):
     NEUTRON_RELAY_SOCKET_PATH_KEY = 'NEUTRON_RELAY_SOCKET_PATH'
     MINIMUM_VERSION = 2.59
 
+    # (ip_address, mac_address) of the entries of the hosts file last
+    # written for each network, keyed by network id
+    _host_leases = {}
+
+    # Whether a config file was rewritten by the last reload
+    _conf_changed = False
+
     @classmethod
     def check_version(cls):
         ver = 0
@@ -388,31 +415,41 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
+        self._conf_changed = False
         self._release_unused_leases()
         self._output_hosts_file()
         self._output_opts_file()
-        if self.active:
+        if not self.active:
+            LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
+        elif self._conf_changed:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
+            LOG.debug(_('Reloading allocations for network: %s'),
+                      self.network.id)
         else:
-            LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
-        LOG.debug(_('Reloading allocations for network: %s'), self.network.id)
+            LOG.debug(_('Allocations for network %s are unchanged, not '
+                        'reloading dnsmasq'), self.network.id)
         self.device_manager.update(self.network)
 
+    def _remove_config_files(self):
+        super(Dnsmasq, self)._remove_config_files()
+        self._host_leases.pop(self.network.id, None)
+
     def _output_hosts_file(self):
         """Writes a dnsmasq compatible hosts file."""
-        r = re.compile('[:.]')
         buf = six.StringIO()
+        leases = set()
 
         for port in self.network.ports:
             for alloc in port.fixed_ips:
-                name = 'host-%s.%s' % (r.sub('-', alloc.ip_address),
-                                       self.conf.dhcp_domain)
+                hostname = HOST_NAME_SEPARATORS.sub('-', alloc.ip_address)
+                name = 'host-%s.%s' % (hostname, self.conf.dhcp_domain)
                 set_tag = ''
                 # (dzyu) Check if it is legal ipv6 address, if so, need wrap
                 # it with '[]' to let dnsmasq to distinguish MAC address from
                 # IPv6 address.
                 ip_address = alloc.ip_address
+                leases.add((ip_address, port.mac_address))
                 if netaddr.valid_ipv6(ip_address):
                     ip_address = '[%s]' % ip_address
                 if getattr(port, 'extra_dhcp_opts', False):
@@ -426,9 +463,10 @@ class Dnsmasq(DhcpLocalProcess):
                     buf.write('%s,%s,%s\n' %
                               (port.mac_address, name, ip_address))
 
-        name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
-        return name
+        if self._write_conf_file('host', buf.getvalue()):
+            self._conf_changed = True
+        self._host_leases[self.network.id] = leases
+        return self.get_conf_file_name('host')
 
     def _read_hosts_file_leases(self, filename):
         leases = set()
@@ -440,8 +478,10 @@ class Dnsmasq(DhcpLocalProcess):
         return leases
 
     def _release_unused_leases(self):
-        filename = self.get_conf_file_name('host')
-        old_leases = self._read_hosts_file_leases(filename)
+        old_leases = self._host_leases.get(self.network.id)
+        if old_leases is None:
+            filename = self.get_conf_file_name('host')
+            old_leases = self._read_hosts_file_leases(filename)
 
         new_leases = set()
         for port in self.network.ports:
@@ -525,9 +565,9 @@ class Dnsmasq(DhcpLocalProcess):
                                                    'dns-server',
                                                    ','.join(ips)))
 
-        name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
-        return name
+        if self._write_conf_file('opts', '\n'.join(options)):
+            self._conf_changed = True
+        return self.get_conf_file_name('opts')
 
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
@@ -0,0 +1,87 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.agent.linux import utils
+from neutron.common import constants
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ipset names are limited to 31 characters, the temporary sets used to
+# replace the members of a set atomically are suffixed with SWAP_SUFFIX
+IPSET_NAME_MAX_LEN = 26
+SWAP_SUFFIX = '-new'
+IPSET_FAMILY = {constants.IPv4: 'inet',
+                constants.IPv6: 'inet6'}
+
+
+class IpsetManager(object):
+    """Wrapper for the ipset command line tool.
+
+    Keeps track of the members of the sets it manages, so that updating
+    a set only adds and deletes the IPs which changed. All the changes to
+    a set are applied with a single ipset restore call.
+    """
+
+    def __init__(self, root_helper=None, execute=None):
+        self.root_helper = root_helper
+        self.execute = execute or utils.execute
+        self.ipsets = {}
+
+    @staticmethod
+    def get_name(id, ethertype):
+        """Returns the name of the set of an id and ethertype."""
+        return ('%s%s' % (ethertype, id))[:IPSET_NAME_MAX_LEN]
+
+    def set_exists(self, set_name):
+        return set_name in self.ipsets
+
+    def set_members(self, set_name, ethertype, member_ips):
+        """Create or update a set so that its members are member_ips."""
+        member_ips = set(member_ips)
+        current_ips = self.ipsets.get(set_name)
+        if current_ips is None:
+            # The set may remain from a previous run of the agent, its
+            # content is replaced atomically by swapping it with a new set
+            swap_name = set_name + SWAP_SUFFIX
+            family = IPSET_FAMILY[ethertype]
+            lines = ['create %s hash:net family %s' % (set_name, family),
+                     'create %s hash:net family %s' % (swap_name, family),
+                     'flush %s' % swap_name]
+            lines += ['add %s %s' % (swap_name, ip) for ip in member_ips]
+            lines += ['swap %s %s' % (swap_name, set_name),
+                      'destroy %s' % swap_name]
+        else:
+            lines = ['add %s %s' % (set_name, ip)
+                     for ip in member_ips - current_ips]
+            lines += ['del %s %s' % (set_name, ip)
+                      for ip in current_ips - member_ips]
+        if lines:
+            self._restore(lines)
+        self.ipsets[set_name] = member_ips
+
+    def destroy(self, set_name):
+        """Destroy a set which is no longer referenced."""
+        try:
+            self.execute(['ipset', 'destroy', set_name],
+                         root_helper=self.root_helper)
+        except RuntimeError:
+            LOG.exception(_("Failed to destroy ipset %s"), set_name)
+            return
+        self.ipsets.pop(set_name, None)
+
+    def _restore(self, lines):
+        self.execute(['ipset', 'restore', '-exist'],
+                     process_input='\n'.join(lines) + '\n',
+                     root_helper=self.root_helper)
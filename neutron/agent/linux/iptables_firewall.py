@@ -23,11 +23,14 @@ from neutronclient.common import exceptions
 from neutronclient.v2_0 import client
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
 
 CONF = cfg.CONF
+CONF.import_opt('enable_ipset', 'neutron.agent.securitygroups_rpc',
+                'SECURITYGROUP')
 
 LOG = logging.getLogger(__name__)
 SG_CHAIN = 'sg-chain'
@@ -38,6 +41,10 @@ CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      SPOOF_FILTER: 's'}
 LINUX_DEV_LEN = 14
+DIRECTION_IP_PREFIX = {INGRESS_DIRECTION: 'source_ip_prefix',
+                       EGRESS_DIRECTION: 'dest_ip_prefix'}
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
@@ -54,6 +61,17 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._add_fallback_chain_v4v6()
         self._defer_apply = False
         self._pre_defer_filtered_ports = None
+        # remote security groups are matched with ipsets rather than one
+        # rule per member IP when enable_ipset is set
+        self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        self.ipset = ipset_manager.IpsetManager(
+            root_helper=cfg.CONF.AGENT.root_helper)
+        # rules of the security groups of the filtered ports
+        self.sg_rules = {}
+        # member IPs of the remote security groups, by ethertype
+        self.sg_members = {}
+        # ipsets referenced by the rules of the filtered ports
+        self._referenced_ipsets = set()
 
     @property
     def ports(self):
@@ -65,7 +83,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -76,7 +94,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -87,7 +105,66 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
+        self._apply()
+
+    def update_security_group_rules(self, sg_id, sg_rules):
+        """Update the rules of a security group.
+
+        The chains of the ports are rebuilt when some of them are in the
+        security group.
+        """
+        LOG.debug(_("Updating security group (%s) rules"), sg_id)
+        self.sg_rules[sg_id] = sg_rules
+        for port in self.filtered_ports.values():
+            if sg_id in port.get('security_groups', []):
+                self._remove_chains()
+                self._setup_chains()
+                self._apply()
+                break
+
+    def update_security_group_members(self, sg_id, sg_members):
+        """Update the member IPs of a remote security group.
+
+        Only the ipsets of the group are updated, the chains of the ports
+        are left untouched.
+        """
+        LOG.debug(_("Updating security group (%s) members"), sg_id)
+        self.sg_members[sg_id] = sg_members
+        for ethertype, member_ips in sg_members.items():
+            set_name = self.ipset.get_name(sg_id, ethertype)
+            if self.ipset.set_exists(set_name):
+                self.ipset.set_members(set_name, ethertype, member_ips)
+
+    def _apply(self):
         self.iptables.apply()
+        if not self._defer_apply:
+            self._remove_unused_security_groups()
+            self._remove_unused_ipsets()
+
+    def _remove_unused_security_groups(self):
+        sg_ids = set()
+        for port in self.filtered_ports.values():
+            sg_ids.update(port.get('security_groups', []))
+        remote_sg_ids = set()
+        for sg_id in set(self.sg_rules):
+            if sg_id not in sg_ids:
+                del self.sg_rules[sg_id]
+                continue
+            for rule in self.sg_rules[sg_id]:
+                if rule.get('remote_group_id'):
+                    remote_sg_ids.add(rule['remote_group_id'])
+        for port in self.filtered_ports.values():
+            for rule in port.get('security_group_rules', []):
+                if rule.get('remote_group_id'):
+                    remote_sg_ids.add(rule['remote_group_id'])
+        for sg_id in set(self.sg_members) - remote_sg_ids:
+            del self.sg_members[sg_id]
+
+    def _remove_unused_ipsets(self):
+        # Sets can only be destroyed once the rules referencing them are
+        # removed
+        for set_name in set(self.ipset.ipsets) - self._referenced_ipsets:
+            self.ipset.destroy(set_name)
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
@@ -95,6 +172,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._setup_chains_apply(self.filtered_ports)
 
     def _setup_chains_apply(self, ports):
+        self._referenced_ipsets = set()
         self._add_chain_by_name_v4v6(SG_CHAIN)
         for port in ports.values():
             self._setup_chain(port, INGRESS_DIRECTION)
@@ -190,6 +268,18 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                 for rule in port.get('security_group_rules', [])
                 if rule['direction'] == direction]
 
+    def _select_sg_rules_for_port(self, port, direction):
+        """Select the cached rules of the security groups of a port.
+
+        The rules of the remote groups match their ipsets, the rules are
+        only cached when ipsets are enabled.
+        """
+        # the rules are copied as ethertype splitting alters them
+        return [rule.copy()
+                for sg_id in port.get('security_groups', [])
+                for rule in self.sg_rules.get(sg_id, [])
+                if rule['direction'] == direction]
+
     def _setup_spoof_filter_chain(self, port, table, mac_ip_pairs, rules):
         if mac_ip_pairs:
             chain_name = self._port_chain_name(port, SPOOF_FILTER)
@@ -258,6 +348,8 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         chain_name = self._port_chain_name(port, direction)
         # select rules for current direction
         security_group_rules = self._select_sgr_by_direction(port, direction)
+        security_group_rules += self._select_sg_rules_for_port(port,
+                                                               direction)
         # split groups by ip version
         # for ipv4, iptables command is used
         # for ipv6, iptables6 command is used
@@ -356,6 +448,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            args += self._remote_group_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
 
@@ -394,6 +487,24 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                     '--%ss' % direction,
                     '%s:%s' % (port_range_min, port_range_max)]
 
+    def _remote_group_arg(self, rule):
+        # Rules of remote groups whose members were not converted to IP
+        # prefixes on server side match the ipset of the group
+        remote_group_id = rule.get('remote_group_id')
+        direction = rule.get('direction')
+        if (not self.enable_ipset or not remote_group_id or
+                rule.get(DIRECTION_IP_PREFIX.get(direction))):
+            return []
+        ethertype = rule['ethertype']
+        set_name = self.ipset.get_name(remote_group_id, ethertype)
+        if not self.ipset.set_exists(set_name):
+            member_ips = self.sg_members.get(remote_group_id, {}).get(
+                ethertype, [])
+            self.ipset.set_members(set_name, ethertype, member_ips)
+        self._referenced_ipsets.add(set_name)
+        return ['-m set', '--match-set', set_name,
+                IPSET_DIRECTION[direction]]
+
     def _ip_prefix_arg(self, direction, ip_prefix):
         #NOTE (nati) : source_group_id is converted to list of source_
         # ip_prefix in server side
@@ -418,6 +529,8 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._pre_defer_filtered_ports = None
             self._setup_chains_apply(self.filtered_ports)
             self.iptables.defer_apply_off()
+            self._remove_unused_security_groups()
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
@@ -23,6 +23,7 @@
 
 import inspect
 import os
+import time
 
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
@@ -99,6 +100,28 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # Wrapped chains changed since the last apply, and wrapped chains
+        # removed since then. Any change to an unwrapped chain or rule sets
+        # unwrapped_dirty, which requires the whole table to be rewritten.
+        self.dirty_chains = set()
+        self.removed_chains = set()
+        self.unwrapped_dirty = False
+
+    @property
+    def dirty(self):
+        return bool(self.unwrapped_dirty or self.dirty_chains or
+                    self.removed_chains)
+
+    def clear_dirty(self):
+        self.dirty_chains.clear()
+        self.removed_chains.clear()
+        self.unwrapped_dirty = False
+
+    def _mark_dirty(self, chain, wrap):
+        if wrap:
+            self.dirty_chains.add(chain)
+        else:
+            self.unwrapped_dirty = True
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -115,8 +138,10 @@ class IptablesTable(object):
         name = get_chain_name(name, wrap)
         if wrap:
             self.chains.add(name)
+            self.removed_chains.discard(name)
         else:
             self.unwrapped_chains.add(name)
+        self._mark_dirty(name, wrap)
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -155,6 +180,9 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self._mark_dirty(name, wrap)
+        if wrap:
+            self.removed_chains.add(name)
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -176,6 +204,9 @@ class IptablesTable(object):
             jump_snippet = '-j %s-%s' % (self.wrap_name, name)
 
         # finally, remove rules from list that have a matching jump chain
+        for rule in self.rules:
+            if jump_snippet in rule.rule:
+                self._mark_dirty(rule.chain, rule.wrap)
         self.rules = [r for r in self.rules
                       if jump_snippet not in r.rule]
 
@@ -200,6 +231,7 @@ class IptablesTable(object):
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name,
                                        tag))
+        self._mark_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s, wrap):
         if s.startswith('$'):
@@ -223,6 +255,7 @@ class IptablesTable(object):
 
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name))
+            self._mark_dirty(chain, wrap)
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
                                                       self.wrap_name))
@@ -239,6 +272,8 @@ class IptablesTable(object):
                          if rule.chain == chain and rule.wrap == wrap]
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self._mark_dirty(chain, wrap)
 
     def clear_rules_by_tag(self, tag):
         if not tag:
@@ -246,6 +281,34 @@ class IptablesTable(object):
         rules = [rule for rule in self.rules if rule.tag == tag]
         for rule in rules:
             self.rules.remove(rule)
+            self._mark_dirty(rule.chain, rule.wrap)
+
+    def get_wrapped_chains_rules(self):
+        """Return the rules of every wrapped chain, as applied.
+
+        The result maps the full chain name to the tuple of its '-A' lines,
+        with top rules first and duplicates dropped, keeping the last
+        occurrence like a full apply does.
+        """
+        chains_rules = dict(('%s-%s' % (self.wrap_name, name), ([], []))
+                            for name in self.chains)
+        for rule in self.rules:
+            if not rule.wrap:
+                continue
+            top_rules, bot_rules = chains_rules.get(
+                '%s-%s' % (self.wrap_name, rule.chain), ([], []))
+            (top_rules if rule.top else bot_rules).append(str(rule))
+        result = {}
+        for chain, (top_rules, bot_rules) in chains_rules.iteritems():
+            seen = set()
+            rules = []
+            for rule_str in reversed(top_rules + bot_rules):
+                if rule_str not in seen:
+                    seen.add(rule_str)
+                    rules.append(rule_str)
+            rules.reverse()
+            result[chain] = tuple(rules)
+        return result
 
 
 class IptablesManager(object):
@@ -284,6 +347,10 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        # Rules of the wrapped chains as last applied, keyed by command and
+        # table name. Until a table has been applied once in full, the
+        # kernel state is unknown and incremental applies are disabled.
+        self._applied_chains = {}
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -377,28 +444,107 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        Once a full apply went through, only the wrapped chains changed
+        since then are rewritten, with iptables-restore --noflush and
+        without saving the current rules first. Changes to unwrapped chains
+        or rules still trigger a full apply.
+
         """
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            self.execute(args, process_input='\n'.join(all_lines),
-                         root_helper=self.root_helper)
-        LOG.debug(_("IPTablesManager.apply completed with success"))
+            start = time.time()
+            if not any(table.dirty for table in tables.itervalues()):
+                mode = 'skipped'
+            elif (self._can_apply_incrementally(cmd, tables) and
+                  self._apply_incremental(cmd, tables)):
+                mode = 'incremental'
+            else:
+                self._apply_full(cmd, tables)
+                mode = 'full'
+            for table in tables.itervalues():
+                table.clear_dirty()
+            LOG.debug(_("IPTablesManager.apply of %(cmd)s completed with "
+                        "success (%(mode)s) in %(time).3f seconds"),
+                      {'cmd': cmd, 'mode': mode,
+                       'time': time.time() - start})
+
+    def _get_cmd_args(self, cmd, *args):
+        args = [cmd] + list(args)
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        return args
+
+    def _can_apply_incrementally(self, cmd, tables):
+        for table_name, table in tables.iteritems():
+            if (table.unwrapped_dirty or
+                    (cmd, table_name) not in self._applied_chains):
+                return False
+        return True
+
+    def _apply_full(self, cmd, tables):
+        all_tables = self.execute(self._get_cmd_args('%s-save' % cmd, '-c'),
+                                  root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        self.execute(self._get_cmd_args('%s-restore' % cmd, '-c'),
+                     process_input='\n'.join(all_lines),
+                     root_helper=self.root_helper)
+        for table_name, table in tables.iteritems():
+            self._applied_chains[(cmd, table_name)] = (
+                table.get_wrapped_chains_rules())
+
+    def _apply_incremental(self, cmd, tables):
+        """Rewrite the wrapped chains changed since the last apply.
+
+        Declaring a chain in a --noflush restore creates it, or flushes it
+        if it already exists, so each changed chain is declared and filled
+        with its whole set of rules. Chains whose rules end up identical to
+        the applied ones are left alone. Packet and byte counters of the
+        rewritten chains are reset.
+
+        :returns: False if the restore failed and a full apply is needed.
+        """
+        lines = []
+        new_applied = {}
+        for table_name, table in tables.iteritems():
+            if not table.dirty:
+                continue
+            applied = self._applied_chains[(cmd, table_name)]
+            current = table.get_wrapped_chains_rules()
+            chains, rules, removed = [], [], []
+            for name in sorted(table.dirty_chains | table.removed_chains):
+                chain = '%s-%s' % (self.wrap_name, name)
+                if chain in current:
+                    if applied.get(chain) != current[chain]:
+                        chains.append(':%s - [0:0]' % chain)
+                        rules.extend(current[chain])
+                elif chain in applied:
+                    chains.append(':%s - [0:0]' % chain)
+                    removed.append('-X %s' % chain)
+            new_applied[(cmd, table_name)] = current
+            if chains:
+                lines += (['# Generated by iptables_manager',
+                           '*%s' % table_name] + chains + rules + removed +
+                          ['COMMIT', '# Completed by iptables_manager'])
+
+        if lines:
+            try:
+                self.execute(self._get_cmd_args('%s-restore' % cmd, '-n'),
+                             process_input='\n'.join(lines) + '\n',
+                             root_helper=self.root_helper)
+            except RuntimeError:
+                LOG.warn(_("Incremental %s-restore failed, falling back to "
+                           "a full apply"), cmd)
+                return False
+        self._applied_chains.update(new_applied)
+        return True
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
@@ -14,6 +14,7 @@
 #    under the License.
 
 import distutils.version as dist_version
+import itertools
 import re
 
 from oslo.config import cfg
@@ -38,6 +39,14 @@ cfg.CONF.register_opts(OPTS)
 
 LOG = logging.getLogger(__name__)
 
+# Commands prefixing the flows of an 'ovs-ofctl --bundle add-flows' input
+BUNDLE_FLOW_COMMANDS = {'add': 'add', 'mod': 'modify', 'del': 'delete'}
+# Errors of ovs-ofctl when it or the bridge doesn't support bundles, other
+# errors are caused by the flows
+BUNDLE_UNSUPPORTED_ERRORS = ("unrecognized option '--bundle'",
+                             "version negotiation failed",
+                             "OFPBRC_BAD_TYPE")
+
 
 class VifPort:
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
@@ -105,7 +114,12 @@ class OVSBridge(BaseOVS):
         super(OVSBridge, self).__init__(root_helper)
         self.br_name = br_name
         self.defer_apply_flows = False
-        self.deferred_flows = {'add': '', 'mod': '', 'del': ''}
+        self.deferred_flows = []
+        # Whether ovs-ofctl and the bridge support bundles, None until
+        # a bundle is first applied or rejected as unsupported
+        self.bundle_supported = None
+        # Number of ovs-ofctl processes spawned, see pop_ofctl_calls()
+        self.ofctl_calls = 0
 
     def set_controller(self, controller_names):
         vsctl_command = ['--', 'set-controller', self.br_name]
@@ -155,14 +169,19 @@ class OVSBridge(BaseOVS):
         args = ["clear", table_name, record, column]
         self.run_vsctl(args)
 
-    def run_ofctl(self, cmd, args, process_input=None):
+    def run_ofctl(self, cmd, args, process_input=None, check_error=False):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
+        self.ofctl_calls += 1
         try:
             return utils.execute(full_args, root_helper=self.root_helper,
                                  process_input=process_input)
         except Exception as e:
-            LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
-                      {'cmd': full_args, 'exception': e})
+            with excutils.save_and_reraise_exception() as ctxt:
+                LOG.error(_("Unable to execute %(cmd)s. "
+                            "Exception: %(exception)s"),
+                          {'cmd': full_args, 'exception': e})
+                if not check_error:
+                    ctxt.reraise = False
 
     def count_flows(self):
         flow_list = self.run_ofctl("dump-flows", []).split("\n")[1:]
@@ -226,25 +245,28 @@ class OVSBridge(BaseOVS):
     def add_flow(self, **kwargs):
         flow_str = self.add_or_mod_flow_str(**kwargs)
         if self.defer_apply_flows:
-            self.deferred_flows['add'] += flow_str + '\n'
+            self.deferred_flows.append(('add', flow_str))
         else:
             self.run_ofctl("add-flow", [flow_str])
 
     def mod_flow(self, **kwargs):
         flow_str = self.add_or_mod_flow_str(**kwargs)
         if self.defer_apply_flows:
-            self.deferred_flows['mod'] += flow_str + '\n'
+            self.deferred_flows.append(('mod', flow_str))
         else:
             self.run_ofctl("mod-flows", [flow_str])
 
-    def delete_flows(self, **kwargs):
+    def delete_flow_str(self, **kwargs):
         kwargs['delete'] = True
         flow_expr_arr = self._build_flow_expr_arr(**kwargs)
         if "actions" in kwargs:
             flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
-        flow_str = ",".join(flow_expr_arr)
+        return ",".join(flow_expr_arr)
+
+    def delete_flows(self, **kwargs):
+        flow_str = self.delete_flow_str(**kwargs)
         if self.defer_apply_flows:
-            self.deferred_flows['del'] += flow_str + '\n'
+            self.deferred_flows.append(('del', flow_str))
         else:
             self.run_ofctl("del-flows", [flow_str])
 
@@ -253,17 +275,81 @@ class OVSBridge(BaseOVS):
         self.defer_apply_flows = True
 
     def defer_apply_off(self):
+        """Stop deferring flows and apply the deferred ones.
+
+        Returns False if some of the flows could not be applied.
+        """
         LOG.debug(_('defer_apply_off'))
-        for action, flows in self.deferred_flows.items():
-            if flows:
-                LOG.debug(_('Applying following deferred flows '
-                            'to bridge %s'), self.br_name)
-                for line in flows.splitlines():
-                    LOG.debug(_('%(action)s: %(flow)s'),
-                              {'action': action, 'flow': line})
-                self.run_ofctl('%s-flows' % action, ['-'], flows)
         self.defer_apply_flows = False
-        self.deferred_flows = {'add': '', 'mod': '', 'del': ''}
+        return self.apply_deferred_flows()
+
+    def apply_deferred_flows(self):
+        """Apply the flows deferred so far, the next ones stay deferred.
+
+        Returns False if some of the flows could not be applied.
+        """
+        flows, self.deferred_flows = self.deferred_flows, []
+        return self.apply_flows(flows)
+
+    def apply_flows(self, flows):
+        """Apply a list of (action, flow) changes in order.
+
+        Returns False if some of the flows could not be applied.
+        """
+        if not flows:
+            return True
+        LOG.debug(_('Applying following deferred flows '
+                    'to bridge %s'), self.br_name)
+        for action, flow in flows:
+            LOG.debug(_('%(action)s: %(flow)s'),
+                      {'action': action, 'flow': flow})
+        if self.bundle_supported is not False and self._apply_bundle(flows):
+            return True
+        # Without bundles, consecutive flows with the same action are
+        # applied together so that the order of the changes is kept
+        applied = True
+        for action, group in itertools.groupby(flows, lambda f: f[0]):
+            try:
+                self.run_ofctl('%s-flows' % action, ['-'],
+                               ''.join(flow + '\n' for _action, flow in group),
+                               check_error=True)
+            except Exception:
+                applied = False
+        return applied
+
+    def _apply_bundle(self, flows):
+        """Apply flow changes atomically with a single ovs-ofctl call.
+
+        Returns False if the changes could not be applied. Bundles are not
+        tried again once ovs-ofctl reported they are not supported, other
+        errors are caused by the flows and only fail this bundle.
+        """
+        full_args = ["ovs-ofctl", "--bundle", "add-flows", self.br_name, "-"]
+        process_input = ''.join('%s %s\n' % (BUNDLE_FLOW_COMMANDS[action],
+                                             flow)
+                                for action, flow in flows)
+        self.ofctl_calls += 1
+        try:
+            utils.execute(full_args, root_helper=self.root_helper,
+                          process_input=process_input)
+        except RuntimeError as e:
+            if any(error in str(e) for error in BUNDLE_UNSUPPORTED_ERRORS):
+                LOG.info(_("Bundles not supported by bridge %(br)s, flows "
+                           "will be applied per action: %(exception)s"),
+                         {'br': self.br_name, 'exception': e})
+                self.bundle_supported = False
+            else:
+                LOG.error(_("Unable to execute %(cmd)s, the flows will be "
+                            "applied per action. Exception: %(exception)s"),
+                          {'cmd': full_args, 'exception': e})
+            return False
+        self.bundle_supported = True
+        return True
+
+    def pop_ofctl_calls(self):
+        """Return the number of ovs-ofctl processes since the last call."""
+        calls, self.ofctl_calls = self.ofctl_calls, 0
+        return calls
 
     def add_tunnel_port(self, port_name, remote_ip, local_ip,
                         tunnel_type=p_const.TYPE_GRE,
@@ -485,6 +571,34 @@ class OVSBridge(BaseOVS):
             raise Exception(msg)
 
 
+class DeferredOVSBridge(object):
+    """Flow changes of a bridge queued apart from its own deferral.
+
+    Lets a caller apply a set of flow changes together while another one
+    is deferring the flows of the same bridge.
+    """
+
+    def __init__(self, br):
+        self.br = br
+        self.deferred_flows = []
+
+    def add_flow(self, **kwargs):
+        self.deferred_flows.append(('add',
+                                    self.br.add_or_mod_flow_str(**kwargs)))
+
+    def mod_flow(self, **kwargs):
+        self.deferred_flows.append(('mod',
+                                    self.br.add_or_mod_flow_str(**kwargs)))
+
+    def delete_flows(self, **kwargs):
+        self.deferred_flows.append(('del', self.br.delete_flow_str(**kwargs)))
+
+    def apply_flows(self):
+        """Apply the queued flows, returning False on error."""
+        flows, self.deferred_flows = self.deferred_flows, []
+        return self.br.apply_flows(flows)
+
+
 def get_bridge_for_iface(root_helper, iface):
     args = ["ovs-vsctl", "--timeout=%d" % cfg.CONF.ovs_vsctl_timeout,
             "iface-to-br", iface]
@@ -17,6 +17,7 @@
 import eventlet
 
 from neutron.agent.linux import async_process
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
@@ -61,23 +62,42 @@ class OvsdbMonitor(async_process.AsyncProcess):
             # stop the monitor.
 
 
+def _decode_value(value):
+    """Convert an ovsdb JSON value to the matching python value.
+
+    Maps are returned as dicts and sets as lists, e.g. an unassigned
+    ofport is reported as ["set", []] and returned as [].
+    """
+    if isinstance(value, list) and len(value) == 2:
+        if value[0] == 'map':
+            return dict(value[1])
+        if value[0] == 'set':
+            return value[1]
+    return value
+
+
 class SimpleInterfaceMonitor(OvsdbMonitor):
     """Monitors the Interface table of the local host's ovsdb for changes.
 
     The has_updates() method indicates whether changes to the ovsdb
     Interface table have been detected since the monitor started or
-    since the previous access.
+    since the previous access.  The get_events() method returns the
+    interfaces which were added, removed or modified.
     """
 
     def __init__(self, root_helper=None, respawn_interval=None):
         super(SimpleInterfaceMonitor, self).__init__(
             'Interface',
-            columns=['name', 'ofport'],
+            columns=['name', 'ofport', 'external_ids'],
             format='json',
             root_helper=root_helper,
             respawn_interval=respawn_interval,
         )
         self.data_received = False
+        self.new_events = {'added': [], 'removed': [], 'modified': []}
+        # The events are only complete once the monitor has dumped the
+        # table and no update was lost since then
+        self.events_complete = False
 
     @property
     def is_active(self):
@@ -94,7 +114,62 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         the absence of updates at the expense of potential false
         positives.
         """
-        return bool(list(self.iter_stdout())) or not self.is_active
+        return self.process_events() or not self.is_active
+
+    def process_events(self):
+        """Parse the pending output of the monitor into new_events.
+
+        Returns True if output was received.
+        """
+        received = False
+        for line in self.iter_stdout():
+            received = True
+            self._parse_update(line)
+        return received
+
+    def get_events(self):
+        """Return the Interface changes detected since the previous call.
+
+        The changes are a dict with 'added', 'removed' and 'modified'
+        lists of interfaces, each interface being a dict with 'name',
+        'ofport' and 'external_ids' keys.  None is returned when changes
+        may have been missed, i.e. when the monitor is not active or has
+        just (re)started, in which case the caller has to look at the
+        whole table.
+        """
+        self.process_events()
+        events = self.new_events
+        complete = self.events_complete and self.is_active
+        self.new_events = {'added': [], 'removed': [], 'modified': []}
+        self.events_complete = True
+        return events if complete else None
+
+    def _parse_update(self, line):
+        try:
+            update = jsonutils.loads(line)
+            headings = update['headings']
+            rows = update['data']
+        except (ValueError, KeyError, TypeError):
+            LOG.warn(_('Unable to parse ovsdb monitor output: %s'), line)
+            self.events_complete = False
+            return
+        for row in rows:
+            row = dict(zip(headings, row))
+            action = row.get('action')
+            device = {'name': row.get('name'),
+                      'ofport': _decode_value(row.get('ofport')),
+                      'external_ids': _decode_value(row.get('external_ids'))}
+            if action == 'initial':
+                # The whole table is dumped when the monitor (re)starts,
+                # updates may have been missed in the meantime
+                self.events_complete = False
+            elif action == 'insert':
+                self.new_events['added'].append(device)
+            elif action == 'delete':
+                self.new_events['removed'].append(device)
+            elif action == 'new':
+                self.new_events['modified'].append(device)
+            # 'old' rows only hold the previous value of modified columns
 
     def start(self, block=False, timeout=5):
         super(SimpleInterfaceMonitor, self).start()
@@ -105,6 +180,7 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
 
     def _kill(self, *args, **kwargs):
         self.data_received = False
+        self.events_complete = False
         super(SimpleInterfaceMonitor, self)._kill(*args, **kwargs)
 
     def _read_stdout(self):
@@ -26,6 +26,9 @@ import tempfile
 
 from eventlet.green import subprocess
 from eventlet import greenthread
+from eventlet import semaphore
+from oslo.config import cfg
+from oslo.rootwrap import client as rootwrap_client
 
 from neutron.common import utils
 from neutron.openstack.common import excutils
@@ -59,20 +62,79 @@ def create_process(cmd, root_helper=None, addl_env=None):
     return obj, cmd
 
 
+class RootwrapDaemonHelper(object):
+    """Runs commands through a long-lived rootwrap daemon.
+
+    The daemon is spawned with the root_helper_daemon command on first
+    use and applies the filters of the rootwrap configuration it was
+    started with, which saves starting a root helper per command.
+    """
+
+    # Exit code of neutron-rootwrap for commands matching no filter
+    RC_UNAUTHORIZED = 99
+
+    _clients = {}
+    _semaphore = None
+
+    @classmethod
+    def get_client(cls, daemon_cmd):
+        client = cls._clients.get(daemon_cmd)
+        if client is None:
+            client = rootwrap_client.Client(shlex.split(daemon_cmd))
+            cls._clients[daemon_cmd] = client
+        return client
+
+    @classmethod
+    def execute(cls, daemon_cmd, cmd, process_input=None, addl_env=None):
+        """Run cmd through the daemon.
+
+        Returns a tuple of the exit code, stdout and stderr of cmd.
+        """
+        if addl_env:
+            # The daemon runs commands with an empty environment
+            cmd = ['env'] + ['%s=%s' % pair for pair in addl_env.items()] + cmd
+        if cls._semaphore is None:
+            cls._semaphore = semaphore.Semaphore(
+                cfg.CONF.AGENT.root_helper_daemon_concurrency)
+        with cls._semaphore:
+            try:
+                return cls.get_client(daemon_cmd).execute(cmd,
+                                                          stdin=process_input)
+            except Exception as e:
+                # Contrary to neutron-rootwrap, the daemon raises when the
+                # command can't be run, e.g. when no filter matches
+                return cls.RC_UNAUTHORIZED, '', str(e)
+
+
+def _get_root_helper_daemon():
+    try:
+        return cfg.CONF.AGENT.root_helper_daemon
+    except (cfg.NoSuchOptError, cfg.NoSuchGroupError):
+        return None
+
+
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False):
     try:
-        obj, cmd = create_process(cmd, root_helper=root_helper,
-                                  addl_env=addl_env)
-        _stdout, _stderr = (process_input and
-                            obj.communicate(process_input) or
-                            obj.communicate())
-        obj.stdin.close()
+        root_helper_daemon = root_helper and _get_root_helper_daemon()
+        if root_helper_daemon:
+            cmd = map(str, cmd)
+            LOG.debug(_("Running command (rootwrap daemon): %s"), cmd)
+            returncode, _stdout, _stderr = RootwrapDaemonHelper.execute(
+                root_helper_daemon, cmd, process_input, addl_env)
+        else:
+            obj, cmd = create_process(cmd, root_helper=root_helper,
+                                      addl_env=addl_env)
+            _stdout, _stderr = (process_input and
+                                obj.communicate(process_input) or
+                                obj.communicate())
+            obj.stdin.close()
+            returncode = obj.returncode
         m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                        'stdout': _stdout, 'stderr': _stderr}
         LOG.debug(m)
-        if obj.returncode and check_exit_code:
+        if returncode and check_exit_code:
             raise RuntimeError(m)
     finally:
         # NOTE(termie): this appears to be necessary to let the subprocess
@@ -16,12 +16,15 @@
 #
 # @author: Mark McClain, DreamHost
 
+import collections
 import hashlib
 import hmac
+import itertools
 import os
 import socket
 
 import eventlet
+from eventlet import pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo.config import cfg
@@ -39,11 +42,62 @@ from neutron.openstack.common import excutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import service
+from neutron.openstack.common import timeutils
 from neutron import wsgi
 
 LOG = logging.getLogger(__name__)
 
 
+class InstanceCache(object):
+    """Cache of the instance and tenant ids of the metadata requesters.
+
+    The entries expire ttl seconds after being added. Once the cache holds
+    size entries, adding one evicts the oldest entry.
+    """
+
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        # key -> (expires_at, value, serial)
+        self._entries = {}
+        # (key, serial) of the entries in the order they were added, the
+        # serial tells apart the entries replaced or invalidated since
+        self._order = collections.deque()
+        self._serial = itertools.count()
+
+    def get(self, key):
+        try:
+            expires_at, value, serial = self._entries[key]
+        except KeyError:
+            return None
+        if expires_at <= timeutils.utcnow_ts():
+            del self._entries[key]
+            return None
+        return value
+
+    def _evict_oldest(self):
+        key, serial = self._order.popleft()
+        entry = self._entries.get(key)
+        if entry and entry[2] == serial:
+            del self._entries[key]
+
+    def set(self, key, value):
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.size:
+            self._evict_oldest()
+        # Drop the positions of the entries removed since they were added
+        if len(self._order) >= 2 * self.size:
+            self._order = collections.deque(
+                (k, serial) for k, serial in self._order
+                if k in self._entries and self._entries[k][2] == serial)
+        serial = next(self._serial)
+        self._entries[key] = (timeutils.utcnow_ts() + self.ttl, value, serial)
+        self._order.append((key, serial))
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+
 class MetadataProxyHandler(object):
     OPTS = [
         cfg.StrOpt('admin_user',
@@ -79,12 +133,30 @@ class MetadataProxyHandler(object):
         cfg.StrOpt('metadata_proxy_shared_secret',
                    default='',
                    help=_('Shared secret to sign instance-id request'),
-                   secret=True)
+                   secret=True),
+        cfg.IntOpt('metadata_cache_ttl', default=5,
+                   help=_('Number of seconds the instance id of a remote '
+                          'address is cached. 0 disables the cache.')),
+        cfg.IntOpt('metadata_cache_size', default=4096,
+                   help=_('Maximum number of remote addresses whose '
+                          'instance id is cached. 0 disables the cache.')),
+        cfg.IntOpt('nova_metadata_pool_size', default=16,
+                   help=_('Maximum number of connections kept open to the '
+                          'Nova metadata server.'))
     ]
 
     def __init__(self, conf):
         self.conf = conf
         self.auth_info = {}
+        self.instance_cache = None
+        if (self.conf.metadata_cache_ttl > 0 and
+                self.conf.metadata_cache_size > 0):
+            self.instance_cache = InstanceCache(self.conf.metadata_cache_ttl,
+                                                self.conf.metadata_cache_size)
+        # Each connection is only used by one request at a time
+        self.http_pool = pools.Pool(
+            max_size=self.conf.nova_metadata_pool_size,
+            create=lambda: httplib2.Http())
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -109,7 +181,12 @@ class MetadataProxyHandler(object):
 
             instance_id, tenant_id = self._get_instance_and_tenant_id(req)
             if instance_id:
-                return self._proxy_request(instance_id, tenant_id, req)
+                resp = self._proxy_request(instance_id, tenant_id, req)
+                if (isinstance(resp, webob.exc.HTTPNotFound) and
+                    self.instance_cache):
+                    # The cached instance may have been deleted
+                    self.instance_cache.invalidate(self._cache_key(req))
+                return resp
             else:
                 return webob.exc.HTTPNotFound()
 
@@ -119,7 +196,26 @@ class MetadataProxyHandler(object):
                     'Please try your request again.')
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
 
+    def _cache_key(self, req):
+        return (req.headers.get('X-Neutron-Network-ID'),
+                req.headers.get('X-Neutron-Router-ID'),
+                req.headers.get('X-Forwarded-For'))
+
     def _get_instance_and_tenant_id(self, req):
+        if not self.instance_cache:
+            return self._lookup_instance_and_tenant_id(req)
+
+        key = self._cache_key(req)
+        ids = self.instance_cache.get(key)
+        if ids is None:
+            ids = self._lookup_instance_and_tenant_id(req)
+            # Remote addresses without an instance are not cached, so that
+            # the instances are found as soon as their port exists
+            if ids[0]:
+                self.instance_cache.set(key, ids)
+        return ids
+
+    def _lookup_instance_and_tenant_id(self, req):
         qclient = self._get_neutron_client()
 
         remote_address = req.headers.get('X-Forwarded-For')
@@ -160,9 +256,9 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        with self.http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -15,12 +15,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import itertools
 
 from neutron.common import topics
 
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import rpc
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import timeutils
 
@@ -57,21 +59,72 @@ def create_consumers(dispatcher, prefix, topic_details):
 
 
 class PluginReportStateAPI(proxy.RpcProxy):
+    '''Agent side of the state report rpc API.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - The configurations of the agent may be left out of the
+              report when they didn't change.
+
+    '''
+
     BASE_RPC_API_VERSION = '1.0'
 
+    # The configurations are reported at least once every
+    # FULL_REPORT_COUNT reports, in case a report which changed them
+    # was lost
+    FULL_REPORT_COUNT = 30
+
     def __init__(self, topic):
         super(PluginReportStateAPI, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
-
-    def report_state(self, context, agent_state, use_call=False):
+        # Whether the plugin supports the 1.1 API is only known after the
+        # first report made with use_call
+        self.partial_report_supported = None
+        self.reported_configurations = None
+        self.partial_reports = 0
+
+    def _make_report(self, agent_state):
+        configurations = agent_state.get('configurations')
+        if (configurations is None or agent_state.get('start_flag') or
+                configurations != self.reported_configurations or
+                self.partial_reports >= self.FULL_REPORT_COUNT):
+            self.partial_reports = 0
+            return agent_state
+        self.partial_reports += 1
+        report = dict(agent_state)
+        del report['configurations']
+        return report
+
+    def _report_state(self, context, agent_state, use_call, version):
         msg = self.make_msg('report_state',
                             agent_state={'agent_state':
                                          agent_state},
                             time=timeutils.strtime())
         if use_call:
-            return self.call(context, msg, topic=self.topic)
+            return self.call(context, msg, topic=self.topic, version=version)
         else:
-            return self.cast(context, msg, topic=self.topic)
+            return self.cast(context, msg, topic=self.topic, version=version)
+
+    def report_state(self, context, agent_state, use_call=False):
+        if self.partial_report_supported is False or (
+                self.partial_report_supported is None and not use_call):
+            return self._report_state(context, agent_state, use_call, '1.0')
+        configurations = agent_state.get('configurations')
+        try:
+            result = self._report_state(context,
+                                        self._make_report(agent_state),
+                                        use_call, '1.1')
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.debug(_("Partial state reports are not supported by the "
+                        "plugin, reporting the full state"))
+            self.partial_report_supported = False
+            return self._report_state(context, agent_state, use_call, '1.0')
+        self.partial_report_supported = True
+        self.reported_configurations = copy.deepcopy(configurations)
+        return result
 
 
 class PluginApi(proxy.RpcProxy):
@@ -79,6 +132,8 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - get_devices_details_list, update_devices_up and
+              update_devices_down.
 
     '''
 
@@ -94,6 +149,24 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def _call_bulk(self, context, method, fallback, devices, **kwargs):
+        devices = list(devices)
+        try:
+            return self.call(context,
+                             self.make_msg(method, devices=devices, **kwargs),
+                             topic=self.topic, version='1.2')
+        except rpc_common.RemoteError as e:
+            if e.exc_type != 'UnsupportedRpcVersion':
+                raise
+            LOG.debug(_("%s is not supported by the plugin, falling back "
+                        "to one call per device"), method)
+        return [fallback(context, device, **kwargs) for device in devices]
+
+    def get_devices_details_list(self, context, devices, agent_id):
+        return self._call_bulk(context, 'get_devices_details_list',
+                               self.get_device_details, devices,
+                               agent_id=agent_id)
+
     def update_device_down(self, context, device, agent_id, host=None):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
@@ -106,6 +179,16 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id, host=host),
                          topic=self.topic)
 
+    def update_devices_down(self, context, devices, agent_id, host=None):
+        return self._call_bulk(context, 'update_devices_down',
+                               self.update_device_down, devices,
+                               agent_id=agent_id, host=host)
+
+    def update_devices_up(self, context, devices, agent_id, host=None):
+        return self._call_bulk(context, 'update_devices_up',
+                               self.update_device_up, devices,
+                               agent_id=agent_id, host=host)
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         return self.call(context,
                          self.make_msg('tunnel_sync', tunnel_ip=tunnel_ip,
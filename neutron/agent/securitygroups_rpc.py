@@ -21,15 +21,28 @@ from oslo.config import cfg
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common.rpc import common as rpc_common
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+# Version of the plugin RPC API returning the security group rules without
+# converting remote groups to IP prefixes
+SG_INFO_RPC_VERSION = "1.3"
+# Version of the plugin RPC API returning the rules of each security group
+# once rather than for each port
+SG_INFO_V2_RPC_VERSION = "1.4"
 
 security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
         default='neutron.agent.firewall.NoopFirewallDriver',
-        help=_('Driver for Security Groups Firewall'))
+        help=_('Driver for Security Groups Firewall')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=True,
+        help=_('Use ipsets to match the members of remote security groups '
+               'in the iptables firewall drivers, so that membership '
+               'changes do not rewrite the iptables rules.'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -57,6 +70,42 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version=SG_INFO_RPC_VERSION,
+                         topic=self.topic)
+
+    def security_group_info_for_devices_v2(self, context, devices):
+        LOG.debug(_("Get security groups and their rules "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices_v2',
+                                       devices=devices),
+                         version=SG_INFO_V2_RPC_VERSION,
+                         topic=self.topic)
+
+    def security_group_info_for_groups(self, context, security_groups):
+        LOG.debug(_("Get rules of security groups "
+                    "via rpc %r"), security_groups)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_groups',
+                                       security_groups=security_groups),
+                         version=SG_INFO_V2_RPC_VERSION,
+                         topic=self.topic)
+
+    def security_group_member_ips(self, context, security_groups):
+        LOG.debug(_("Get member IPs of security groups "
+                    "via rpc %r"), security_groups)
+        return self.call(context,
+                         self.make_msg('security_group_member_ips',
+                                       security_groups=security_groups),
+                         version=SG_INFO_RPC_VERSION,
+                         topic=self.topic)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -119,20 +168,60 @@ class SecurityGroupAgentRpcMixin(object):
         self.devices_to_refilter = set()
         # Flag raised when a global refresh is needed
         self.global_refresh_firewall = False
+        # Stores security groups whose rules or members should be refreshed
+        # when deferred refresh is enabled.
+        self.sg_rules_to_refresh = set()
+        self.sg_members_to_refresh = set()
+        # The firewall driver caches the rules of the security groups and
+        # matches the remote security groups members by itself, the server
+        # does not return the rules for each port
+        self.use_enhanced_rpc = (
+            getattr(self.firewall, 'enable_ipset', False) is True)
+
+    def _security_group_info_for_devices(self, device_ids):
+        if self.use_enhanced_rpc:
+            try:
+                return self.plugin_rpc.security_group_info_for_devices_v2(
+                    self.context, list(device_ids))
+            except rpc_common.RPCException as e:
+                if not (isinstance(e, rpc_common.UnsupportedRpcVersion) or
+                        getattr(e, 'exc_type', None) ==
+                        'UnsupportedRpcVersion'):
+                    raise
+                LOG.warning(_("Security group information is not supported "
+                              "by the server, falling back to one rule per "
+                              "remote security group member."))
+                self.use_enhanced_rpc = False
+        devices = self.plugin_rpc.security_group_rules_for_devices(
+            self.context, list(device_ids))
+        return {'devices': devices, 'security_groups': {},
+                'sg_member_ips': {}}
+
+    def _update_security_group_info(self, sg_info):
+        for sg_id, sg_rules in sg_info['security_groups'].items():
+            self.firewall.update_security_group_rules(sg_id, sg_rules)
+        self._update_security_group_members(sg_info['sg_member_ips'])
+
+    def _update_security_group_members(self, sg_member_ips):
+        for sg_id, sg_members in sg_member_ips.items():
+            self.firewall.update_security_group_members(sg_id, sg_members)
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        sg_info = self._security_group_info_for_devices(device_ids)
         with self.firewall.defer_apply():
-            for device in devices.values():
+            self._update_security_group_info(sg_info)
+            for device in sg_info['devices'].values():
                 self.firewall.prepare_port_filter(device)
 
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_("Security group "
                    "rule updated %r"), security_groups)
+        if self.use_enhanced_rpc:
+            self._security_group_rules_updated(security_groups)
+            return
         self._security_group_updated(
             security_groups,
             'security_groups')
@@ -140,10 +229,50 @@ class SecurityGroupAgentRpcMixin(object):
     def security_groups_member_updated(self, security_groups):
         LOG.info(_("Security group "
                    "member updated %r"), security_groups)
+        if self.use_enhanced_rpc:
+            self._security_group_members_updated(security_groups)
+            return
         self._security_group_updated(
             security_groups,
             'security_group_source_groups')
 
+    def _security_group_rules_updated(self, security_groups):
+        # Only the rules of the security groups cached by the firewall are
+        # fetched again, the ports are not
+        updated_groups = set(security_groups) & set(self.firewall.sg_rules)
+        if updated_groups:
+            if self.defer_refresh_firewall:
+                LOG.debug(_("Adding %s security groups to the list of "
+                            "security groups whose rules need to be "
+                            "refreshed"), updated_groups)
+                self.sg_rules_to_refresh |= updated_groups
+            else:
+                self.refresh_security_group_rules(updated_groups)
+
+    def refresh_security_group_rules(self, security_groups):
+        LOG.info(_("Refresh security group rules %r"), security_groups)
+        sg_info = self.plugin_rpc.security_group_info_for_groups(
+            self.context, list(security_groups))
+        with self.firewall.defer_apply():
+            self._update_security_group_info(sg_info)
+
+    def _security_group_members_updated(self, security_groups):
+        remote_groups = set(security_groups) & set(self.firewall.sg_members)
+        if remote_groups:
+            if self.defer_refresh_firewall:
+                LOG.debug(_("Adding %s security groups to the list of "
+                            "security groups whose members need to be "
+                            "refreshed"), remote_groups)
+                self.sg_members_to_refresh |= remote_groups
+            else:
+                self.refresh_security_group_members(remote_groups)
+
+    def refresh_security_group_members(self, security_groups):
+        LOG.info(_("Refresh security group members %r"), security_groups)
+        sg_member_ips = self.plugin_rpc.security_group_member_ips(
+            self.context, list(security_groups))
+        self._update_security_group_members(sg_member_ips)
+
     def _security_group_updated(self, security_groups, attribute):
         devices = []
         sec_grp_set = set(security_groups)
@@ -187,15 +316,16 @@ class SecurityGroupAgentRpcMixin(object):
             if not device_ids:
                 LOG.info(_("No ports here to refresh firewall"))
                 return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        sg_info = self._security_group_info_for_devices(device_ids)
         with self.firewall.defer_apply():
-            for device in devices.values():
+            self._update_security_group_info(sg_info)
+            for device in sg_info['devices'].values():
                 LOG.debug(_("Update port filter for %s"), device['device'])
                 self.firewall.update_port_filter(device)
 
     def firewall_refresh_needed(self):
-        return self.global_refresh_firewall or self.devices_to_refilter
+        return (self.global_refresh_firewall or self.devices_to_refilter or
+                self.sg_rules_to_refresh or self.sg_members_to_refresh)
 
     def setup_port_filters(self, new_devices, updated_devices):
         """Configure port filters for devices.
@@ -216,8 +346,12 @@ class SecurityGroupAgentRpcMixin(object):
         # losing updates occurring during firewall refresh
         devices_to_refilter = self.devices_to_refilter
         global_refresh_firewall = self.global_refresh_firewall
+        sg_rules_to_refresh = self.sg_rules_to_refresh
+        sg_members_to_refresh = self.sg_members_to_refresh
         self.devices_to_refilter = set()
         self.global_refresh_firewall = False
+        self.sg_rules_to_refresh = set()
+        self.sg_members_to_refresh = set()
         # TODO(salv-orlando): Avoid if possible ever performing the global
         # refresh providing a precise list of devices for which firewall
         # should be refreshed
@@ -233,6 +367,14 @@ class SecurityGroupAgentRpcMixin(object):
                 LOG.debug(_("Refreshing firewall for %d devices"),
                           len(updated_devices))
                 self.refresh_firewall(updated_devices)
+            if sg_rules_to_refresh:
+                LOG.debug(_("Refreshing rules of %d security groups"),
+                          len(sg_rules_to_refresh))
+                self.refresh_security_group_rules(sg_rules_to_refresh)
+            if sg_members_to_refresh:
+                LOG.debug(_("Refreshing members of %d security groups"),
+                          len(sg_members_to_refresh))
+                self.refresh_security_group_members(sg_members_to_refresh)
 
 
 class SecurityGroupAgentRpcApiMixin(object):
@@ -242,25 +384,54 @@ class SecurityGroupAgentRpcApiMixin(object):
                                      topics.SECURITY_GROUP,
                                      topics.UPDATE)
 
+    def _get_security_group_hosts(self, context, security_groups, remote):
+        """Return the hosts of the agents concerned by security groups.
+
+        :param remote: whether the hosts of the ports whose rules refer to
+        the security groups as remote groups are returned, rather than
+        the hosts of the ports of the security groups.
+
+        Plugins able to track the hosts of their ports override it, None
+        means that the hosts are unknown and all the agents are notified.
+        """
+        return None
+
+    def _cast_to_hosts(self, context, msg, topic, hosts, version=None):
+        """Cast a message to the topic.host queues of the hosts.
+
+        The message is sent as a fanout cast to all the agents when the
+        hosts are unknown.
+        """
+        if hosts is None:
+            self.fanout_cast(context, msg, version=version, topic=topic)
+            return
+        for host in hosts:
+            self.cast(context, msg, version=version,
+                      topic='%s.%s' % (topic, host))
+
     def security_groups_rule_updated(self, context, security_groups):
         """Notify rule updated security groups."""
         if not security_groups:
             return
-        self.fanout_cast(context,
-                         self.make_msg('security_groups_rule_updated',
-                                       security_groups=security_groups),
-                         version=SG_RPC_VERSION,
-                         topic=self._get_security_group_topic())
+        self._cast_to_hosts(context,
+                            self.make_msg('security_groups_rule_updated',
+                                          security_groups=security_groups),
+                            self._get_security_group_topic(),
+                            self._get_security_group_hosts(
+                                context, security_groups, remote=False),
+                            version=SG_RPC_VERSION)
 
     def security_groups_member_updated(self, context, security_groups):
         """Notify member updated security groups."""
         if not security_groups:
             return
-        self.fanout_cast(context,
-                         self.make_msg('security_groups_member_updated',
-                                       security_groups=security_groups),
-                         version=SG_RPC_VERSION,
-                         topic=self._get_security_group_topic())
+        self._cast_to_hosts(context,
+                            self.make_msg('security_groups_member_updated',
+                                          security_groups=security_groups),
+                            self._get_security_group_topic(),
+                            self._get_security_group_hosts(
+                                context, security_groups, remote=True),
+                            version=SG_RPC_VERSION)
 
     def security_groups_provider_updated(self, context):
         """Notify provider updated security groups."""
@@ -28,10 +28,12 @@ from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import constants as const
 from neutron.common import exceptions
 from neutron.notifiers import nova
+from neutron.openstack.common import excutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.notifier import api as notifier_api
 from neutron import policy
 from neutron import quota
+from neutron import wsgi
 
 
 LOG = logging.getLogger(__name__)
@@ -68,6 +70,7 @@ class Controller(object):
         self._native_bulk = self._is_native_bulk_supported()
         self._native_pagination = self._is_native_pagination_supported()
         self._native_sorting = self._is_native_sorting_supported()
+        self._native_read_only = self._is_native_read_only_supported()
         self._policy_attrs = [name for (name, info) in self._attr_info.items()
                               if info.get('required_by_policy')]
         self._publisher_id = notifier_api.publisher_id('network')
@@ -126,6 +129,18 @@ class Controller(object):
                                     % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_sorting_attr_name, False)
 
+    def _is_native_read_only_supported(self):
+        # Plugins which never write to the database when getting resources
+        # can serve the list and show requests from the slave database
+        native_read_only_attr_name = ("_%s__native_read_only_support"
+                                      % self._plugin.__class__.__name__)
+        return getattr(self._plugin, native_read_only_attr_name, False)
+
+    def _use_read_only_context(self, request):
+        if self._native_read_only:
+            request.environ['neutron.context'] = (
+                request.context.read_only_copy())
+
     def _is_visible(self, context, attr_name, data):
         action = "%s:%s" % (self._plugin_handlers[self.SHOW], attr_name)
         # Optimistically init authz_check to True
@@ -241,11 +256,21 @@ class Controller(object):
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
+            obj_list = (obj for obj in obj_list
                         if policy.check(request.context,
                                         self._plugin_handlers[self.SHOW],
                                         obj,
-                                        plugin=self._plugin)]
+                                        plugin=self._plugin))
+        if not pagination_helper.limit:
+            # The policy check and the view of each object are done while
+            # the response is serialized, those of the first object before
+            # the response starts
+            return {self._collection: wsgi.StreamedCollection(
+                self._view(request.context, obj,
+                           fields_to_strip=fields_to_add)
+                for obj in obj_list)}
+
+        obj_list = list(obj_list)
         collection = {self._collection:
                       [self._view(request.context, obj,
                                   fields_to_strip=fields_to_add)
@@ -284,6 +309,7 @@ class Controller(object):
     def index(self, request, **kwargs):
         """Returns a list of the requested entity."""
         parent_id = kwargs.get(self._parent_id_name)
+        self._use_read_only_context(request)
         return self._items(request, True, parent_id)
 
     def show(self, request, id, **kwargs):
@@ -295,6 +321,7 @@ class Controller(object):
             field_list, added_fields = self._do_field_list(
                 api_common.list_args(request, "fields"))
             parent_id = kwargs.get(self._parent_id_name)
+            self._use_read_only_context(request)
             return {self._resource:
                     self._view(request.context,
                                self._item(request,
@@ -358,35 +385,18 @@ class Controller(object):
         if self._collection in body:
             # Have to account for bulk create
             items = body[self._collection]
-            deltas = {}
-            bulk = True
         else:
             items = [body]
-            bulk = False
+        deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
             policy.enforce(request.context,
                            action,
                            item[self._resource])
-            try:
-                tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
-                if bulk:
-                    delta = deltas.get(tenant_id, 0) + 1
-                    deltas[tenant_id] = delta
-                else:
-                    delta = 1
-                kwargs = {self._resource: count + delta}
-            except exceptions.QuotaResourceUnknown as e:
-                # We don't want to quota this resource
-                LOG.debug(e)
-            else:
-                quota.QUOTAS.limit_check(request.context,
-                                         item[self._resource]['tenant_id'],
-                                         **kwargs)
+            tenant_id = item[self._resource]['tenant_id']
+            deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+        reservations = self._check_quotas(request.context, deltas)
 
         def notify(create_result):
             notifier_method = self._resource + '.create.end'
@@ -401,27 +411,64 @@ class Controller(object):
             return create_result
 
         kwargs = {self._parent_id_name: parent_id} if parent_id else {}
-        if self._collection in body and self._native_bulk:
-            # plugin does atomic bulk create operations
-            obj_creator = getattr(self._plugin, "%s_bulk" % action)
-            objs = obj_creator(request.context, body, **kwargs)
-            return notify({self._collection: [self._view(request.context, obj)
-                                              for obj in objs]})
-        else:
-            obj_creator = getattr(self._plugin, action)
-            if self._collection in body:
-                # Emulate atomic bulk behavior
-                objs = self._emulate_bulk_create(obj_creator, request,
-                                                 body, parent_id)
-                return notify({self._collection: objs})
+        try:
+            if self._collection in body and self._native_bulk:
+                # plugin does atomic bulk create operations
+                obj_creator = getattr(self._plugin, "%s_bulk" % action)
+                objs = obj_creator(request.context, body, **kwargs)
+                result = {self._collection: [self._view(request.context, obj)
+                                             for obj in objs]}
             else:
-                kwargs.update({self._resource: body})
-                obj = obj_creator(request.context, **kwargs)
-
-                self._nova_notifier.send_network_change(
-                    action, {}, {self._resource: obj})
-                return notify({self._resource: self._view(request.context,
-                                                          obj)})
+                obj_creator = getattr(self._plugin, action)
+                if self._collection in body:
+                    # Emulate atomic bulk behavior
+                    objs = self._emulate_bulk_create(obj_creator, request,
+                                                     body, parent_id)
+                    result = {self._collection: objs}
+                else:
+                    kwargs.update({self._resource: body})
+                    obj = obj_creator(request.context, **kwargs)
+
+                    self._nova_notifier.send_network_change(
+                        action, {}, {self._resource: obj})
+                    result = {self._resource: self._view(request.context,
+                                                         obj)}
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                quota.QUOTAS.cancel_reservations(request.context,
+                                                 reservations)
+        quota.QUOTAS.commit_reservations(request.context, reservations)
+        return notify(result)
+
+    def _check_quotas(self, context, deltas):
+        """Check the quota of the tenants creating resources.
+
+        :param deltas: A dictionary of the number of items each tenant is
+                       about to create.
+        :return list: the reservations made for tracked resources.
+        """
+        reservations = []
+        try:
+            tracked = quota.QUOTAS.is_tracked(self._resource)
+            for tenant_id, delta in deltas.iteritems():
+                if tracked:
+                    reservations.extend(quota.QUOTAS.make_reservation(
+                        context, tenant_id, self._plugin,
+                        **{self._resource: delta}))
+                else:
+                    count = quota.QUOTAS.count(context, self._resource,
+                                               self._plugin, self._collection,
+                                               tenant_id)
+                    quota.QUOTAS.limit_check(
+                        context, tenant_id,
+                        **{self._resource: count + delta})
+        except exceptions.QuotaResourceUnknown as e:
+            # We don't want to quota this resource
+            LOG.debug(e)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                quota.QUOTAS.cancel_reservations(context, reservations)
+        return reservations
 
     def delete(self, request, id, **kwargs):
         """Deletes the specified entity."""
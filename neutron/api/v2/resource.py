@@ -136,6 +136,14 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
+        if (isinstance(result, dict) and
+            any(isinstance(value, wsgi.StreamedCollection)
+                for value in result.itervalues())):
+            # The collections are serialized while the response is sent
+            return webob.Response(request=request, status=status,
+                                  content_type=content_type,
+                                  app_iter=serializer.serialize_iter(result))
+
         body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
@@ -53,6 +53,13 @@ core_opts = [
                help=_("The base MAC address Neutron will use for VIFs")),
     cfg.IntOpt('mac_generation_retries', default=16,
                help=_("How many times Neutron will retry MAC generation")),
+    cfg.StrOpt('ipam_driver',
+               help=_("The IPAM backend used to allocate IP addresses. "
+                      "If unset, addresses are taken from the "
+                      "availability ranges of the subnets")),
+    cfg.IntOpt('ip_generation_retries', default=16,
+               help=_("How many candidate addresses the IPAM backend "
+                      "tries when they are allocated concurrently")),
     cfg.BoolOpt('allow_bulk', default=True,
                 help=_("Allow the usage of the bulk API")),
     cfg.BoolOpt('allow_pagination', default=False,
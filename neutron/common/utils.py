@@ -193,6 +193,18 @@ def is_extension_supported(plugin, ext_alias):
         plugin, "supported_extension_aliases", [])
 
 
+def read_only_context(plugin, context):
+    """Return a context reading from the slave database if possible.
+
+    Only the plugins which never write to the database when getting
+    resources can read them from the slave database.
+    """
+    attr_name = "_%s__native_read_only_support" % plugin.__class__.__name__
+    if getattr(plugin, attr_name, False):
+        return context.read_only_copy()
+    return context
+
+
 def log_opt_values(log):
     cfg.CONF.log_opt_values(log, std_logging.DEBUG)
 
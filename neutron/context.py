@@ -153,12 +153,22 @@ class ContextBase(common_context.RequestContext):
 
 
 class Context(ContextBase):
+    # Read only contexts may read from the slave database
+    read_only = False
+
     @property
     def session(self):
         if self._session is None:
-            self._session = db_api.get_session()
+            self._session = db_api.get_session(read_only=self.read_only)
         return self._session
 
+    def read_only_copy(self):
+        """Return a copy of the context for read only database access."""
+        context = copy.copy(self)
+        context.read_only = True
+        context._session = None
+        return context
+
 
 def get_admin_context(read_deleted="no", load_admin_roles=True):
     return Context(user_id=None,
@@ -15,12 +15,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from eventlet import greenthread
 
 from oslo.config import cfg
 import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
+from neutron import context as neutron_context
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
@@ -37,6 +40,12 @@ cfg.CONF.register_opt(
                help=_("Seconds to regard the agent is down; should be at "
                       "least twice report_interval, to be sure the "
                       "agent is down for good.")))
+cfg.CONF.register_opt(
+    cfg.FloatOpt('agent_heartbeat_batch_interval', default=1,
+                 help=_("Seconds during which the heartbeats of the agents "
+                        "which didn't report a change of their "
+                        "configurations are collected to be written at once "
+                        "to the database. 0 writes them one by one.")))
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -146,13 +155,32 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         agent = self._get_agent(context, id)
         return self._make_agent_dict(agent, fields)
 
+    def update_agents_heartbeat(self, context, agent_type, hosts, timestamp):
+        """Update the heartbeat of the agents of a type on hosts at once.
+
+        Returns the hosts which have no agent of that type.
+        """
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(Agent).filter(
+                Agent.agent_type == agent_type, Agent.host.in_(hosts))
+            updated = query.update({'heartbeat_timestamp': timestamp},
+                                   synchronize_session=False)
+            if updated == len(hosts):
+                return []
+            known_hosts = set(host for host, in
+                              query.with_entities(Agent.host))
+            return [host for host in hosts if host not in known_hosts]
+
     def _create_or_update_agent(self, context, agent):
         with context.session.begin(subtransactions=True):
             res_keys = ['agent_type', 'binary', 'host', 'topic']
             res = dict((k, agent[k]) for k in res_keys)
 
-            configurations_dict = agent.get('configurations', {})
-            res['configurations'] = jsonutils.dumps(configurations_dict)
+            # The configurations are left out of the reports of the
+            # agents whose configurations didn't change
+            if 'configurations' in agent:
+                res['configurations'] = jsonutils.dumps(
+                    agent['configurations'])
             current_time = timeutils.utcnow()
             try:
                 agent_db = self._get_agent_by_type_and_host(
@@ -163,6 +191,9 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                 greenthread.sleep(0)
                 agent_db.update(res)
             except ext_agent.AgentNotFoundByTypeHost:
+                if 'configurations' not in res:
+                    # An agent can't be created from a partial report
+                    raise
                 greenthread.sleep(0)
                 res['created_at'] = current_time
                 res['started_at'] = current_time
@@ -198,13 +229,23 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
 
 
 class AgentExtRpcCallback(object):
-    """Processes the rpc report in plugin implementations."""
+    """Processes the rpc report in plugin implementations.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - The configurations of the agent may be left out of the
+              report when they didn't change.
+    """
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
     START_TIME = timeutils.utcnow()
 
     def __init__(self, plugin=None):
         self.plugin = plugin
+        # The heartbeats to write to the database, by agent type and host
+        self.heartbeats = {}
+        # The last full report of each agent, by agent type and host
+        self.agent_states = {}
 
     def report_state(self, context, **kwargs):
         """Report state from agent to server."""
@@ -216,4 +257,62 @@ class AgentExtRpcCallback(object):
         agent_state = kwargs['agent_state']['agent_state']
         if not self.plugin:
             self.plugin = manager.NeutronManager.get_plugin()
+        key = (agent_state['agent_type'], agent_state['host'])
+        if 'configurations' in agent_state:
+            self.agent_states[key] = dict(
+                (k, v) for k, v in agent_state.iteritems()
+                if k != 'start_flag')
+        elif (cfg.CONF.agent_heartbeat_batch_interval and
+                not agent_state.get('start_flag')):
+            self._queue_heartbeat(agent_state)
+            return
+        try:
+            self.plugin.create_or_update_agent(context, agent_state)
+        except ext_agent.AgentNotFoundByTypeHost:
+            self._register_again(context, key)
+
+    def _register_again(self, context, key):
+        """Create again an agent deleted since its last full report.
+
+        The agent is created from its last full report received by this
+        server. Otherwise it is only registered again by its next full
+        report.
+        """
+        agent_state = self.agent_states.get(key)
+        if agent_state is None:
+            LOG.warn(_("Ignoring the partial report of the unknown "
+                       "%(agent_type)s agent on %(host)s"),
+                     {'agent_type': key[0], 'host': key[1]})
+            return
         self.plugin.create_or_update_agent(context, agent_state)
+
+    def _queue_heartbeat(self, agent_state):
+        if not self.heartbeats:
+            greenthread.spawn_after(cfg.CONF.agent_heartbeat_batch_interval,
+                                    self._update_heartbeats)
+        key = (agent_state['agent_type'], agent_state['host'])
+        if key not in self.heartbeats:
+            self.heartbeats[key] = (agent_state, timeutils.utcnow())
+
+    def _update_heartbeats(self):
+        """Write the queued heartbeats with one update per agent type.
+
+        The heartbeat of the agents of a type is set to the time of the
+        oldest of their queued reports.
+        """
+        heartbeats, self.heartbeats = self.heartbeats, {}
+        agents_by_type = collections.defaultdict(dict)
+        for (agent_type, host), heartbeat in heartbeats.iteritems():
+            agents_by_type[agent_type][host] = heartbeat
+        context = neutron_context.get_admin_context()
+        for agent_type, agents in agents_by_type.iteritems():
+            timestamp = min(received_at for _state, received_at
+                            in agents.itervalues())
+            try:
+                missing_hosts = self.plugin.update_agents_heartbeat(
+                    context, agent_type, agents.keys(), timestamp)
+                for host in missing_hosts:
+                    self._register_again(context, (agent_type, host))
+            except Exception:
+                LOG.exception(_("Failed to update the heartbeat of the "
+                                "%s agents"), agent_type)
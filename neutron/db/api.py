@@ -13,16 +13,31 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.config import cfg
 import sqlalchemy as sql
 
 from neutron.db import model_base
 from neutron.openstack.common.db.sqlalchemy import session
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import timeutils
 
 LOG = logging.getLogger(__name__)
 
 BASE = model_base.BASEV2
 
+database_opts = [
+    cfg.IntOpt('slave_max_lag', default=5,
+               help=_("Maximum replication lag, in seconds, of the slave "
+                      "database for read only requests to be sent to it")),
+]
+cfg.CONF.register_opts(database_opts, 'database')
+
+# Seconds for which the result of the slave database health check is reused
+SLAVE_CHECK_INTERVAL = 10
+
+_slave_checked_at = None
+_slave_usable = False
+
 
 def configure_db():
     """Configure database.
@@ -39,11 +54,72 @@ def clear_db(base=BASE):
     session.cleanup()
 
 
-def get_session(autocommit=True, expire_on_commit=False):
-    """Helper method to grab session."""
+def get_session(autocommit=True, expire_on_commit=False, read_only=False):
+    """Helper method to grab session.
+
+    Read only sessions are bound to the slave database when one is
+    configured and usable, and to the master database otherwise.
+    """
     return session.get_session(autocommit=autocommit,
                                expire_on_commit=expire_on_commit,
-                               sqlite_fk=True)
+                               sqlite_fk=True,
+                               slave_session=read_only and slave_usable())
+
+
+def _get_slave_lag(engine):
+    """Return the replication lag of the slave database in seconds.
+
+    None is returned when the replication is broken.
+    """
+    if engine.name != 'mysql':
+        engine.execute('SELECT 1')
+        return 0
+    status = engine.execute('SHOW SLAVE STATUS').first()
+    if status is None:
+        # The slave connection points to a server which isn't a slave
+        return 0
+    return status['Seconds_Behind_Master']
+
+
+def slave_usable():
+    """Check whether read only requests can be sent to the slave database.
+
+    The slave database must be reachable and lag behind the master
+    database by at most slave_max_lag seconds. The result of the check
+    is reused for SLAVE_CHECK_INTERVAL seconds.
+    """
+    global _slave_checked_at
+    global _slave_usable
+
+    if not cfg.CONF.database.slave_connection:
+        return False
+    now = timeutils.utcnow_ts()
+    if (_slave_checked_at is not None and
+            now - _slave_checked_at < SLAVE_CHECK_INTERVAL):
+        return _slave_usable
+    _slave_checked_at = now
+    try:
+        lag = _get_slave_lag(session.get_engine(sqlite_fk=True,
+                                                slave_engine=True))
+    except Exception as e:
+        LOG.warning(_("Unable to check the slave database, using the "
+                      "master database: %s"), e)
+        _slave_usable = False
+        return False
+    _slave_usable = (lag is not None and
+                     lag <= cfg.CONF.database.slave_max_lag)
+    if not _slave_usable:
+        LOG.warning(_("The slave database lags behind the master database "
+                      "(%s seconds), using the master database"), lag)
+    return _slave_usable
+
+
+def reset_slave_status():
+    """Forget the result of the last slave database health check."""
+    global _slave_checked_at
+    global _slave_usable
+    _slave_checked_at = None
+    _slave_usable = False
 
 
 def register_models(base=BASE):
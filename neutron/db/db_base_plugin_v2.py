@@ -27,6 +27,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
 from neutron.db import api as db
+from neutron.db import ipam_backend
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron import neutron_plugin_base_v2
@@ -62,6 +63,12 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # This dictionary maps model classes to the fields of their resource
+    # which are plain columns of the model, returned as they are stored.
+    # Collections restricted to such fields are retrieved by querying only
+    # the corresponding columns, rather than by loading the whole objects.
+    _projectable_fields = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -182,6 +189,42 @@ class CommonDbMixin(object):
                                                     marker_obj=marker_obj)
         return collection
 
+    def _get_projection_fields(self, model, fields):
+        """Return the fields to query as columns, or None.
+
+        Only the columns are queried when every requested field is a
+        projectable field of the model. Otherwise the whole objects are
+        needed for building the resources, and None is returned.
+        """
+        if not fields:
+            return None
+        projectable = self._projectable_fields.get(model, ())
+        projection = []
+        for field in fields:
+            if field not in projectable:
+                return None
+            if field not in projection:
+                projection.append(field)
+        return projection
+
+    def _make_collection_dicts(self, query, model, dict_func, fields=None):
+        """Build the resource dicts of the results of a collection query."""
+        projection = self._get_projection_fields(model, fields)
+        if projection is None:
+            return [dict_func(c, fields) for c in query]
+        # Joins in the query may return the same row several times. The
+        # primary key is queried as well so that duplicates can be dropped.
+        primary_key = [column.key for column in model.__table__.primary_key]
+        columns = [getattr(model, key) for key in primary_key + projection]
+        items = []
+        seen = set()
+        for row in query.with_entities(*columns):
+            key = tuple(row[:len(primary_key)])
+            if key not in seen:
+                seen.add(key)
+                items.append(dict(zip(projection, row[len(primary_key):])))
+        return items
+
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
                         page_reverse=False):
@@ -190,7 +233,7 @@ class CommonDbMixin(object):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
-        items = [dict_func(c, fields) for c in query]
+        items = self._make_collection_dicts(query, model, dict_func, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -215,11 +258,23 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     """
 
     # This attribute specifies whether the plugin supports or not
-    # bulk/pagination/sorting operations. Name mangling is used in
-    # order to ensure it is qualified by class
+    # bulk/pagination/sorting operations and reads from the slave
+    # database. Name mangling is used in order to ensure it is qualified
+    # by class
     __native_bulk_support = True
     __native_pagination_support = True
     __native_sorting_support = True
+    __native_read_only_support = True
+
+    _projectable_fields = {
+        models_v2.Network: frozenset(['id', 'name', 'tenant_id',
+                                      'admin_state_up', 'status', 'shared']),
+        models_v2.Subnet: frozenset(['id', 'name', 'tenant_id', 'network_id',
+                                     'ip_version', 'cidr', 'gateway_ip',
+                                     'enable_dhcp', 'shared']),
+        models_v2.Port: frozenset(['id', 'name', 'network_id', 'tenant_id',
+                                   'mac_address', 'admin_state_up', 'status',
+                                   'device_id', 'device_owner'])}
 
     def __init__(self):
         db.configure_db()
@@ -337,8 +392,34 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             ip_address=ip_address,
             subnet_id=subnet_id).delete()
 
+    @staticmethod
+    def _store_ip_allocation(context, ip_address, network_id, subnet_id,
+                             port_id):
+        LOG.debug(_("Allocated IP %(ip_address)s "
+                    "(%(network_id)s/%(subnet_id)s/%(port_id)s)"),
+                  {'ip_address': ip_address,
+                   'network_id': network_id,
+                   'subnet_id': subnet_id,
+                   'port_id': port_id})
+        # IPAM backends may have already reserved the address with an
+        # allocation which is not owned by any port yet
+        backend = ipam_backend.get_ipam_backend()
+        if backend is not None and backend.claim_ip(
+                context, ip_address, network_id, subnet_id, port_id):
+            return
+        allocated = models_v2.IPAllocation(
+            network_id=network_id,
+            port_id=port_id,
+            ip_address=ip_address,
+            subnet_id=subnet_id,
+        )
+        context.session.add(allocated)
+
     @staticmethod
     def _generate_ip(context, subnets):
+        backend = ipam_backend.get_ipam_backend()
+        if backend is not None:
+            return backend.generate_ip(context, subnets)
         try:
             return NeutronDbPluginV2._try_generate_ip(context, subnets)
         except n_exc.IpAddressGenerationFailure:
@@ -428,6 +509,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
+        backend = ipam_backend.get_ipam_backend()
+        if backend is not None:
+            return backend.allocate_specific_ip(context, subnet_id,
+                                                ip_address)
         ip = int(netaddr.IPAddress(ip_address))
         range_qry = context.session.query(
             models_v2.IPAvailabilityRange).join(
@@ -1297,21 +1382,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             # Update the allocated IP's
             if ips:
                 for ip in ips:
-                    ip_address = ip['ip_address']
-                    subnet_id = ip['subnet_id']
-                    LOG.debug(_("Allocated IP %(ip_address)s "
-                                "(%(network_id)s/%(subnet_id)s/%(port_id)s)"),
-                              {'ip_address': ip_address,
-                               'network_id': network_id,
-                               'subnet_id': subnet_id,
-                               'port_id': port_id})
-                    allocated = models_v2.IPAllocation(
-                        network_id=network_id,
-                        port_id=port_id,
-                        ip_address=ip_address,
-                        subnet_id=subnet_id,
-                    )
-                    context.session.add(allocated)
+                    NeutronDbPluginV2._store_ip_allocation(
+                        context, ip['ip_address'], network_id,
+                        ip['subnet_id'], port_id)
 
         return self._make_port_dict(port, process_extensions=False)
 
@@ -1331,10 +1404,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
                 # Update ips if necessary
                 for ip in added_ips:
-                    allocated = models_v2.IPAllocation(
-                        network_id=port['network_id'], port_id=port.id,
-                        ip_address=ip['ip_address'], subnet_id=ip['subnet_id'])
-                    context.session.add(allocated)
+                    NeutronDbPluginV2._store_ip_allocation(
+                        context, ip['ip_address'], port['network_id'],
+                        ip['subnet_id'], port.id)
             # Remove all attributes in p which are not in the port DB model
             # and then update the port
             port.update(self._filter_non_model_columns(p, models_v2.Port))
@@ -1433,7 +1505,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query]
+        items = self._make_collection_dicts(query, models_v2.Port,
+                                            self._make_port_dict, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -38,7 +38,9 @@ class DhcpRpcCallbackMixin(object):
         plugin = manager.NeutronManager.get_plugin()
         if utils.is_extension_supported(
             plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS):
-            if cfg.CONF.network_auto_schedule:
+            # When the networks are paged, they are only scheduled on the
+            # first page
+            if cfg.CONF.network_auto_schedule and not kwargs.get('marker'):
                 plugin.auto_schedule_networks(context, host)
             nets = plugin.list_active_networks_on_active_dhcp_agent(
                 context, host)
@@ -87,15 +89,30 @@ class DhcpRpcCallbackMixin(object):
         return [net['id'] for net in nets]
 
     def get_active_networks_info(self, context, **kwargs):
-        """Returns all the networks/subnets/ports in system."""
+        """Returns all the networks/subnets/ports in system.
+
+        If a limit is given, only returns the limit first networks, sorted
+        by id, whose id is greater than marker.
+
+        The networks are listed from the master database so that the ones
+        scheduled on the host are all returned, while their ports and
+        subnets may be read from the slave database.
+        """
         host = kwargs.get('host')
+        limit = kwargs.get('limit')
+        marker = kwargs.get('marker')
         LOG.debug(_('get_active_networks_info from %s'), host)
         networks = self._get_active_networks(context, **kwargs)
+        if limit:
+            networks = sorted((network for network in networks
+                               if not marker or network['id'] > marker),
+                              key=lambda network: network['id'])[:limit]
         plugin = manager.NeutronManager.get_plugin()
+        read_context = utils.read_only_context(plugin, context)
         filters = {'network_id': [network['id'] for network in networks]}
-        ports = plugin.get_ports(context, filters=filters)
+        ports = plugin.get_ports(read_context, filters=filters)
         filters['enable_dhcp'] = [True]
-        subnets = plugin.get_subnets(context, filters=filters)
+        subnets = plugin.get_subnets(read_context, filters=filters)
 
         for network in networks:
             network['subnets'] = [subnet for subnet in subnets
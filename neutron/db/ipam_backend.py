@@ -0,0 +1,227 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import random
+
+import netaddr
+from oslo.config import cfg
+
+from neutron.common import exceptions as n_exc
+from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+_BACKENDS = {}
+
+
+def get_ipam_backend():
+    """Return the configured IPAM backend, or None for the default one.
+
+    When no ipam_driver is configured the plugin keeps using its built-in
+    allocator based on the IPAvailabilityRange table.
+    """
+    driver = cfg.CONF.ipam_driver
+    if not driver:
+        return None
+    if driver not in _BACKENDS:
+        _BACKENDS[driver] = importutils.import_object(driver)
+        LOG.info(_("Loaded IPAM backend: %s"), driver)
+    return _BACKENDS[driver]
+
+
+class IpFreeSet(object):
+    """Compact set of free addresses of a subnet.
+
+    Free addresses are stored as a sorted list of disjoint, inclusive
+    (first, last) integer intervals, so the memory used depends on the
+    fragmentation of the pools rather than on their size.
+    """
+
+    def __init__(self, ranges=None):
+        self._firsts = []
+        self._lasts = []
+        for first, last in sorted(ranges or []):
+            if self._lasts and first <= self._lasts[-1] + 1:
+                self._lasts[-1] = max(self._lasts[-1], last)
+            else:
+                self._firsts.append(first)
+                self._lasts.append(last)
+
+    @classmethod
+    def from_pools(cls, pools, allocated):
+        """Build the free set from allocation pools and allocated addresses.
+
+        :param pools: iterable of (first_ip, last_ip) address strings.
+        :param allocated: iterable of allocated address strings.
+        """
+        free = cls([(int(netaddr.IPAddress(first)),
+                     int(netaddr.IPAddress(last)))
+                    for first, last in pools])
+        for ip_address in allocated:
+            free.remove(int(netaddr.IPAddress(ip_address)))
+        return free
+
+    def __len__(self):
+        return sum(last - first + 1
+                   for first, last in zip(self._firsts, self._lasts))
+
+    def __contains__(self, ip):
+        index = bisect.bisect_right(self._firsts, ip) - 1
+        return index >= 0 and ip <= self._lasts[index]
+
+    def ranges(self):
+        return zip(self._firsts, self._lasts)
+
+    def remove(self, ip):
+        index = bisect.bisect_right(self._firsts, ip) - 1
+        if index < 0 or ip > self._lasts[index]:
+            return
+        first, last = self._firsts[index], self._lasts[index]
+        if first == last:
+            del self._firsts[index]
+            del self._lasts[index]
+        elif ip == first:
+            self._firsts[index] = ip + 1
+        elif ip == last:
+            self._lasts[index] = ip - 1
+        else:
+            # Split the interval in two
+            self._lasts[index] = ip - 1
+            self._firsts.insert(index + 1, ip + 1)
+            self._lasts.insert(index + 1, last)
+
+    def random_ip(self):
+        """Return a free address picked uniformly at random, or None."""
+        size = len(self)
+        if not size:
+            return None
+        offset = random.randrange(size)
+        for first, last in zip(self._firsts, self._lasts):
+            if offset <= last - first:
+                return first + offset
+            offset -= last - first + 1
+
+
+class IpamBackendBase(object):
+    """Base class for the IPAM backends used by NeutronDbPluginV2."""
+
+    def generate_ip(self, context, subnets):
+        """Allocate an address from one of the subnets of a network.
+
+        :returns: a dict with 'ip_address' and 'subnet_id' keys.
+        :raises: IpAddressGenerationFailure when all subnets are exhausted.
+        """
+        raise NotImplementedError()
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Remove a requested address from the available ones."""
+        raise NotImplementedError()
+
+    def claim_ip(self, context, ip_address, network_id, subnet_id, port_id):
+        """Assign an address reserved by generate_ip to a port.
+
+        :returns: True if a reserved allocation was found and claimed, False
+                  if the caller has to store the allocation itself.
+        """
+        return False
+
+
+class FreeSetIpamBackend(IpamBackendBase):
+    """Lock-free IPAM backend based on per-subnet free sets.
+
+    Instead of locking and consuming the head of the IPAvailabilityRange
+    table, the free addresses of a subnet are computed from its allocation
+    pools and its current allocations. A random free address is then
+    reserved by inserting its IPAllocation row in a savepoint; if a
+    concurrent request won the same address, another candidate is tried.
+    Concurrent allocations on the same subnet therefore do not serialize on
+    a single row.
+    """
+
+    def _get_free_set(self, context, subnet_id):
+        pools = (context.session.query(models_v2.IPAllocationPool.first_ip,
+                                       models_v2.IPAllocationPool.last_ip).
+                 filter_by(subnet_id=subnet_id))
+        allocated = (context.session.query(models_v2.IPAllocation.ip_address).
+                     filter_by(subnet_id=subnet_id))
+        return IpFreeSet.from_pools(pools, (ip[0] for ip in allocated))
+
+    def _reserve_ip(self, context, network_id, subnet_id, ip_address):
+        allocation = models_v2.IPAllocation(network_id=network_id,
+                                            subnet_id=subnet_id,
+                                            ip_address=ip_address)
+        if context.session.bind.dialect.name == 'sqlite':
+            # NOTE: pysqlite does not support savepoints properly, and
+            # sqlite serializes writers anyway.
+            context.session.add(allocation)
+            context.session.flush()
+            return True
+        try:
+            with context.session.begin(nested=True):
+                context.session.add(allocation)
+        except db_exc.DBDuplicateEntry:
+            return False
+        return True
+
+    def generate_ip(self, context, subnets):
+        max_retries = cfg.CONF.ip_generation_retries
+        for subnet in subnets:
+            free = self._get_free_set(context, subnet['id'])
+            for i in range(max_retries):
+                ip = free.random_ip()
+                if ip is None:
+                    LOG.debug(_("All IPs from subnet %(subnet_id)s "
+                                "(%(cidr)s) allocated"),
+                              {'subnet_id': subnet['id'],
+                               'cidr': subnet['cidr']})
+                    break
+                free.remove(ip)
+                ip_address = str(netaddr.IPAddress(ip))
+                if self._reserve_ip(context, subnet['network_id'],
+                                    subnet['id'], ip_address):
+                    LOG.debug(_("Allocated IP %(ip_address)s from subnet "
+                                "%(subnet_id)s"),
+                              {'ip_address': ip_address,
+                               'subnet_id': subnet['id']})
+                    return {'ip_address': ip_address,
+                            'subnet_id': subnet['id']}
+                LOG.debug(_("IP %(ip_address)s was allocated concurrently. "
+                            "Remaining attempts %(retries)s."),
+                          {'ip_address': ip_address,
+                           'retries': max_retries - (i + 1)})
+        raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def claim_ip(self, context, ip_address, network_id, subnet_id, port_id):
+        allocation = (context.session.query(models_v2.IPAllocation).
+                      filter_by(ip_address=ip_address,
+                                subnet_id=subnet_id,
+                                network_id=network_id,
+                                port_id=None).first())
+        if allocation is None:
+            return False
+        allocation.port_id = port_id
+        return True
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        # Free sets are derived from the IPAllocation table, which already
+        # guarantees the uniqueness of the requested address.
+        pass
@@ -25,6 +25,7 @@ from sqlalchemy.orm import joinedload
 from neutron.common import constants
 from neutron.db import agents_db
 from neutron.db.agentschedulers_db import AgentSchedulerDbMixin
+from neutron.db import l3_db
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import l3agentscheduler
@@ -126,8 +127,8 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         else:
             return {'routers': []}
 
-    def list_active_sync_routers_on_active_l3_agent(
-            self, context, host, router_ids):
+    def list_router_ids_on_host(self, context, host, router_ids=None,
+                                active=None):
         agent = self._get_agent_by_type_and_host(
             context, constants.AGENT_TYPE_L3, host)
         if not agent.admin_state_up:
@@ -136,12 +137,19 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         query = query.filter(
             RouterL3AgentBinding.l3_agent_id == agent.id)
 
-        if not router_ids:
-            pass
-        else:
+        if router_ids:
             query = query.filter(
                 RouterL3AgentBinding.router_id.in_(router_ids))
-        router_ids = [item[0] for item in query]
+        if active is not None:
+            query = query.join(
+                l3_db.Router,
+                l3_db.Router.id == RouterL3AgentBinding.router_id)
+            query = query.filter(l3_db.Router.admin_state_up == active)
+        return [item[0] for item in query]
+
+    def list_active_sync_routers_on_active_l3_agent(
+            self, context, host, router_ids):
+        router_ids = self.list_router_ids_on_host(context, host, router_ids)
         if router_ids:
             return self.get_sync_data(context, router_ids=router_ids,
                                       active=True)
@@ -52,6 +52,11 @@ class Router(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     admin_state_up = sa.Column(sa.Boolean)
     gw_port_id = sa.Column(sa.String(36), sa.ForeignKey('ports.id'))
     gw_port = orm.relationship(models_v2.Port)
+    # Incremented whenever the router, its gateway, its interfaces or its
+    # floating IPs change, so that the l3 agents only fetch the routers
+    # which changed since they last synchronized them
+    revision = sa.Column(sa.BigInteger, nullable=False, default=0,
+                         server_default='0')
 
 
 class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
@@ -91,6 +96,35 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             raise l3.RouterNotFound(router_id=id)
         return router
 
+    def _bump_router_revisions(self, context, router_ids):
+        router_ids = [router_id for router_id in router_ids if router_id]
+        if not router_ids:
+            return
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(Router)
+            query = query.filter(Router.id.in_(router_ids))
+            query.update({Router.revision: Router.revision + 1},
+                         synchronize_session=False)
+
+    def get_router_revisions(self, context, router_ids=None):
+        """Return the current revisions of routers, by router id."""
+        query = context.session.query(Router.id, Router.revision)
+        if router_ids is not None:
+            if not router_ids:
+                return {}
+            query = query.filter(Router.id.in_(router_ids))
+        return dict(query)
+
+    def get_changed_router_ids(self, context, router_ids, revisions):
+        """Return the ids of the routers whose revision changed.
+
+        @param revisions: the revisions of the routers known by the caller,
+                          by router id
+        """
+        current = self.get_router_revisions(context, router_ids)
+        return [router_id for router_id in router_ids
+                if current.get(router_id) != revisions.get(router_id)]
+
     def _make_router_dict(self, router, fields=None,
                           process_extensions=True):
         res = {'id': router['id'],
@@ -146,6 +180,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             # Ensure we actually have something to update
             if r.keys():
                 router_db.update(r)
+            self._bump_router_revisions(context, [id])
         self.l3_rpc_notifier.routers_updated(
             context, [router_db['id']])
         return self._make_router_dict(router_db)
@@ -330,6 +365,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                                                   subnet['cidr'])
                 port.update({'device_id': router_id,
                              'device_owner': DEVICE_OWNER_ROUTER_INTF})
+                self._bump_router_revisions(context, [router_id])
         elif 'subnet_id' in interface_info:
             subnet_id = interface_info['subnet_id']
             subnet = self._core_plugin._get_subnet(context, subnet_id)
@@ -353,6 +389,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                  'device_id': router_id,
                  'device_owner': DEVICE_OWNER_ROUTER_INTF,
                  'name': ''}})
+            self._bump_router_revisions(context, [router_id])
 
         self.l3_rpc_notifier.routers_updated(
             context, [router_id], 'add_router_interface')
@@ -428,6 +465,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             if not found:
                 raise l3.RouterInterfaceNotFoundForSubnet(router_id=router_id,
                                                           subnet_id=subnet_id)
+        self._bump_router_revisions(context, [router_id])
         self.l3_rpc_notifier.routers_updated(
             context, [router_id], 'remove_router_interface')
         info = {'id': router_id,
@@ -645,6 +683,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             self._update_fip_assoc(context, fip,
                                    floatingip_db, external_port)
             context.session.add(floatingip_db)
+            self._bump_router_revisions(context, [floatingip_db.router_id])
 
         router_id = floatingip_db['router_id']
         if router_id:
@@ -664,6 +703,8 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
             self._update_fip_assoc(context, fip, floatingip_db,
                                    self._core_plugin.get_port(
                                        context.elevated(), fip_port_id))
+            self._bump_router_revisions(
+                context, set([before_router_id, floatingip_db.router_id]))
         router_ids = []
         if before_router_id:
             router_ids.append(before_router_id)
@@ -686,6 +727,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         router_id = floatingip['router_id']
         with context.session.begin(subtransactions=True):
             context.session.delete(floatingip)
+            self._bump_router_revisions(context, [router_id])
             self._core_plugin.delete_port(context.elevated(),
                                           floatingip['floating_port_id'],
                                           l3_port_check=False)
@@ -754,6 +796,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 floating_ip.update({'fixed_port_id': None,
                                     'fixed_ip_address': None,
                                     'router_id': None})
+                self._bump_router_revisions(context, [router_id])
             except exc.NoResultFound:
                 return
             except exc.MultipleResultsFound:
@@ -889,9 +932,15 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
     def get_sync_data(self, context, router_ids=None, active=None):
         """Query routers and their related floating_ips, interfaces."""
         with context.session.begin(subtransactions=True):
+            # The revisions are read first, the data returned is at least
+            # as recent as them
+            revisions = self.get_router_revisions(context, router_ids)
             routers = self._get_sync_routers(context,
                                              router_ids=router_ids,
                                              active=active)
+            for router in routers:
+                if router['id'] in revisions:
+                    router['revision'] = revisions[router['id']]
             router_ids = [router['id'] for router in routers]
             floating_ips = self._get_sync_floating_ips(context, router_ids)
             interfaces = self.get_sync_interfaces(context, router_ids)
@@ -18,6 +18,7 @@ from oslo.config import cfg
 from neutron.common import constants
 from neutron.common import utils
 from neutron import context as neutron_context
+from neutron.db import api as db_api
 from neutron.extensions import l3
 from neutron.extensions import portbindings
 from neutron import manager
@@ -35,28 +36,42 @@ class L3RpcCallbackMixin(object):
     def sync_routers(self, context, **kwargs):
         """Sync routers according to filters to a specific agent.
 
+        When the revisions of the routers held by the agent are given, only
+        the routers whose revision changed are returned, and they are read
+        from the slave database if it is usable.
+
         @param context: contain user information
-        @param kwargs: host, router_ids
+        @param kwargs: host, router_ids, revisions
         @return: a list of routers
                  with their interfaces and floating_ips
         """
         router_ids = kwargs.get('router_ids')
         host = kwargs.get('host')
+        revisions = kwargs.get('revisions')
         context = neutron_context.get_admin_context()
         l3plugin = manager.NeutronManager.get_service_plugins()[
             plugin_constants.L3_ROUTER_NAT]
+        if l3plugin and router_ids and revisions:
+            router_ids = l3plugin.get_changed_router_ids(context, router_ids,
+                                                         revisions)
+            if not router_ids:
+                LOG.debug(_("No router changed for l3 agent on %s"), host)
+                return []
         if not l3plugin:
             routers = {}
             LOG.error(_('No plugin for L3 routing registered! Will reply '
                         'to l3 agent with empty router dictionary.'))
-        elif utils.is_extension_supported(
-                l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
-            if cfg.CONF.router_auto_schedule:
-                l3plugin.auto_schedule_routers(context, host, router_ids)
-            routers = l3plugin.list_active_sync_routers_on_active_l3_agent(
-                context, host, router_ids)
         else:
-            routers = l3plugin.get_sync_data(context, router_ids)
+            if (cfg.CONF.router_auto_schedule and
+                utils.is_extension_supported(
+                    l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS)):
+                l3plugin.auto_schedule_routers(context, host, router_ids)
+            if revisions and db_api.slave_usable():
+                routers = self._list_sync_routers_from_slave(
+                    context, l3plugin, host, router_ids)
+            else:
+                routers = self._list_sync_routers(context, l3plugin, host,
+                                                  router_ids)
         plugin = manager.NeutronManager.get_plugin()
         if utils.is_extension_supported(
             plugin, constants.PORT_BINDING_EXT_ALIAS):
@@ -65,6 +80,68 @@ class L3RpcCallbackMixin(object):
                   jsonutils.dumps(routers, indent=5))
         return routers
 
+    def _list_sync_routers(self, context, l3plugin, host, router_ids):
+        if utils.is_extension_supported(
+                l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            return l3plugin.list_active_sync_routers_on_active_l3_agent(
+                context, host, router_ids)
+        return l3plugin.get_sync_data(context, router_ids)
+
+    def _list_sync_routers_from_slave(self, context, l3plugin, host,
+                                      router_ids):
+        """List the routers from the slave database.
+
+        The routers which the slave database doesn't return at their
+        current revision are listed again from the master database.
+        """
+        routers = self._list_sync_routers(
+            utils.read_only_context(l3plugin, context), l3plugin, host,
+            router_ids)
+        revisions = l3plugin.get_router_revisions(context, router_ids)
+        routers = [router for router in routers
+                   if router.get('revision') == revisions.get(router['id'])]
+        listed_ids = set(router['id'] for router in routers)
+        stale_ids = [router_id for router_id in router_ids
+                     if router_id in revisions and
+                     router_id not in listed_ids]
+        if stale_ids:
+            LOG.debug(_("Routers %s are stale in the slave database"),
+                      stale_ids)
+            routers.extend(self._list_sync_routers(context, l3plugin, host,
+                                                   stale_ids))
+        return routers
+
+    def get_router_ids(self, context, **kwargs):
+        """Get the ids of the active routers of a specific agent.
+
+        The agent fetches the routers by chunks of these ids with
+        sync_routers when it synchronizes all of them, and removes the
+        routers it holds which are not part of them.
+
+        @param context: contain user information
+        @param kwargs: host
+        @return: a list of router ids
+        """
+        host = kwargs.get('host')
+        context = neutron_context.get_admin_context()
+        l3plugin = manager.NeutronManager.get_service_plugins()[
+            plugin_constants.L3_ROUTER_NAT]
+        if not l3plugin:
+            LOG.error(_('No plugin for L3 routing registered! Will reply '
+                        'to l3 agent with empty router id list.'))
+            return []
+        elif utils.is_extension_supported(
+                l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            if cfg.CONF.router_auto_schedule:
+                l3plugin.auto_schedule_routers(context, host, None)
+            return l3plugin.list_router_ids_on_host(context, host,
+                                                    active=True)
+        else:
+            return [router['id'] for router in
+                    l3plugin.get_routers(context,
+                                         filters={'admin_state_up': [True]},
+                                         fields=['id'])]
+
     def _ensure_host_set_on_ports(self, context, plugin, host, routers):
         for router in routers:
             LOG.debug(_("Checking router: %(id)s for host: %(host)s"),
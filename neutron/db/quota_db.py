@@ -15,11 +15,30 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import orm
+from sqlalchemy import sql
 
 from neutron.common import exceptions
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
+from neutron import quota as neutron_quota
+
+LOG = logging.getLogger(__name__)
+
+# Resources whose usage is kept up to date in the quotausages table, and
+# the models which store them.
+TRACKED_RESOURCES = {'network': models_v2.Network,
+                     'subnet': models_v2.Subnet,
+                     'port': models_v2.Port}
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -33,6 +52,29 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Represent the number of resources of a kind used by a tenant.
+
+    in_use is adjusted in the transaction which creates or deletes the
+    resource.  When dirty is set, or when the usage was counted more than
+    quota_usage_max_age seconds ago, it is counted again on the next
+    reservation.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+    dirty = sa.Column(sa.Boolean, nullable=False, default=False)
+    counted_at = sa.Column(sa.DateTime)
+
+
+class QuotaReservation(model_base.BASEV2, models_v2.HasId):
+    """Represent quota held for resources which are being created."""
+    tenant_id = sa.Column(sa.String(255), index=True)
+    resource = sa.Column(sa.String(255))
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -179,3 +221,215 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+    @staticmethod
+    def is_tracked(resource):
+        return _is_tracking_enabled() and resource in TRACKED_RESOURCES
+
+    def make_reservation(self, context, tenant_id, resources, deltas, plugin):
+        """Reserve quota for resources which are about to be created.
+
+        The usage of each resource is read from the quotausages table, so
+        the check does not depend on the number of resources the tenant
+        owns.  Usages which are missing, dirty or too old are counted
+        again with the count function of the resource.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to reserve quota for.
+        :param resources: A dictionary of the registered resources.
+        :param deltas: A dictionary of the number of items of each
+                       resource which will be created.
+        :param plugin: The plugin passed to the count functions.
+        :return list: the ids of the reservations made.
+        """
+
+        unders = [key for key, val in deltas.items() if val < 0]
+        if unders:
+            raise exceptions.InvalidQuotaValue(unders=sorted(unders))
+
+        quotas = self._get_quotas(context, tenant_id, resources,
+                                  deltas.keys())
+        # Unlimited resources need neither a usage nor a reservation
+        deltas = dict((key, val) for key, val in deltas.items()
+                      if quotas[key] >= 0)
+        if not deltas:
+            return []
+
+        try:
+            return self._make_reservation(context, tenant_id, resources,
+                                          quotas, deltas, plugin)
+        except db_exc.DBDuplicateEntry:
+            # A concurrent request created the usage record first, it
+            # will be found and locked this time
+            LOG.debug(_("Usage record for tenant %s created concurrently, "
+                        "retrying reservation"), tenant_id)
+            return self._make_reservation(context, tenant_id, resources,
+                                          quotas, deltas, plugin)
+
+    def _make_reservation(self, context, tenant_id, resources, quotas,
+                          deltas, plugin):
+        now = timeutils.utcnow()
+        max_age = cfg.CONF.QUOTAS.quota_usage_max_age
+        session = context.session
+        with session.begin(subtransactions=True):
+            query = session.query(QuotaUsage).filter(
+                QuotaUsage.tenant_id == tenant_id,
+                QuotaUsage.resource.in_(deltas.keys()))
+            usages = dict((usage.resource, usage)
+                          for usage in query.with_lockmode('update'))
+            for key in deltas:
+                usage = usages.get(key)
+                if usage is None:
+                    usage = QuotaUsage(tenant_id=tenant_id, resource=key)
+                    session.add(usage)
+                    usages[key] = usage
+                elif not (usage.dirty or
+                          (max_age > 0 and
+                           timeutils.is_older_than(usage.counted_at,
+                                                   max_age))):
+                    continue
+                usage.in_use = resources[key].count(
+                    context, plugin, '%ss' % key, tenant_id)
+                usage.dirty = False
+                usage.counted_at = now
+
+            # Expired reservations belong to requests which did not
+            # complete, their quota is given back
+            query = session.query(QuotaReservation).filter(
+                QuotaReservation.tenant_id == tenant_id,
+                QuotaReservation.expiration <= now)
+            query.delete(synchronize_session=False)
+            query = session.query(
+                QuotaReservation.resource,
+                sql.func.sum(QuotaReservation.delta)).filter(
+                    QuotaReservation.tenant_id == tenant_id,
+                    QuotaReservation.resource.in_(deltas.keys())).group_by(
+                        QuotaReservation.resource)
+            reserved = dict(query)
+
+            overs = [key for key, val in deltas.items()
+                     if (usages[key].in_use + (reserved.get(key) or 0) +
+                         val > quotas[key])]
+            if overs:
+                raise exceptions.OverQuota(overs=sorted(overs))
+
+            expiration = now + datetime.timedelta(
+                seconds=cfg.CONF.QUOTAS.reservation_expiration)
+            reservations = []
+            for key, val in deltas.items():
+                reservation = QuotaReservation(
+                    id=uuidutils.generate_uuid(), tenant_id=tenant_id,
+                    resource=key, delta=val, expiration=expiration)
+                session.add(reservation)
+                reservations.append(reservation.id)
+        return reservations
+
+    @staticmethod
+    def _remove_reservations(context, reservations):
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(QuotaReservation).filter(
+                QuotaReservation.id.in_(reservations))
+            query.delete(synchronize_session=False)
+
+    @staticmethod
+    def commit_reservations(context, reservations):
+        """Release reservations whose resources have been created.
+
+        The usage was already increased when the resources were stored.
+        """
+        DbQuotaDriver._remove_reservations(context, reservations)
+
+    @staticmethod
+    def cancel_reservations(context, reservations):
+        """Release reservations whose resources were not created."""
+        DbQuotaDriver._remove_reservations(context, reservations)
+
+    @staticmethod
+    def mark_usages_dirty(context, tenant_id=None):
+        """Have the tracked usages counted again on the next reservation.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: Restrict to the usages of this tenant.
+        """
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(QuotaUsage)
+            if tenant_id:
+                query = query.filter_by(tenant_id=tenant_id)
+            query.update({'dirty': True}, synchronize_session=False)
+
+
+def _is_tracking_enabled():
+    return (cfg.CONF.QUOTAS.track_quota_usage and
+            cfg.CONF.QUOTAS.quota_driver == neutron_quota.QUOTA_DB_DRIVER)
+
+
+def _update_usage(connection, tenant_id, resource, amount):
+    usages = QuotaUsage.__table__
+    connection.execute(
+        usages.update().
+        where(usages.c.tenant_id == tenant_id).
+        where(usages.c.resource == resource).
+        values(in_use=usages.c.in_use + amount))
+
+
+def _register_usage_listeners(resource, model):
+    """Keep the usage of resource up to date when model rows change.
+
+    The usage is updated on the connection of the flush, so it is part of
+    the transaction storing the resource.  Nothing is updated when the
+    tenant has no usage record yet, it will be counted when needed.
+    """
+
+    def after_insert(mapper, connection, target):
+        if _is_tracking_enabled():
+            _update_usage(connection, target.tenant_id, resource, 1)
+
+    def after_delete(mapper, connection, target):
+        if _is_tracking_enabled():
+            _update_usage(connection, target.tenant_id, resource, -1)
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'after_delete', after_delete)
+
+
+def _get_query_tenant_id(query, model):
+    """Return the tenant_id a query is filtered on, None if unknown.
+
+    Only a tenant_id equality among the criteria joined by AND is found.
+    """
+    criteria = [query.whereclause]
+    while criteria:
+        clause = criteria.pop()
+        operator = getattr(clause, 'operator', None)
+        if operator is sql.operators.and_:
+            criteria.extend(clause.clauses)
+        elif operator is sql.operators.eq:
+            column, value = clause.left, clause.right
+            if (getattr(column, 'table', None) is model.__table__ and
+                    column.name == 'tenant_id' and hasattr(value, 'value')):
+                return value.value
+
+
+def _after_bulk_delete(session, query, query_context, result):
+    """Mark usages dirty when resources are removed by a bulk delete.
+
+    Bulk deletes do not load the deleted rows. The usage of the tenant the
+    query is filtered on is marked dirty, the usages of all the tenants
+    when the tenant is not known.
+    """
+    if not result.rowcount or not _is_tracking_enabled():
+        return
+    model = query.column_descriptions[0]['type']
+    for resource, tracked_model in TRACKED_RESOURCES.items():
+        if model is tracked_model:
+            usages = QuotaUsage.__table__
+            update = usages.update().where(usages.c.resource == resource)
+            tenant_id = _get_query_tenant_id(query, model)
+            if tenant_id is not None:
+                update = update.where(usages.c.tenant_id == tenant_id)
+            session.execute(update.values(dirty=True))
+
+
+for _resource, _model in TRACKED_RESOURCES.items():
+    _register_usage_listeners(_resource, _model)
+event.listen(orm.Session, 'after_bulk_delete', _after_bulk_delete)
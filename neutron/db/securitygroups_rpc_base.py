@@ -122,6 +122,25 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             self.notifier.security_groups_member_updated(
                 context, port.get(ext_sg.SECURITYGROUPS))
 
+    def notify_security_groups_member_updated_bulk(self, context, ports):
+        """Notify update event of security group members of many ports.
+
+        Sends at most one provider update and one member update for all
+        the ports, rather than one notification per port.
+        """
+        sg_ids = set()
+        provider_updated = False
+        for port in ports:
+            if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
+                provider_updated = True
+            else:
+                sg_ids.update(port.get(ext_sg.SECURITYGROUPS) or [])
+        if provider_updated:
+            self.notifier.security_groups_provider_updated(context)
+        if sg_ids:
+            self.notifier.security_groups_member_updated(
+                context, sorted(sg_ids))
+
 
 class SecurityGroupServerRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent support in plugin
@@ -138,7 +157,92 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        return self._security_group_rules_for_ports(context, ports)
 
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group rules for each port and group members.
+
+        Contrary to security_group_rules_for_devices, remote_group_id
+        rules are not converted, the IPs of the members of the remote
+        groups are returned separately.
+
+        :params devices: list of devices
+        :returns: dict with the ports corresponding to the devices, with
+                  their security group rules, under 'devices' and the member
+                  IPs of their remote groups by ethertype under
+                  'sg_member_ips'
+        """
+        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        self._add_security_group_rules_to_ports(context, ports)
+        remote_group_ids = self._select_remote_group_ids(ports)
+        for port in ports.values():
+            for rule in port.get('security_group_rules'):
+                remote_group_id = rule.get('remote_group_id')
+                if remote_group_id:
+                    port['security_group_source_groups'].append(
+                        remote_group_id)
+        return {'devices': ports,
+                'sg_member_ips': self._select_member_ips_by_ethertype(
+                    context, remote_group_ids)}
+
+    def security_group_info_for_devices_v2(self, context, **kwargs):
+        """Return the security groups of each port, with their rules.
+
+        Contrary to security_group_rules_for_devices, the rules of a
+        security group are returned once, whatever the number of ports in
+        the group, and remote_group_id rules are not converted: the IPs of
+        the members of the remote groups are returned separately. The
+        ports only carry the provider rules.
+
+        :params devices: list of devices
+        :returns: dict with the ports corresponding to the devices under
+                  'devices', the rules of their security groups by group
+                  id under 'security_groups' and the member IPs of the
+                  remote groups by ethertype under 'sg_member_ips'
+        """
+        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        security_group_ids = set()
+        for port in ports.values():
+            security_group_ids.update(port.get('security_groups', []))
+        sg_info = self._security_group_info_for_groups(context,
+                                                       security_group_ids)
+        for port in ports.values():
+            remote_group_ids = port['security_group_source_groups']
+            for security_group_id in port.get('security_groups', []):
+                for rule in sg_info['security_groups'][security_group_id]:
+                    remote_group_id = rule.get('remote_group_id')
+                    if (remote_group_id and
+                            remote_group_id not in remote_group_ids):
+                        remote_group_ids.append(remote_group_id)
+        self._apply_provider_rule(context, ports)
+        sg_info['devices'] = ports
+        return sg_info
+
+    def security_group_info_for_groups(self, context, **kwargs):
+        """Return the rules of security groups and their remote members.
+
+        :params security_groups: list of security group ids
+        :returns: dict with the rules of the security groups by group id
+                  under 'security_groups' and the member IPs of their remote
+                  groups by ethertype under 'sg_member_ips'
+        """
+        security_groups = kwargs.get('security_groups')
+        return self._security_group_info_for_groups(context,
+                                                    security_groups)
+
+    def security_group_member_ips(self, context, **kwargs):
+        """Return the member IPs of security groups by ethertype.
+
+        :params security_groups: list of security group ids
+        """
+        security_groups = kwargs.get('security_groups')
+        return self._select_member_ips_by_ethertype(context,
+                                                    security_groups)
+
+    def _get_ports_for_devices(self, devices):
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
@@ -147,7 +251,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
     def _select_rules_for_ports(self, context, ports):
         if not ports:
@@ -164,6 +268,31 @@ class SecurityGroupServerRpcCallbackMixin(object):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _select_rules_for_security_groups(self, context, security_group_ids):
+        rules = dict((security_group_id, [])
+                     for security_group_id in security_group_ids)
+        if not rules:
+            return rules
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(rules.keys()))
+        for rule_in_db in query:
+            rules[rule_in_db['security_group_id']].append(
+                self._make_rule_dict(rule_in_db))
+        return rules
+
+    def _security_group_info_for_groups(self, context, security_group_ids):
+        rules = self._select_rules_for_security_groups(context,
+                                                       security_group_ids)
+        remote_group_ids = set()
+        for sg_rules in rules.values():
+            for rule in sg_rules:
+                if rule.get('remote_group_id'):
+                    remote_group_ids.add(rule['remote_group_id'])
+        return {'security_groups': rules,
+                'sg_member_ips': self._select_member_ips_by_ethertype(
+                    context, remote_group_ids)}
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
         if not remote_group_ids:
@@ -192,6 +321,17 @@ class SecurityGroupServerRpcCallbackMixin(object):
                         address_pair['ip_address'])
         return ips_by_group
 
+    def _select_member_ips_by_ethertype(self, context, security_group_ids):
+        member_ips = {}
+        ips = self._select_ips_for_remote_group(context, security_group_ids)
+        for security_group_id, sg_ips in ips.items():
+            sg_member_ips = {q_const.IPv4: [], q_const.IPv6: []}
+            for ip in sg_ips:
+                cidr = netaddr.IPNetwork(ip)
+                sg_member_ips['IPv%s' % cidr.version].append(str(cidr.cidr))
+            member_ips[security_group_id] = sg_member_ips
+        return member_ips
+
     def _select_remote_group_ids(self, ports):
         remote_group_ids = []
         for port in ports.values():
@@ -289,24 +429,31 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_dhcp_rule(port, ips)
 
     def _security_group_rules_for_ports(self, context, ports):
+        self._add_security_group_rules_to_ports(context, ports)
+        return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _add_security_group_rules_to_ports(self, context, ports):
         rules_in_db = self._select_rules_for_ports(context, ports)
         for (binding, rule_in_db) in rules_in_db:
             port_id = binding['port_id']
             port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+            port['security_group_rules'].append(
+                self._make_rule_dict(rule_in_db))
         self._apply_provider_rule(context, ports)
-        return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _make_rule_dict(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
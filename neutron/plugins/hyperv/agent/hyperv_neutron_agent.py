@@ -86,7 +86,7 @@ class HyperVSecurityAgent(sg_rpc.SecurityGroupAgentRpcMixin):
     def _setup_rpc(self):
         self.topic = topics.AGENT
         self.dispatcher = self._create_rpc_dispatcher()
-        consumers = [[topics.SECURITY_GROUP, topics.UPDATE]]
+        consumers = [[topics.SECURITY_GROUP, topics.UPDATE, cfg.CONF.host]]
 
         self.connection = agent_rpc.create_consumers(self.dispatcher,
                                                      self.topic,
@@ -152,8 +152,9 @@ class HyperVNeutronAgent(object):
         # Handle updates from service
         self.dispatcher = self._create_rpc_dispatcher()
         # Define the listening consumers for the agent
-        consumers = [[topics.PORT, topics.UPDATE],
-                     [topics.NETWORK, topics.DELETE],
+        # The server may send the notifications to the host of the ports
+        consumers = [[topics.PORT, topics.UPDATE, cfg.CONF.host],
+                     [topics.NETWORK, topics.DELETE, cfg.CONF.host],
                      [topics.PORT, topics.DELETE],
                      [constants.TUNNEL, topics.UPDATE]]
         self.connection = agent_rpc.create_consumers(self.dispatcher,
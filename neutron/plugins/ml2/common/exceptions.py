@@ -21,3 +21,9 @@ from neutron.common import exceptions
 class MechanismDriverError(exceptions.NeutronException):
     """Mechanism driver call failed."""
     message = _("%(method)s failed.")
+
+
+class JournaledPortBindingError(exceptions.NeutronException):
+    """Port binding change attempted by a journaled postcommit call."""
+    message = _("The binding of port %(port_id)s can't change in the "
+                "journaled postcommit call %(method)s.")
@@ -30,6 +30,38 @@ ml2_opts = [
                 help=_("An ordered list of networking mechanism driver "
                        "entrypoints to be loaded from the "
                        "neutron.ml2.mechanism_drivers namespace.")),
+    cfg.BoolOpt('host_targeted_notifications',
+                default=False,
+                help=_("Send the port update, network delete and security "
+                       "group notifications only to the agents of the hosts "
+                       "on which ports are bound, rather than to all the "
+                       "agents. All the L2 agents must consume their "
+                       "topic.host queues.")),
+    cfg.ListOpt('async_mechanism_drivers',
+                default=[],
+                help=_("List of mechanism drivers whose postcommit calls are "
+                       "recorded in a journal with the changes of the "
+                       "resources and run asynchronously, rather than "
+                       "during the API requests.")),
+    cfg.IntOpt('journal_workers',
+               default=8,
+               help=_("Number of journal entries run concurrently by each "
+                      "process draining the journal.")),
+    cfg.IntOpt('journal_interval',
+               default=2,
+               help=_("Seconds between two runs of the journal entries.")),
+    cfg.IntOpt('journal_max_attempts',
+               default=5,
+               help=_("Number of attempts to run a journal entry before it "
+                      "is marked as failed.")),
+    cfg.IntOpt('journal_retry_interval',
+               default=10,
+               help=_("Seconds before a failed journal entry is retried, "
+                      "multiplied by the number of attempts.")),
+    cfg.IntOpt('journal_claim_timeout',
+               default=300,
+               help=_("Seconds after which a journal entry claimed by a "
+                      "process which didn't complete it is run again.")),
 ]
 
 
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.db import api as db_api
@@ -27,6 +28,10 @@ from neutron.plugins.ml2 import models
 
 LOG = log.getLogger(__name__)
 
+# Maximum number of network ids in the IN clause of a segments query, some
+# databases limit the number of parameters of a statement
+SEGMENTS_QUERY_BATCH_SIZE = 500
+
 
 def add_network_segment(session, network_id, segment):
     with session.begin(subtransactions=True):
@@ -45,15 +50,35 @@ def add_network_segment(session, network_id, segment):
               'network_id': record.network_id})
 
 
+def _make_segment_dict(record):
+    return {api.ID: record.id,
+            api.NETWORK_TYPE: record.network_type,
+            api.PHYSICAL_NETWORK: record.physical_network,
+            api.SEGMENTATION_ID: record.segmentation_id}
+
+
 def get_network_segments(session, network_id):
     with session.begin(subtransactions=True):
         records = (session.query(models.NetworkSegment).
                    filter_by(network_id=network_id))
-        return [{api.ID: record.id,
-                 api.NETWORK_TYPE: record.network_type,
-                 api.PHYSICAL_NETWORK: record.physical_network,
-                 api.SEGMENTATION_ID: record.segmentation_id}
-                for record in records]
+        return [_make_segment_dict(record) for record in records]
+
+
+def get_networks_segments(session, network_ids):
+    """Get the segments of several networks in batched queries.
+
+    :returns: a dict mapping each network id to its list of segments.
+    """
+    result = dict((network_id, []) for network_id in network_ids)
+    network_ids = list(result)
+    with session.begin(subtransactions=True):
+        for i in range(0, len(network_ids), SEGMENTS_QUERY_BATCH_SIZE):
+            batch = network_ids[i:i + SEGMENTS_QUERY_BATCH_SIZE]
+            records = (session.query(models.NetworkSegment).
+                       filter(models.NetworkSegment.network_id.in_(batch)))
+            for record in records:
+                result[record.network_id].append(_make_segment_dict(record))
+    return result
 
 
 def ensure_port_binding(session, port_id):
@@ -87,6 +112,18 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get the port records matching several (possibly truncated) ids."""
+
+    if not port_ids:
+        return []
+    with session.begin(subtransactions=True):
+        return (session.query(models_v2.Port).
+                filter(sa.or_(*[models_v2.Port.id.startswith(port_id)
+                                for port_id in port_ids])).
+                all())
+
+
 def get_port_from_device_mac(device_mac):
     LOG.debug(_("get_port_from_device_mac() called for mac %s"), device_mac)
     session = db_api.get_session()
@@ -134,3 +171,38 @@ def get_port_binding_host(port_id):
                       {'port_id': port_id})
             return
     return query.host
+
+
+def get_network_hosts(session, network_id):
+    """Return the hosts on which ports of a network are bound."""
+    with session.begin(subtransactions=True):
+        query = (session.query(models.PortBinding.host).
+                 join(models_v2.Port).
+                 filter(models_v2.Port.network_id == network_id,
+                        models.PortBinding.host != '').
+                 distinct())
+        return [host for host, in query]
+
+
+def get_security_group_hosts(security_group_ids, remote=False):
+    """Return the hosts on which ports of security groups are bound.
+
+    With remote, the hosts of the ports whose security groups have rules
+    referring to the security groups as remote groups are returned.
+    """
+    sg_binding = sg_db.SecurityGroupPortBinding
+    sg_rule = sg_db.SecurityGroupRule
+    session = db_api.get_session()
+    with session.begin(subtransactions=True):
+        if remote:
+            security_group_ids = (
+                session.query(sg_rule.security_group_id).
+                filter(sg_rule.remote_group_id.in_(security_group_ids)).
+                subquery())
+        query = (session.query(models.PortBinding.host).
+                 join(sg_binding,
+                      sg_binding.port_id == models.PortBinding.port_id).
+                 filter(sg_binding.security_group_id.in_(security_group_ids),
+                        models.PortBinding.host != '').
+                 distinct())
+        return [host for host, in query]
@@ -582,6 +582,66 @@ class MechanismDriver(object):
         """
         pass
 
+    def delete_ports_precommit(self, contexts):
+        """Delete resources of the ports of a network being deleted.
+
+        :param contexts: list of PortContext instances describing the
+        current state of the ports, prior to the call to delete them.
+
+        Called inside transaction context on session when the ports
+        are deleted together, e.g. with their network. The default
+        implementation calls delete_port_precommit for each port,
+        drivers able to handle the ports in a single call can override
+        it. Raising an exception will result in rollback of the
+        transaction.
+        """
+        for context in contexts:
+            self.delete_port_precommit(context)
+
+    def delete_ports_postcommit(self, contexts):
+        """Delete the ports of a network being deleted.
+
+        :param contexts: list of PortContext instances describing the
+        current state of the ports, prior to the call to delete them.
+
+        Called after the transaction completes. The default
+        implementation calls delete_port_postcommit for each port,
+        drivers able to handle the ports in a single call can override
+        it. Runtime errors are not expected, and will not prevent the
+        resources from being deleted.
+        """
+        for context in contexts:
+            self.delete_port_postcommit(context)
+
+    def delete_subnets_precommit(self, contexts):
+        """Delete resources of the subnets of a network being deleted.
+
+        :param contexts: list of SubnetContext instances describing the
+        current state of the subnets, prior to the call to delete them.
+
+        Called inside transaction context on session when the subnets
+        are deleted together with their network. The default
+        implementation calls delete_subnet_precommit for each subnet.
+        Raising an exception will result in rollback of the
+        transaction.
+        """
+        for context in contexts:
+            self.delete_subnet_precommit(context)
+
+    def delete_subnets_postcommit(self, contexts):
+        """Delete the subnets of a network being deleted.
+
+        :param contexts: list of SubnetContext instances describing the
+        current state of the subnets, prior to the call to delete them.
+
+        Called after the transaction completes. The default
+        implementation calls delete_subnet_postcommit for each subnet.
+        Runtime errors are not expected, and will not prevent the
+        resources from being deleted.
+        """
+        for context in contexts:
+            self.delete_subnet_postcommit(context)
+
     def bind_port(self, context):
         """Attempt to bind a port.
 
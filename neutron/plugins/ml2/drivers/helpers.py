@@ -0,0 +1,161 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+import random
+
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import log
+
+LOG = log.getLogger(__name__)
+
+# Number of segmentation ids picked at random before the free ones are
+# looked for in order
+RANDOM_ATTEMPTS = 10
+
+
+class SegmentAllocator(object):
+    """Allocate the segmentation ids of a type driver.
+
+    Only the allocated segmentation ids have a row in the allocation
+    table, the ids of the pools without a row are free. The pools are
+    lists of (physical_network, min, max) tuples, where physical_network
+    is None for the types which have no physical network.
+
+    Tenant segments are allocated at random in the pools, so concurrent
+    allocations rarely compete for the same row.
+    """
+
+    def __init__(self, model, id_column, network_column=None):
+        self.model = model
+        self.id_column = id_column
+        self.network_column = network_column
+
+    def _key(self, physical_network, segmentation_id):
+        key = {self.id_column: segmentation_id}
+        if self.network_column:
+            key[self.network_column] = physical_network
+        return key
+
+    @staticmethod
+    def in_pools(pools, physical_network, segmentation_id):
+        return any(network == physical_network and
+                   id_min <= segmentation_id <= id_max
+                   for network, id_min, id_max in pools)
+
+    def sync(self, session):
+        """Remove the rows of the free segmentation ids.
+
+        They are left by the releases which had a row for each id of the
+        pools.
+        """
+        with session.begin(subtransactions=True):
+            count = (session.query(self.model).filter_by(allocated=False).
+                     delete(synchronize_session=False))
+            if count:
+                LOG.info(_("Removed %(count)s free %(table)s rows"),
+                         {'count': count,
+                          'table': self.model.__tablename__})
+
+    def get(self, session, pools, physical_network, segmentation_id):
+        """Return the allocation of a segmentation id.
+
+        An allocation which isn't stored is returned for the free ids of
+        the pools, None for the free ids outside of them.
+        """
+        key = self._key(physical_network, segmentation_id)
+        alloc = session.query(self.model).filter_by(**key).first()
+        if alloc is None and self.in_pools(pools, physical_network,
+                                           segmentation_id):
+            alloc = self.model(allocated=False, **key)
+        return alloc
+
+    def reserve(self, session, physical_network, segmentation_id):
+        """Allocate a given segmentation id.
+
+        Returns False if it is already allocated.
+        """
+        key = self._key(physical_network, segmentation_id)
+        with session.begin(subtransactions=True):
+            if session.query(self.model).filter_by(**key).first():
+                return False
+            insert = self.model.__table__.insert()
+            if session.bind.dialect.name == 'sqlite':
+                # NOTE: pysqlite does not support savepoints properly, and
+                # sqlite serializes writers anyway.
+                session.execute(insert, dict(key, allocated=True))
+                return True
+            try:
+                # The savepoint keeps the enclosing transaction usable
+                # when the insert fails
+                with session.begin(nested=True):
+                    session.execute(insert, dict(key, allocated=True))
+            except db_exc.DBDuplicateEntry:
+                # Allocated by a concurrent transaction
+                return False
+        return True
+
+    def _random_ids(self, pools):
+        sizes = [id_max - id_min + 1 for _network, id_min, id_max in pools]
+        total = sum(sizes)
+        if not total:
+            return
+        for i in range(RANDOM_ATTEMPTS):
+            index = random.randrange(total)
+            for (network, id_min, id_max), size in zip(pools, sizes):
+                if index < size:
+                    yield network, id_min + index
+                    break
+                index -= size
+
+    def _free_ids(self, session, pools):
+        column = getattr(self.model, self.id_column)
+        for network, id_min, id_max in pools:
+            query = session.query(column).filter(column >= id_min,
+                                                 column <= id_max)
+            if self.network_column:
+                query = query.filter(
+                    getattr(self.model, self.network_column) == network)
+            allocated_ids = [row[0] for row in query.order_by(column)]
+            next_id = id_min
+            for allocated_id in allocated_ids:
+                for segmentation_id in xrange(next_id, allocated_id):
+                    yield network, segmentation_id
+                next_id = allocated_id + 1
+            for segmentation_id in xrange(next_id, id_max + 1):
+                yield network, segmentation_id
+
+    def allocate(self, session, pools):
+        """Allocate a free segmentation id of the pools.
+
+        Returns the allocated (physical_network, segmentation_id), or None
+        if all the ids of the pools are allocated.
+        """
+        with session.begin(subtransactions=True):
+            for network, segmentation_id in itertools.chain(
+                    self._random_ids(pools), self._free_ids(session, pools)):
+                if self.reserve(session, network, segmentation_id):
+                    return network, segmentation_id
+
+    def release(self, session, physical_network, segmentation_id):
+        """Free a segmentation id.
+
+        Returns False if it wasn't allocated.
+        """
+        key = self._key(physical_network, segmentation_id)
+        with session.begin(subtransactions=True):
+            count = (session.query(self.model).filter_by(**key).
+                     delete(synchronize_session=False))
+        return bool(count)
@@ -24,6 +24,11 @@ l2_population_options = [
     cfg.IntOpt('agent_boot_time', default=180,
                help=_('Delay within which agent is expected to update '
                       'existing ports whent it restarts')),
+    cfg.FloatOpt('fanout_delay', default=0.5,
+                 help=_('Seconds during which the fdb entries to add or '
+                        'remove are accumulated before being sent to all '
+                        'the agents in a single message. 0 sends them '
+                        'immediately.')),
 ]
 
 cfg.CONF.register_opts(l2_population_options, "l2pop")
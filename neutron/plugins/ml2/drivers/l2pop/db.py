@@ -17,6 +17,8 @@
 # @author: Francois Eleouet, Orange
 # @author: Mathieu Rohon, Orange
 
+from sqlalchemy import orm
+
 from neutron.common import constants as const
 from neutron.db import agents_db
 from neutron.db import db_base_plugin_v2 as base_db
@@ -62,6 +64,9 @@ class L2populationDbMixin(base_db.CommonDbMixin):
                                agents_db.Agent.host ==
                                ml2_models.PortBinding.host)
             query = query.join(models_v2.Port)
+            # Load the ports, with their fixed ips, within the same query
+            query = query.options(orm.contains_eager(
+                ml2_models.PortBinding.port))
             query = query.filter(models_v2.Port.network_id == network_id,
                                  models_v2.Port.admin_state_up == True,
                                  agents_db.Agent.agent_type.in_(
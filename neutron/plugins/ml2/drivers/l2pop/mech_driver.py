@@ -184,13 +184,16 @@ class L2populationMechanismDriver(api.MechanismDriver,
                                   'ports': {}}}
             ports = agent_fdb_entries[network_id]['ports']
 
+            agent_ips = {}
             network_ports = self.get_network_ports(session, network_id)
             for network_port in network_ports:
                 binding, agent = network_port
                 if agent.host == agent_host:
                     continue
 
-                ip = self.get_agent_ip(agent)
+                if agent.host not in agent_ips:
+                    agent_ips[agent.host] = self.get_agent_ip(agent)
+                ip = agent_ips[agent.host]
                 if not ip:
                     LOG.debug(_("Unable to retrieve the agent ip, check "
                                 "the agent %(agent_host)s configuration."),
@@ -17,9 +17,13 @@
 # @author: Francois Eleouet, Orange
 # @author: Mathieu Rohon, Orange
 
+import eventlet
+from oslo.config import cfg
+
 from neutron.common import topics
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.rpc import proxy
+from neutron.plugins.ml2.drivers.l2pop import config  # noqa
 
 
 LOG = logging.getLogger(__name__)
@@ -35,6 +39,60 @@ class L2populationAgentNotifyAPI(proxy.RpcProxy):
         self.topic_l2pop_update = topics.get_topic_name(topic,
                                                         topics.L2POPULATION,
                                                         topics.UPDATE)
+        # The fdb entries waiting for the fanout_delay to expire, by method
+        # and network, as sets of tuples
+        self._pending_fdb_entries = {}
+        self._fanout_scheduled = False
+
+    def _queue_fanout(self, context, method, fdb_entries):
+        """Queue fdb entries to be sent to all the agents.
+
+        An entry queued for addition is dropped from the entries queued for
+        removal and vice versa, so the last change of an entry wins.
+        """
+        if method == 'add_fdb_entries':
+            opposite = 'remove_fdb_entries'
+        else:
+            opposite = 'add_fdb_entries'
+        pending = self._pending_fdb_entries.setdefault(method, {})
+        opposite_pending = self._pending_fdb_entries.get(opposite, {})
+
+        for network_id, network_entries in fdb_entries.iteritems():
+            pending_network = pending.setdefault(
+                network_id, {'segment_id': network_entries['segment_id'],
+                             'network_type': network_entries['network_type'],
+                             'ports': {}})
+            opposite_ports = opposite_pending.get(network_id,
+                                                  {}).get('ports', {})
+            for agent_ip, entries in network_entries['ports'].iteritems():
+                entries = set(tuple(entry) for entry in entries)
+                pending_network['ports'].setdefault(
+                    agent_ip, set()).update(entries)
+                if agent_ip in opposite_ports:
+                    opposite_ports[agent_ip] -= entries
+
+        if not self._fanout_scheduled:
+            self._fanout_scheduled = True
+            eventlet.spawn_after(cfg.CONF.l2pop.fanout_delay,
+                                 self._send_pending_fanout, context)
+
+    def _send_pending_fanout(self, context):
+        """Send the queued fdb entries, one message per method."""
+        pending, self._pending_fdb_entries = self._pending_fdb_entries, {}
+        self._fanout_scheduled = False
+
+        # Entries can't be both added and removed, the order is irrelevant
+        for method in ('remove_fdb_entries', 'add_fdb_entries'):
+            fdb_entries = {}
+            for network_id, network in pending.get(method, {}).iteritems():
+                ports = dict((agent_ip, [list(entry)
+                                         for entry in sorted(entries)])
+                             for agent_ip, entries in
+                             network['ports'].iteritems() if entries)
+                if ports:
+                    fdb_entries[network_id] = dict(network, ports=ports)
+            if fdb_entries:
+                self._notification_fanout(context, method, fdb_entries)
 
     def _notification_fanout(self, context, method, fdb_entries):
         LOG.debug(_('Fanout notify l2population agents at %(topic)s '
@@ -63,6 +121,8 @@ class L2populationAgentNotifyAPI(proxy.RpcProxy):
             if host:
                 self._notification_host(context, 'add_fdb_entries',
                                         fdb_entries, host)
+            elif cfg.CONF.l2pop.fanout_delay > 0:
+                self._queue_fanout(context, 'add_fdb_entries', fdb_entries)
             else:
                 self._notification_fanout(context, 'add_fdb_entries',
                                           fdb_entries)
@@ -72,12 +132,18 @@ class L2populationAgentNotifyAPI(proxy.RpcProxy):
             if host:
                 self._notification_host(context, 'remove_fdb_entries',
                                         fdb_entries, host)
+            elif cfg.CONF.l2pop.fanout_delay > 0:
+                self._queue_fanout(context, 'remove_fdb_entries',
+                                   fdb_entries)
             else:
                 self._notification_fanout(context, 'remove_fdb_entries',
                                           fdb_entries)
 
     def update_fdb_entries(self, context, fdb_entries, host=None):
         if fdb_entries:
+            # The updated entries may have been queued, send them first
+            if self._pending_fdb_entries:
+                self._send_pending_fanout(context)
             if host:
                 self._notification_host(context, 'update_fdb_entries',
                                         fdb_entries, host)
@@ -24,6 +24,7 @@ from neutron.db import model_base
 from neutron.openstack.common import log
 from neutron.plugins.common import constants as p_const
 from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2.drivers import helpers
 from neutron.plugins.ml2.drivers import type_tunnel
 
 LOG = log.getLogger(__name__)
@@ -46,6 +47,10 @@ cfg.CONF.register_opts(vxlan_opts, "ml2_type_vxlan")
 
 
 class VxlanAllocation(model_base.BASEV2):
+    """Represent an allocated VXLAN VNI.
+
+    The VNIs of the configured ranges without allocation are free.
+    """
 
     __tablename__ = 'ml2_vxlan_allocations'
 
@@ -68,6 +73,8 @@ class VxlanEndpoints(model_base.BASEV2):
 
 class VxlanTypeDriver(type_tunnel.TunnelTypeDriver):
 
+    allocator = helpers.SegmentAllocator(VxlanAllocation, 'vxlan_vni')
+
     def get_type(self):
         return p_const.TYPE_VXLAN
 
@@ -80,101 +87,64 @@ class VxlanTypeDriver(type_tunnel.TunnelTypeDriver):
         )
         self._sync_vxlan_allocations()
 
+    def _get_vni_pools(self):
+        return [(None, tun_min, tun_max)
+                for tun_min, tun_max in self.vxlan_vni_ranges]
+
     def reserve_provider_segment(self, session, segment):
         segmentation_id = segment.get(api.SEGMENTATION_ID)
-        with session.begin(subtransactions=True):
-            try:
-                alloc = (session.query(VxlanAllocation).
-                         filter_by(vxlan_vni=segmentation_id).
-                         with_lockmode('update').
-                         one())
-                if alloc.allocated:
-                    raise exc.TunnelIdInUse(tunnel_id=segmentation_id)
-                LOG.debug(_("Reserving specific vxlan tunnel %s from pool"),
-                          segmentation_id)
-                alloc.allocated = True
-            except sa_exc.NoResultFound:
-                LOG.debug(_("Reserving specific vxlan tunnel %s outside pool"),
-                          segmentation_id)
-                alloc = VxlanAllocation(vxlan_vni=segmentation_id)
-                alloc.allocated = True
-                session.add(alloc)
+        if not self.allocator.reserve(session, None, segmentation_id):
+            raise exc.TunnelIdInUse(tunnel_id=segmentation_id)
+        if helpers.SegmentAllocator.in_pools(self._get_vni_pools(), None,
+                                             segmentation_id):
+            LOG.debug(_("Reserving specific vxlan tunnel %s from pool"),
+                      segmentation_id)
+        else:
+            LOG.debug(_("Reserving specific vxlan tunnel %s outside pool"),
+                      segmentation_id)
 
     def allocate_tenant_segment(self, session):
-        with session.begin(subtransactions=True):
-            alloc = (session.query(VxlanAllocation).
-                     filter_by(allocated=False).
-                     with_lockmode('update').
-                     first())
-            if alloc:
-                LOG.debug(_("Allocating vxlan tunnel vni %(vxlan_vni)s"),
-                          {'vxlan_vni': alloc.vxlan_vni})
-                alloc.allocated = True
-                return {api.NETWORK_TYPE: p_const.TYPE_VXLAN,
-                        api.PHYSICAL_NETWORK: None,
-                        api.SEGMENTATION_ID: alloc.vxlan_vni}
+        alloc = self.allocator.allocate(session, self._get_vni_pools())
+        if alloc:
+            vxlan_vni = alloc[1]
+            LOG.debug(_("Allocating vxlan tunnel vni %(vxlan_vni)s"),
+                      {'vxlan_vni': vxlan_vni})
+            return {api.NETWORK_TYPE: p_const.TYPE_VXLAN,
+                    api.PHYSICAL_NETWORK: None,
+                    api.SEGMENTATION_ID: vxlan_vni}
 
     def release_segment(self, session, segment):
         vxlan_vni = segment[api.SEGMENTATION_ID]
-        with session.begin(subtransactions=True):
-            try:
-                alloc = (session.query(VxlanAllocation).
-                         filter_by(vxlan_vni=vxlan_vni).
-                         with_lockmode('update').
-                         one())
-                alloc.allocated = False
-                for low, high in self.vxlan_vni_ranges:
-                    if low <= vxlan_vni <= high:
-                        LOG.debug(_("Releasing vxlan tunnel %s to pool"),
-                                  vxlan_vni)
-                        break
-                else:
-                    session.delete(alloc)
-                    LOG.debug(_("Releasing vxlan tunnel %s outside pool"),
-                              vxlan_vni)
-            except sa_exc.NoResultFound:
-                LOG.warning(_("vxlan_vni %s not found"), vxlan_vni)
+        if not self.allocator.release(session, None, vxlan_vni):
+            LOG.warning(_("vxlan_vni %s not found"), vxlan_vni)
+        elif helpers.SegmentAllocator.in_pools(self._get_vni_pools(), None,
+                                               vxlan_vni):
+            LOG.debug(_("Releasing vxlan tunnel %s to pool"), vxlan_vni)
+        else:
+            LOG.debug(_("Releasing vxlan tunnel %s outside pool"), vxlan_vni)
 
     def _sync_vxlan_allocations(self):
         """
         Synchronize vxlan_allocations table with configured tunnel ranges.
-        """
 
-        # determine current configured allocatable vnis
-        vxlan_vnis = set()
+        Only the allocated VNIs are stored, so the ranges can be changed
+        without updating the table.
+        """
+        vni_ranges = []
         for tun_min, tun_max in self.vxlan_vni_ranges:
             if tun_max + 1 - tun_min > MAX_VXLAN_VNI:
                 LOG.error(_("Skipping unreasonable VXLAN VNI range "
                             "%(tun_min)s:%(tun_max)s"),
                           {'tun_min': tun_min, 'tun_max': tun_max})
             else:
-                vxlan_vnis |= set(xrange(tun_min, tun_max + 1))
-
-        session = db_api.get_session()
-        with session.begin(subtransactions=True):
-            # remove from table unallocated tunnels not currently allocatable
-            allocs = session.query(VxlanAllocation)
-            for alloc in allocs:
-                try:
-                    # see if tunnel is allocatable
-                    vxlan_vnis.remove(alloc.vxlan_vni)
-                except KeyError:
-                    # it's not allocatable, so check if its allocated
-                    if not alloc.allocated:
-                        # it's not, so remove it from table
-                        LOG.debug(_("Removing tunnel %s from pool"),
-                                  alloc.vxlan_vni)
-                        session.delete(alloc)
-
-            # add missing allocatable tunnels to table
-            for vxlan_vni in sorted(vxlan_vnis):
-                alloc = VxlanAllocation(vxlan_vni=vxlan_vni)
-                session.add(alloc)
+                vni_ranges.append((tun_min, tun_max))
+        self.vxlan_vni_ranges = vni_ranges
+        self.allocator.sync(db_api.get_session())
 
     def get_vxlan_allocation(self, session, vxlan_vni):
         with session.begin(subtransactions=True):
-            return session.query(VxlanAllocation).filter_by(
-                vxlan_vni=vxlan_vni).first()
+            return self.allocator.get(session, self._get_vni_pools(), None,
+                                      vxlan_vni)
 
     def get_endpoints(self):
         """Get every vxlan endpoints from database."""
@@ -0,0 +1,301 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Journal of the postcommit calls of asynchronous mechanism drivers.
+
+The postcommit calls of the drivers listed in async_mechanism_drivers
+are recorded in the ml2_postcommit_journal table by the matching
+precommit calls, in the transaction of the resource, rather than run
+during the API request. The JournalWorker of each process serving the
+RPCs of the plugin runs them afterwards. The entries of a network, its
+subnets and its ports are run in order, an entry is only run once the
+previous entries of its network and driver are completed or failed for
+good.
+"""
+
+import datetime
+
+import eventlet
+import sqlalchemy as sa
+
+from oslo.config import cfg
+
+from neutron import context as n_context
+from neutron.db import api as db_api
+from neutron import manager
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log
+from neutron.openstack.common import loopingcall
+from neutron.openstack.common import timeutils
+from neutron.plugins.ml2.common import exceptions as ml2_exc
+from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2 import models
+
+LOG = log.getLogger(__name__)
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+FAILED = 'failed'
+
+
+class JournalNetworkContext(api.NetworkContext):
+    """Network context rebuilt from a journal entry."""
+
+    def __init__(self, current, original, segments):
+        self._network = current
+        self._original_network = original
+        self._segments = segments
+
+    @property
+    def current(self):
+        return self._network
+
+    @property
+    def original(self):
+        return self._original_network
+
+    @property
+    def network_segments(self):
+        return self._segments
+
+
+class JournalSubnetContext(api.SubnetContext):
+    """Subnet context rebuilt from a journal entry."""
+
+    def __init__(self, current, original):
+        self._subnet = current
+        self._original_subnet = original
+
+    @property
+    def current(self):
+        return self._subnet
+
+    @property
+    def original(self):
+        return self._original_subnet
+
+
+class JournalPortContext(api.PortContext):
+    """Port context rebuilt from a journal entry.
+
+    The binding of the port can't be changed, the port being committed
+    in the database when the entry is run: set_binding raises
+    JournaledPortBindingError.
+    """
+
+    def __init__(self, current, original, network, host, bound_segment,
+                 original_bound_segment, bound_driver, original_bound_driver,
+                 method=None):
+        self._method = method
+        self._port = current
+        self._original_port = original
+        self._network_context = JournalNetworkContext(**network)
+        self._host = host
+        self._bound_segment = bound_segment
+        self._original_bound_segment = original_bound_segment
+        self._bound_driver = bound_driver
+        self._original_bound_driver = original_bound_driver
+
+    @property
+    def current(self):
+        return self._port
+
+    @property
+    def original(self):
+        return self._original_port
+
+    @property
+    def network(self):
+        return self._network_context
+
+    @property
+    def bound_segment(self):
+        return self._bound_segment
+
+    @property
+    def original_bound_segment(self):
+        return self._original_bound_segment
+
+    @property
+    def bound_driver(self):
+        return self._bound_driver
+
+    @property
+    def original_bound_driver(self):
+        return self._original_bound_driver
+
+    def host_agents(self, agent_type):
+        plugin = manager.NeutronManager.get_plugin()
+        return plugin.get_agents(n_context.get_admin_context(),
+                                 filters={'agent_type': [agent_type],
+                                          'host': [self._host]})
+
+    def set_binding(self, segment_id, vif_type, vif_details):
+        raise ml2_exc.JournaledPortBindingError(port_id=self._port['id'],
+                                                method=self._method)
+
+
+def _dump_network_context(context):
+    return {'current': context.current,
+            'original': context.original,
+            'segments': context.network_segments}
+
+
+def _dump_context(context):
+    """Return the network id and the JSON serializable data of a context."""
+    if isinstance(context, api.NetworkContext):
+        return context.current['id'], _dump_network_context(context)
+    elif isinstance(context, api.SubnetContext):
+        return context.current['network_id'], {'current': context.current,
+                                               'original': context.original}
+    return context.current['network_id'], {
+        'current': context.current,
+        'original': context.original,
+        'network': _dump_network_context(context.network),
+        'host': context._binding.host,
+        'bound_segment': context.bound_segment,
+        'original_bound_segment': context.original_bound_segment,
+        'bound_driver': context.bound_driver,
+        'original_bound_driver': context.original_bound_driver}
+
+
+def _load_context(method, data):
+    if '_network_' in method:
+        return JournalNetworkContext(**data)
+    elif '_subnet_' in method:
+        return JournalSubnetContext(**data)
+    return JournalPortContext(method=method, **data)
+
+
+def record(session, driver, method, context):
+    """Record the postcommit call of a driver in the journal."""
+    network_id, data = _dump_context(context)
+    now = timeutils.utcnow()
+    with session.begin(subtransactions=True):
+        session.add(models.PostcommitJournalEntry(
+            driver=driver, method=method, network_id=network_id,
+            context=jsonutils.dumps(data), state=PENDING, attempts=0,
+            created_at=now, next_attempt_at=now))
+
+
+def get_stats(session):
+    """Return the metrics of the journal.
+
+    depth is the number of entries waiting to be run or running, lag the
+    age in seconds of the oldest of them and failed the number of
+    entries which failed for good.
+    """
+    Entry = models.PostcommitJournalEntry
+    stats = dict(session.query(Entry.state, sa.func.count(Entry.id)).
+                 group_by(Entry.state))
+    oldest = (session.query(sa.func.min(Entry.created_at)).
+              filter(Entry.state != FAILED).scalar())
+    lag = 0
+    if oldest:
+        lag = timeutils.delta_seconds(oldest, timeutils.utcnow())
+    return {'depth': stats.get(PENDING, 0) + stats.get(PROCESSING, 0),
+            'lag': lag,
+            'failed': stats.get(FAILED, 0)}
+
+
+class JournalWorker(object):
+    """Run the journal entries of the asynchronous mechanism drivers."""
+
+    def __init__(self, mechanism_manager):
+        self.mechanism_manager = mechanism_manager
+        self.pool = eventlet.GreenPool(cfg.CONF.ml2.journal_workers)
+
+    def start(self):
+        self._loop = loopingcall.FixedIntervalLoopingCall(self.run)
+        self._loop.start(interval=cfg.CONF.ml2.journal_interval)
+
+    def _get_ready_entries(self, session):
+        """Return the entries which can be run now.
+
+        Only the first entry of each network and driver which didn't fail
+        for good is considered, so that the entries are run in order.
+        """
+        Entry = models.PostcommitJournalEntry
+        first_ids = (session.query(sa.func.min(Entry.id)).
+                     filter(Entry.state != FAILED).
+                     group_by(Entry.driver, Entry.network_id))
+        return (session.query(Entry).
+                filter(Entry.id.in_(first_ids.subquery()),
+                       Entry.next_attempt_at <= timeutils.utcnow()).
+                order_by(Entry.id).all())
+
+    def _claim(self, session, entry):
+        """Mark an entry as being run by this process.
+
+        The attempts counter of the entry is used to detect the concurrent
+        claims of other processes.
+        """
+        Entry = models.PostcommitJournalEntry
+        expiry = timeutils.utcnow() + datetime.timedelta(
+            seconds=cfg.CONF.ml2.journal_claim_timeout)
+        with session.begin(subtransactions=True):
+            count = (session.query(Entry).
+                     filter_by(id=entry.id, attempts=entry.attempts).
+                     update({'state': PROCESSING,
+                             'attempts': entry.attempts + 1,
+                             'next_attempt_at': expiry},
+                            synchronize_session=False))
+        return count == 1
+
+    def run(self):
+        session = db_api.get_session()
+        try:
+            stats = get_stats(session)
+            LOG.debug(_("Journal depth %(depth)s, lag %(lag)ss, "
+                        "%(failed)s failed entries"), stats)
+            if not stats['depth']:
+                return
+            for entry in self._get_ready_entries(session):
+                if self._claim(session, entry):
+                    self.pool.spawn_n(self._run_entry, entry.id,
+                                      entry.driver, entry.method,
+                                      entry.context, entry.attempts + 1)
+            self.pool.waitall()
+        except Exception:
+            LOG.exception(_("Failed to run the journal entries"))
+
+    def _run_entry(self, entry_id, driver_name, method, data, attempts):
+        session = db_api.get_session()
+        Entry = models.PostcommitJournalEntry
+        try:
+            driver = self.mechanism_manager.mech_drivers[driver_name]
+            context = _load_context(method, jsonutils.loads(data))
+            getattr(driver.obj, method)(context)
+        except Exception:
+            LOG.exception(_("Mechanism driver '%(name)s' failed in "
+                            "%(method)s of journal entry %(id)s, attempt "
+                            "%(attempts)s"),
+                          {'name': driver_name, 'method': method,
+                           'id': entry_id, 'attempts': attempts})
+            if attempts >= cfg.CONF.ml2.journal_max_attempts:
+                LOG.error(_("Giving up journal entry %s"), entry_id)
+                values = {'state': FAILED}
+            else:
+                delay = cfg.CONF.ml2.journal_retry_interval * attempts
+                values = {'state': PENDING,
+                          'next_attempt_at': timeutils.utcnow() +
+                          datetime.timedelta(seconds=delay)}
+            with session.begin(subtransactions=True):
+                session.query(Entry).filter_by(id=entry_id).update(
+                    values, synchronize_session=False)
+            return
+        with session.begin(subtransactions=True):
+            session.query(Entry).filter_by(id=entry_id).delete(
+                synchronize_session=False)
@@ -21,10 +21,16 @@ from neutron.extensions import portbindings
 from neutron.openstack.common import log
 from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2 import journal
 
 
 LOG = log.getLogger(__name__)
 
+# Batch precommit calls, whose postcommit calls are recorded in the
+# journal as one call per resource
+BATCH_METHODS = {'delete_ports_precommit': 'delete_port_postcommit',
+                 'delete_subnets_precommit': 'delete_subnet_postcommit'}
+
 
 class TypeManager(stevedore.named.NamedExtensionManager):
     """Manage network segment types using drivers."""
@@ -119,6 +125,15 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
                                                name_order=True)
         LOG.info(_("Loaded mechanism driver names: %s"), self.names())
         self._register_mechanisms()
+        # Names of the drivers whose postcommit calls are journaled
+        self.async_drivers = set(cfg.CONF.ml2.async_mechanism_drivers)
+        unknown_drivers = self.async_drivers - set(self.mech_drivers)
+        if unknown_drivers:
+            LOG.error(_("Asynchronous mechanism drivers %s are not loaded"),
+                      sorted(unknown_drivers))
+            self.async_drivers -= unknown_drivers
+        LOG.info(_("Asynchronous mechanism drivers: %s"),
+                 sorted(self.async_drivers))
 
     def _register_mechanisms(self):
         """Register all mechanism drivers.
@@ -151,11 +166,24 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         all mechanism drivers once one has raised an exception
         :raises: neutron.plugins.ml2.common.MechanismDriverError
         if any mechanism driver call fails.
+
+        The postcommit calls of the asynchronous drivers are recorded in
+        the journal by the matching precommit calls, within the database
+        transaction of the resource. The journal worker runs them, so
+        the postcommit calls skip these drivers.
         """
+        precommit = method_name.endswith('_precommit')
+        postcommit = method_name.endswith('_postcommit')
         error = False
         for driver in self.ordered_mech_drivers:
+            journaled = driver.name in self.async_drivers
+            if postcommit and journaled:
+                continue
             try:
                 getattr(driver.obj, method_name)(context)
+                if precommit and journaled:
+                    self._record_in_journal(driver.name, method_name,
+                                            context)
             except Exception:
                 LOG.exception(
                     _("Mechanism driver '%(name)s' failed in %(method)s"),
@@ -169,6 +197,22 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
                 method=method_name
             )
 
+    def _record_in_journal(self, driver_name, method_name, context):
+        """Record the postcommit call matching a precommit call.
+
+        The batch calls are recorded as one entry per resource, so that
+        the journal entries stay ordered per network.
+        """
+        if method_name in BATCH_METHODS:
+            method_name = BATCH_METHODS[method_name]
+            contexts = context
+        else:
+            method_name = method_name.replace('_precommit', '_postcommit')
+            contexts = [context]
+        for context in contexts:
+            journal.record(context._plugin_context.session,
+                           driver_name, method_name, context)
+
     def create_network_precommit(self, context):
         """Notify all mechanism drivers during network creation.
 
@@ -427,6 +471,60 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         self._call_on_drivers("delete_port_postcommit", context,
                               continue_on_failure=True)
 
+    def delete_ports_precommit(self, contexts):
+        """Notify all mechanism drivers during the deletion of ports.
+
+        :param contexts: list of PortContext instances of the ports
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver delete_ports_precommit call fails.
+
+        Called within the database transaction deleting a network
+        with its ports. If a mechanism driver raises an exception,
+        then a MechanismDriverError is propogated to the caller,
+        triggering a rollback.
+        """
+        self._call_on_drivers("delete_ports_precommit", contexts)
+
+    def delete_ports_postcommit(self, contexts):
+        """Notify all mechanism drivers after the deletion of ports.
+
+        :param contexts: list of PortContext instances of the ports
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver delete_ports_postcommit call fails.
+
+        Called after the database transaction. Every mechanism driver
+        is called even if one fails, as for delete_port_postcommit.
+        """
+        self._call_on_drivers("delete_ports_postcommit", contexts,
+                              continue_on_failure=True)
+
+    def delete_subnets_precommit(self, contexts):
+        """Notify all mechanism drivers during the deletion of subnets.
+
+        :param contexts: list of SubnetContext instances of the subnets
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver delete_subnets_precommit call fails.
+
+        Called within the database transaction deleting a network
+        with its subnets. If a mechanism driver raises an exception,
+        then a MechanismDriverError is propogated to the caller,
+        triggering a rollback.
+        """
+        self._call_on_drivers("delete_subnets_precommit", contexts)
+
+    def delete_subnets_postcommit(self, contexts):
+        """Notify all mechanism drivers after the deletion of subnets.
+
+        :param contexts: list of SubnetContext instances of the subnets
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver delete_subnets_postcommit call fails.
+
+        Called after the database transaction. Every mechanism driver
+        is called even if one fails, as for delete_subnet_postcommit.
+        """
+        self._call_on_drivers("delete_subnets_postcommit", contexts,
+                              continue_on_failure=True)
+
     def bind_port(self, context):
         """Attempt to bind a port using registered mechanism drivers.
 
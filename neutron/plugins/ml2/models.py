@@ -74,3 +74,24 @@ class PortBinding(model_base.BASEV2):
         backref=orm.backref("port_binding",
                             lazy='joined', uselist=False,
                             cascade='delete'))
+
+
+class PostcommitJournalEntry(model_base.BASEV2):
+    """Represent a postcommit call of an asynchronous mechanism driver.
+
+    The entries of a network, its subnets and its ports are run in the
+    order of their ids. The context passed to the driver is stored as
+    JSON.
+    """
+
+    __tablename__ = 'ml2_postcommit_journal'
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    driver = sa.Column(sa.String(64), nullable=False)
+    method = sa.Column(sa.String(64), nullable=False)
+    network_id = sa.Column(sa.String(36), nullable=False, index=True)
+    context = sa.Column(sa.Text, nullable=False)
+    state = sa.Column(sa.String(16), nullable=False)
+    attempts = sa.Column(sa.Integer, nullable=False, default=0)
+    created_at = sa.Column(sa.DateTime, nullable=False)
+    next_attempt_at = sa.Column(sa.DateTime, nullable=False)
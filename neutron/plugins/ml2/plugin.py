@@ -49,6 +49,7 @@ from neutron.plugins.ml2 import config  # noqa
 from neutron.plugins.ml2 import db
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2 import driver_context
+from neutron.plugins.ml2 import journal
 from neutron.plugins.ml2 import managers
 from neutron.plugins.ml2 import models
 from neutron.plugins.ml2 import rpc
@@ -77,11 +78,13 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
     """
 
     # This attribute specifies whether the plugin supports or not
-    # bulk/pagination/sorting operations. Name mangling is used in
-    # order to ensure it is qualified by class
+    # bulk/pagination/sorting operations and reads from the slave
+    # database. Name mangling is used in order to ensure it is qualified
+    # by class
     __native_bulk_support = True
     __native_pagination_support = True
     __native_sorting_support = True
+    __native_read_only_support = True
 
     # List of supported extensions
     _supported_extension_aliases = ["provider", "external-net", "binding",
@@ -130,6 +133,12 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
         self.conn.create_consumer(self.topic, self.dispatcher,
                                   fanout=False)
+        # The processes serving the RPCs drain the journal of the
+        # asynchronous mechanism drivers
+        if self.mechanism_manager.async_drivers:
+            self.journal_worker = journal.JournalWorker(
+                self.mechanism_manager)
+            self.journal_worker.start()
         return self.conn.consume_in_thread()
 
     def _process_provider_segment(self, segment):
@@ -181,9 +190,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             value = None
         return value
 
-    def _extend_network_dict_provider(self, context, network):
+    def _extend_network_dict_provider(self, context, network, segments=None):
         id = network['id']
-        segments = db.get_network_segments(context.session, id)
+        if segments is None:
+            segments = db.get_network_segments(context.session, id)
         if not segments:
             LOG.error(_("Network %s has no segments"), id)
             network[provider.NETWORK_TYPE] = None
@@ -201,9 +211,29 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             network[provider.PHYSICAL_NETWORK] = segment[api.PHYSICAL_NETWORK]
             network[provider.SEGMENTATION_ID] = segment[api.SEGMENTATION_ID]
 
-    def _filter_nets_provider(self, context, nets, filters):
-        # TODO(rkukura): Implement filtering.
-        return nets
+    def _ml2_network_result_filter_hook(self, query, filters):
+        segment_filters = [(column, filters[key]) for key, column in
+                           ((provider.NETWORK_TYPE,
+                             models.NetworkSegment.network_type),
+                            (provider.PHYSICAL_NETWORK,
+                             models.NetworkSegment.physical_network),
+                            (provider.SEGMENTATION_ID,
+                             models.NetworkSegment.segmentation_id))
+                           if filters.get(key)]
+        if not segment_filters:
+            return query
+        # A network matches if one of its segments matches all the filters
+        segments = query.session.query(models.NetworkSegment.network_id)
+        for column, values in segment_filters:
+            segments = segments.filter(column.in_(values))
+        return query.filter(models_v2.Network.id.in_(segments.subquery()))
+
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_query_hook(
+        models_v2.Network,
+        "ml2_provider",
+        None,
+        None,
+        '_ml2_network_result_filter_hook')
 
     def _process_port_binding(self, mech_context, attrs):
         binding = mech_context._binding
@@ -421,10 +451,14 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             nets = super(Ml2Plugin,
                          self).get_networks(context, filters, None, sorts,
                                             limit, marker, page_reverse)
+            # The provider filters are applied by the network query, the
+            # segments of all the networks are fetched with a single query
+            segments = db.get_networks_segments(
+                session, [net['id'] for net in nets])
             for net in nets:
-                self._extend_network_dict_provider(context, net)
+                self._extend_network_dict_provider(context, net,
+                                                   segments[net['id']])
 
-            nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
 
         return [self._fields(net, fields) for net in nets]
@@ -432,12 +466,15 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
     def delete_network(self, context, id):
         # REVISIT(rkukura) The super(Ml2Plugin, self).delete_network()
         # function is not used because it auto-deletes ports and
-        # subnets from the DB without invoking the derived class's
-        # delete_port() or delete_subnet(), preventing mechanism
-        # drivers from being called. This approach should be revisited
-        # when the API layer is reworked during icehouse.
+        # subnets from the DB without invoking the mechanism drivers.
+        # The auto-deleted ports and subnets are deleted in the
+        # transaction deleting the network, rather than one by one
+        # with delete_port() and delete_subnet(), so that the mechanism
+        # drivers and the agents are notified once for all of them.
 
         LOG.debug(_("Deleting network %s"), id)
+        l3plugin = manager.NeutronManager.get_service_plugins().get(
+            service_constants.L3_ROUTER_NAT)
         session = context.session
         while True:
             try:
@@ -463,25 +500,32 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                                with_lockmode('update').all())
                     LOG.debug(_("Subnets to auto-delete: %s"), subnets)
 
-                    if not (ports or subnets):
-                        network = self.get_network(context, id)
-                        mech_context = driver_context.NetworkContext(self,
-                                                                     context,
-                                                                     network)
-                        self.mechanism_manager.delete_network_precommit(
-                            mech_context)
-
-                        record = self._get_network(context, id)
-                        LOG.debug(_("Deleting network record %s"), record)
-                        session.delete(record)
-
-                        for segment in mech_context.network_segments:
-                            self.type_manager.release_segment(session, segment)
-
-                        # The segment records are deleted via cascade from the
-                        # network record, so explicit removal is not necessary.
-                        LOG.debug(_("Committing transaction"))
-                        break
+                    # Hosts of the agents notified of the deletion
+                    hosts = db.get_network_hosts(session, id)
+                    network = self.get_network(context, id)
+                    mech_context = driver_context.NetworkContext(self,
+                                                                 context,
+                                                                 network)
+                    port_contexts = self._delete_network_ports(
+                        context, ports, network, l3plugin)
+                    subnet_contexts = self._delete_network_subnets(
+                        context, subnets)
+                    self.mechanism_manager.delete_network_precommit(
+                        mech_context)
+
+                    record = self._get_network(context, id)
+                    # The subnets loaded by get_network() are deleted
+                    session.expire(record, ['ports', 'subnets'])
+                    LOG.debug(_("Deleting network record %s"), record)
+                    session.delete(record)
+
+                    for segment in mech_context.network_segments:
+                        self.type_manager.release_segment(session, segment)
+
+                    # The segment records are deleted via cascade from the
+                    # network record, so explicit removal is not necessary.
+                    LOG.debug(_("Committing transaction"))
+                    break
             except os_db.exception.DBError as e:
                 if isinstance(e.inner_exception, sql_exc.IntegrityError):
                     msg = _("A concurrent port creation has occurred")
@@ -490,22 +534,22 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                 else:
                     raise
 
-            for port in ports:
-                try:
-                    self.delete_port(context, port.id)
-                except Exception:
-                    LOG.exception(_("Exception auto-deleting port %s"),
-                                  port.id)
-                    raise
-
-            for subnet in subnets:
-                try:
-                    self.delete_subnet(context, subnet.id)
-                except Exception:
-                    LOG.exception(_("Exception auto-deleting subnet %s"),
-                                  subnet.id)
-                    raise
-
+        if port_contexts:
+            try:
+                self.mechanism_manager.delete_ports_postcommit(port_contexts)
+            except ml2_exc.MechanismDriverError:
+                LOG.error(_("mechanism_manager.delete_ports_postcommit "
+                            "failed"))
+            self.notify_security_groups_member_updated_bulk(
+                context, [port_context.current
+                          for port_context in port_contexts])
+        if subnet_contexts:
+            try:
+                self.mechanism_manager.delete_subnets_postcommit(
+                    subnet_contexts)
+            except ml2_exc.MechanismDriverError:
+                LOG.error(_("mechanism_manager.delete_subnets_postcommit "
+                            "failed"))
         try:
             self.mechanism_manager.delete_network_postcommit(mech_context)
         except ml2_exc.MechanismDriverError:
@@ -513,7 +557,60 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             # delete the network.  Ideally we'd notify the caller of
             # the fact that an error occurred.
             LOG.error(_("mechanism_manager.delete_network_postcommit failed"))
-        self.notifier.network_delete(context, id)
+        self.notifier.network_delete(context, id, hosts=hosts)
+
+    def _delete_network_ports(self, context, ports, network, l3plugin):
+        """Delete the auto-deleted ports of a network being deleted.
+
+        Called within the transaction deleting the network, the ports
+        being locked. The rows of all the ports are deleted in a
+        single flush. Return the PortContext instances of the ports.
+        """
+        if not ports:
+            return []
+        session = context.session
+        # Load the ports with their fixed IPs and bindings in one query
+        port_dbs = (session.query(models_v2.Port).
+                    filter(models_v2.Port.id.in_([p.id for p in ports])).
+                    all())
+        port_contexts = [
+            driver_context.PortContext(self, context,
+                                       self._make_port_dict(port_db),
+                                       network)
+            for port_db in port_dbs]
+        self.mechanism_manager.delete_ports_precommit(port_contexts)
+        for port_context in port_contexts:
+            self._delete_port_binding(port_context)
+        for port_db in port_dbs:
+            if l3plugin:
+                l3plugin.disassociate_floatingips(context, port_db.id)
+            # The security group, extra DHCP options, allowed address
+            # pairs and binding records are deleted via cascade.
+            for allocation in port_db.fixed_ips:
+                session.delete(allocation)
+            session.delete(port_db)
+        session.flush()
+        return port_contexts
+
+    def _delete_network_subnets(self, context, subnets):
+        """Delete the subnets of a network being deleted.
+
+        Called within the transaction deleting the network, after its
+        ports are deleted. Return the SubnetContext instances of the
+        subnets.
+        """
+        if not subnets:
+            return []
+        session = context.session
+        subnet_contexts = [
+            driver_context.SubnetContext(self, context,
+                                         self._make_subnet_dict(subnet))
+            for subnet in subnets]
+        self.mechanism_manager.delete_subnets_precommit(subnet_contexts)
+        for subnet in subnets:
+            session.delete(subnet)
+        session.flush()
+        return subnet_contexts
 
     def create_subnet(self, context, subnet):
         session = context.session
@@ -269,9 +269,10 @@ class MlnxEswitchNeutronAgent(sg_rpc.SecurityGroupAgentRpcMixin):
                                                  self)
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
         # Define the listening consumers for the agent
-        consumers = [[topics.PORT, topics.UPDATE],
-                     [topics.NETWORK, topics.DELETE],
-                     [topics.SECURITY_GROUP, topics.UPDATE]]
+        # The server may send the notifications to the host of the ports
+        consumers = [[topics.PORT, topics.UPDATE, cfg.CONF.host],
+                     [topics.NETWORK, topics.DELETE, cfg.CONF.host],
+                     [topics.SECURITY_GROUP, topics.UPDATE, cfg.CONF.host]]
         self.connection = agent_rpc.create_consumers(self.dispatcher,
                                                      self.topic,
                                                      consumers)
@@ -29,7 +29,6 @@ from neutron.db import api as db
 from neutron.db import db_base_plugin_v2
 from neutron.db import external_net_db
 from neutron.db import l3_db
-from neutron.db import models_v2
 from neutron.db import quota_db  # noqa
 from neutron.extensions import portbindings
 from neutron.openstack.common import excutils
@@ -117,10 +116,9 @@ class NuagePlugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         # Update ips if necessary
         for ip in ips:
-            allocated = models_v2.IPAllocation(
-                network_id=port['network_id'], port_id=port['id'],
-                ip_address=ip['ip_address'], subnet_id=ip['subnet_id'])
-            context.session.add(allocated)
+            self._store_ip_allocation(context, ip['ip_address'],
+                                      port['network_id'], ip['subnet_id'],
+                                      port['id'])
 
     def _create_update_port(self, context, port,
                             port_mapping, subnet_mapping):
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import random
 import signal
 import sys
 import time
@@ -187,6 +188,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                'l2_population': self.l2_pop},
             'agent_type': q_const.AGENT_TYPE_OVS,
             'start_flag': True}
+        self.use_call = True
 
         # Keep track of int_br's device count for use by _report_state()
         self.int_br_device_count = 0
@@ -239,8 +241,10 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             self.int_br_device_count)
         try:
             self.state_rpc.report_state(self.context,
-                                        self.agent_state)
+                                        self.agent_state,
+                                        self.use_call)
             self.agent_state.pop('start_flag', None)
+            self.use_call = False
         except Exception:
             LOG.exception(_("Failed reporting state!"))
 
@@ -256,10 +260,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         # Handle updates from service
         self.dispatcher = self.create_rpc_dispatcher()
         # Define the listening consumers for the agent
-        consumers = [[topics.PORT, topics.UPDATE],
-                     [topics.NETWORK, topics.DELETE],
+        # The server may send the notifications to the host of the ports
+        consumers = [[topics.PORT, topics.UPDATE, cfg.CONF.host],
+                     [topics.NETWORK, topics.DELETE, cfg.CONF.host],
                      [constants.TUNNEL, topics.UPDATE],
-                     [topics.SECURITY_GROUP, topics.UPDATE]]
+                     [topics.SECURITY_GROUP, topics.UPDATE, cfg.CONF.host]]
         if self.l2_pop:
             consumers.append([topics.L2POPULATION,
                               topics.UPDATE, cfg.CONF.host])
@@ -270,7 +275,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         if report_interval:
             heartbeat = loopingcall.FixedIntervalLoopingCall(
                 self._report_state)
-            heartbeat.start(interval=report_interval)
+            # Spread over the interval the reports of the agents started at
+            # the same time
+            heartbeat.start(
+                interval=report_interval,
+                initial_delay=random.uniform(0, report_interval))
 
     def get_net_uuid(self, vif_id):
         for network_id, vlan_mapping in self.local_vlan_map.iteritems():
@@ -328,7 +337,9 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             agent_ports = values.get('ports')
             agent_ports.pop(self.local_ip, None)
             if len(agent_ports):
-                self.tun_br.defer_apply_on()
+                # The rpc_loop may be deferring the flows of tun_br,
+                # queue these ones apart so that they are applied here
+                tun_br = ovs_lib.DeferredOVSBridge(self.tun_br)
                 for agent_ip, ports in agent_ports.items():
                     # Ensure we have a tunnel port with this remote agent
                     ofport = self.tun_br_ofports[
@@ -343,8 +354,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                         if ofport == 0:
                             continue
                     for port in ports:
-                        self._add_fdb_flow(port, agent_ip, lvm, ofport)
-                self.tun_br.defer_apply_off()
+                        self._add_fdb_flow(tun_br, port, agent_ip, lvm, ofport)
+                tun_br.apply_flows()
 
     def fdb_remove(self, context, fdb_entries):
         LOG.debug(_("fdb_remove received"))
@@ -356,56 +367,56 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             agent_ports = values.get('ports')
             agent_ports.pop(self.local_ip, None)
             if len(agent_ports):
-                self.tun_br.defer_apply_on()
+                tun_br = ovs_lib.DeferredOVSBridge(self.tun_br)
                 for agent_ip, ports in agent_ports.items():
                     ofport = self.tun_br_ofports[
                         lvm.network_type].get(agent_ip)
                     if not ofport:
                         continue
                     for port in ports:
-                        self._del_fdb_flow(port, agent_ip, lvm, ofport)
-                self.tun_br.defer_apply_off()
+                        self._del_fdb_flow(tun_br, port, agent_ip, lvm, ofport)
+                tun_br.apply_flows()
 
-    def _add_fdb_flow(self, port_info, agent_ip, lvm, ofport):
+    def _add_fdb_flow(self, br, port_info, agent_ip, lvm, ofport):
         if port_info == q_const.FLOODING_ENTRY:
             lvm.tun_ofports.add(ofport)
             ofports = ','.join(lvm.tun_ofports)
-            self.tun_br.mod_flow(table=constants.FLOOD_TO_TUN,
-                                 priority=1,
-                                 dl_vlan=lvm.vlan,
-                                 actions="strip_vlan,set_tunnel:%s,"
-                                 "output:%s" % (lvm.segmentation_id, ofports))
+            br.mod_flow(table=constants.FLOOD_TO_TUN,
+                        priority=1,
+                        dl_vlan=lvm.vlan,
+                        actions="strip_vlan,set_tunnel:%s,"
+                        "output:%s" % (lvm.segmentation_id, ofports))
         else:
             # TODO(feleouet): add ARP responder entry
-            self.tun_br.add_flow(table=constants.UCAST_TO_TUN,
-                                 priority=2,
-                                 dl_vlan=lvm.vlan,
-                                 dl_dst=port_info[0],
-                                 actions="strip_vlan,set_tunnel:%s,output:%s" %
-                                 (lvm.segmentation_id, ofport))
-
-    def _del_fdb_flow(self, port_info, agent_ip, lvm, ofport):
+            br.add_flow(table=constants.UCAST_TO_TUN,
+                        priority=2,
+                        dl_vlan=lvm.vlan,
+                        dl_dst=port_info[0],
+                        actions="strip_vlan,set_tunnel:%s,output:%s" %
+                        (lvm.segmentation_id, ofport))
+
+    def _del_fdb_flow(self, br, port_info, agent_ip, lvm, ofport):
         if port_info == q_const.FLOODING_ENTRY:
             lvm.tun_ofports.remove(ofport)
             if len(lvm.tun_ofports) > 0:
                 ofports = ','.join(lvm.tun_ofports)
-                self.tun_br.mod_flow(table=constants.FLOOD_TO_TUN,
-                                     priority=1,
-                                     dl_vlan=lvm.vlan,
-                                     actions="strip_vlan,"
-                                     "set_tunnel:%s,output:%s" %
-                                     (lvm.segmentation_id, ofports))
+                br.mod_flow(table=constants.FLOOD_TO_TUN,
+                            priority=1,
+                            dl_vlan=lvm.vlan,
+                            actions="strip_vlan,"
+                            "set_tunnel:%s,output:%s" %
+                            (lvm.segmentation_id, ofports))
             else:
                 # This local vlan doesn't require any more tunelling
-                self.tun_br.delete_flows(table=constants.FLOOD_TO_TUN,
-                                         dl_vlan=lvm.vlan)
+                br.delete_flows(table=constants.FLOOD_TO_TUN,
+                                dl_vlan=lvm.vlan)
             # Check if this tunnel port is still used
             self.cleanup_tunnel_port(ofport, lvm.network_type)
         else:
             #TODO(feleouet): remove ARP responder entry
-            self.tun_br.delete_flows(table=constants.UCAST_TO_TUN,
-                                     dl_vlan=lvm.vlan,
-                                     dl_dst=port_info[0])
+            br.delete_flows(table=constants.UCAST_TO_TUN,
+                            dl_vlan=lvm.vlan,
+                            dl_dst=port_info[0])
 
     def fdb_update(self, context, fdb_entries):
         LOG.debug(_("fdb_update received"))
@@ -841,6 +852,54 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         port_info['removed'] = registered_ports - cur_ports
         return port_info
 
+    def process_port_events(self, events, registered_ports,
+                            updated_ports=None):
+        """Compute the port changes from the events of the ovsdb monitor.
+
+        Contrary to scan_ports(), only the interfaces which changed are
+        looked at, so the cost depends on the churn rather than on the
+        number of ports of the integration bridge.  Returns None when
+        the events can't be mapped to ports, in which case scan_ports()
+        has to be used.
+        """
+        cur_ports = set(registered_ports)
+        for device in events['removed']:
+            vif_id = device['external_ids'].get('iface-id')
+            if vif_id is None and 'xs-vif-uuid' in device['external_ids']:
+                # The iface-id of XenServer VIFs is only known by XAPI
+                return
+            cur_ports.discard(vif_id)
+        for device in events['added'] + events['modified']:
+            external_ids = device['external_ids']
+            vif_id = external_ids.get('iface-id')
+            if vif_id is None and 'xs-vif-uuid' in external_ids:
+                return
+            if vif_id is None or 'attached-mac' not in external_ids:
+                continue
+            try:
+                ofport = int(device['ofport'])
+            except (ValueError, TypeError):
+                ofport = None
+            if not ofport or ofport < 0:
+                # The interface is not ready or has failed
+                cur_ports.discard(vif_id)
+            elif vif_id not in cur_ports:
+                bridge = ovs_lib.get_bridge_for_iface(self.root_helper,
+                                                      device['name'])
+                if bridge == self.int_br.br_name:
+                    cur_ports.add(vif_id)
+
+        self.int_br_device_count = len(cur_ports)
+        port_info = {'current': cur_ports}
+        if updated_ports:
+            updated_ports &= cur_ports
+            if updated_ports:
+                port_info['updated'] = updated_ports
+        if cur_ports != registered_ports:
+            port_info['added'] = cur_ports - registered_ports
+            port_info['removed'] = registered_ports - cur_ports
+        return port_info
+
     def check_changed_vlans(self, registered_ports):
         """Return ports which have lost their vlan tag.
 
@@ -951,6 +1010,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
 
     def treat_devices_added_or_updated(self, devices):
         resync = False
+        ports = {}
         for device in devices:
             LOG.debug(_("Processing port %s"), device)
             port = self.int_br.get_vif_port_by_id(device)
@@ -961,18 +1021,23 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                 LOG.info(_("Port %s was not found on the integration bridge "
                            "and will therefore not be processed"), device)
                 continue
-            try:
-                # TODO(salv-orlando): Provide bulk API for retrieving
-                # details for all devices in one call
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+            ports[device] = port
+        if not ports:
+            return resync
+        try:
+            devices_details_list = self.plugin_rpc.get_devices_details_list(
+                self.context, ports.keys(), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': ports.keys(), 'e': e})
+            # resync is needed
+            return True
+        devices_up = []
+        devices_down = []
+        for details in devices_details_list:
+            device = details['device']
+            port = ports[device]
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': details})
@@ -985,78 +1050,84 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                 # update plugin about port status
                 if details.get('admin_state_up'):
                     LOG.debug(_("Setting status for %s to UP"), device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_up.append(device)
                 else:
                     LOG.debug(_("Setting status for %s to DOWN"), device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
-                LOG.info(_("Configuration for device %s completed."), device)
+                    devices_down.append(device)
             else:
                 LOG.warn(_("Device %s not defined on plugin"), device)
                 if (port and port.ofport != -1):
                     self.port_dead(port)
+        # The status of the ports is only reported once their flows are in
+        # place, the whole bridges are processed again if they are not
+        if not self._flush_deferred_flows():
+            return True
+        if devices_up:
+            self.plugin_rpc.update_devices_up(
+                self.context, devices_up, self.agent_id, cfg.CONF.host)
+        if devices_down:
+            self.plugin_rpc.update_devices_down(
+                self.context, devices_down, self.agent_id, cfg.CONF.host)
+        LOG.info(_("Configuration for devices %s completed."),
+                 devices_up + devices_down)
         return resync
 
     def treat_ancillary_devices_added(self, devices):
-        resync = False
-        for device in devices:
-            LOG.info(_("Ancillary Port %s added"), device)
-            try:
-                self.plugin_rpc.get_device_details(self.context, device,
-                                                   self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-
-            # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id,
-                                             cfg.CONF.host)
-        return resync
+        LOG.info(_("Ancillary Ports %s added"), devices)
+        try:
+            self.plugin_rpc.get_devices_details_list(self.context, devices,
+                                                     self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+
+        if not self._flush_deferred_flows():
+            return True
+        # update plugin about port status
+        self.plugin_rpc.update_devices_up(self.context,
+                                          devices,
+                                          self.agent_id,
+                                          cfg.CONF.host)
+        return False
 
     def treat_devices_removed(self, devices):
         resync = False
         self.sg_agent.remove_devices_filter(devices)
+        LOG.info(_("Attachments %s removed"), devices)
+        try:
+            self.plugin_rpc.update_devices_down(self.context,
+                                                devices,
+                                                self.agent_id,
+                                                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            return True
         for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
             self.port_unbound(device)
         return resync
 
     def treat_ancillary_devices_removed(self, devices):
-        resync = False
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        LOG.info(_("Attachments %s removed"), devices)
+        try:
+            devices_details_list = self.plugin_rpc.update_devices_down(
+                self.context, devices, self.agent_id, cfg.CONF.host)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            # resync is needed
+            return True
+        for details in devices_details_list:
             if details['exists']:
-                LOG.info(_("Port %s updated."), device)
+                LOG.info(_("Port %s updated."), details['device'])
                 # Nothing to do regarding local networking
             else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-        return resync
+                LOG.debug(_("Device %s not defined on plugin"),
+                          details['device'])
+        return False
 
     def process_network_ports(self, port_info):
         resync_a = False
@@ -1159,6 +1230,39 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             resync = True
         return resync
 
+    def _get_flow_bridges(self):
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        return bridges
+
+    def _defer_flows(self, bridges):
+        for bridge in bridges:
+            bridge.defer_apply_on()
+
+    def _flush_deferred_flows(self):
+        """Apply the flows deferred so far, returning False on error.
+
+        The next flows of the iteration are still deferred.
+        """
+        applied = True
+        for bridge in self._get_flow_bridges():
+            if not bridge.apply_deferred_flows():
+                applied = False
+        return applied
+
+    def _apply_deferred_flows(self, bridges):
+        """Apply and stop deferring the flows, returning False on error."""
+        applied = True
+        for bridge in bridges:
+            if not bridge.defer_apply_off():
+                applied = False
+        return applied
+
+    def _pop_ofctl_calls(self, bridges):
+        return dict((bridge.br_name, bridge.pop_ofctl_calls())
+                    for bridge in bridges)
+
     def _agent_has_updates(self, polling_manager):
         return (polling_manager.is_polling_required or
                 self.updated_ports or
@@ -1174,6 +1278,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             polling_manager = polling.AlwaysPoll()
 
         sync = True
+        full_scan = True
         ports = set()
         updated_ports_copy = set()
         ancillary_ports = set()
@@ -1187,11 +1292,17 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                         'removed': 0}}
             LOG.debug(_("Agent rpc_loop - iteration:%d started"),
                       self.iter_num)
+            # The flow changes of the iteration are applied together,
+            # with one ovs-ofctl call per bridge where bundles are
+            # supported
+            flow_bridges = self._get_flow_bridges()
+            self._defer_flows(flow_bridges)
             if sync:
                 LOG.info(_("Agent out of sync with plugin!"))
                 ports.clear()
                 ancillary_ports.clear()
                 sync = False
+                full_scan = True
                 polling_manager.force_polling()
             # Notify the plugin of tunnel IP
             if self.enable_tunneling and tunnel_sync:
@@ -1213,7 +1324,17 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     # between these two statements, this will be thread-safe
                     updated_ports_copy = self.updated_ports
                     self.updated_ports = set()
-                    port_info = self.scan_ports(ports, updated_ports_copy)
+                    # Only the changes reported by the polling manager
+                    # are processed unless the whole bridge must be
+                    # scanned after a resync
+                    port_events = polling_manager.get_events()
+                    port_info = None
+                    if port_events is not None and not full_scan:
+                        port_info = self.process_port_events(
+                            port_events, ports, updated_ports_copy)
+                    if port_info is None:
+                        port_info = self.scan_ports(ports, updated_ports_copy)
+                    full_scan = False
                     ports = port_info['current']
                     LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
                                 "port information retrieved. "
@@ -1269,14 +1390,20 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     # Put the ports back in self.updated_port
                     self.updated_ports |= updated_ports_copy
                     sync = True
+            if not self._apply_deferred_flows(flow_bridges):
+                # The flows are set up again from a full scan
+                sync = True
+            ofctl_calls = self._pop_ofctl_calls(flow_bridges)
 
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d "
                         "completed. Processed ports statistics: "
-                        "%(port_stats)s. Elapsed:%(elapsed).3f"),
+                        "%(port_stats)s. ovs-ofctl calls: %(ofctl_calls)s. "
+                        "Elapsed:%(elapsed).3f"),
                       {'iter_num': self.iter_num,
                        'port_stats': port_stats,
+                       'ofctl_calls': ofctl_calls,
                        'elapsed': elapsed})
             if (elapsed < self.polling_interval):
                 time.sleep(self.polling_interval - elapsed)
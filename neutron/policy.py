@@ -36,6 +36,13 @@ from neutron.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Match rules built for actions, and the target fields each rule depends on.
+# They are only valid for the policy rules they were compiled with.
+_MATCH_RULES = {}
+_RULE_TARGET_FIELDS = {}
+_compiled_rules = None
+# Marks target fields missing from the target in result cache keys
+_MISSING = object()
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -62,9 +69,23 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _reset_compiled_rules()
     policy.reset()
 
 
+def _reset_compiled_rules():
+    global _compiled_rules
+    _MATCH_RULES.clear()
+    _RULE_TARGET_FIELDS.clear()
+    _compiled_rules = policy._rules
+
+
+def _check_compiled_rules():
+    """Drop the compiled rules if the policy rules were reloaded."""
+    if policy._rules is not _compiled_rules:
+        _reset_compiled_rules()
+
+
 def init():
     global _POLICY_PATH
     global _POLICY_CACHE
@@ -152,6 +173,39 @@ def _build_subattr_match_rule(attr_name, attr, action, target):
     return policy.AndCheck(sub_attr_rules)
 
 
+def _get_enforced_attributes(action, target):
+    """Return the attributes of the target whose policies are enforced.
+
+    The result is a tuple of (attribute name, sub-attribute names) pairs,
+    where the sub-attribute names are None for attributes which are not
+    dicts. Only write actions enforce attribute policies.
+    """
+    resource, is_write = get_resource_and_action(action)
+    # Attribute-based checks shall not be enforced on GETs
+    if not is_write:
+        return ()
+    enforced = []
+    # assigning to variable with short name for improving readability
+    res_map = attributes.RESOURCE_ATTRIBUTE_MAP
+    if resource in res_map:
+        for attribute_name in res_map[resource]:
+            if _is_attribute_explicitly_set(attribute_name,
+                                            res_map[resource],
+                                            target):
+                attribute = res_map[resource][attribute_name]
+                if 'enforce_policy' in attribute:
+                    sub_attrs = None
+                    validate = attribute.get('validate')
+                    if (validate and any([k.startswith('type:dict') and v
+                                          for (k, v) in
+                                          validate.iteritems()])):
+                        value = target[attribute_name]
+                        sub_attrs = (tuple(sorted(value))
+                                     if isinstance(value, dict) else ())
+                    enforced.append((attribute_name, sub_attrs))
+    return tuple(enforced)
+
+
 def _build_match_rule(action, target):
     """Create the rule to match for a given action.
 
@@ -167,32 +221,106 @@ def _build_match_rule(action, target):
 
     match_rule = policy.RuleCheck('rule', action)
     resource, is_write = get_resource_and_action(action)
-    # Attribute-based checks shall not be enforced on GETs
-    if is_write:
-        # assigning to variable with short name for improving readability
-        res_map = attributes.RESOURCE_ATTRIBUTE_MAP
-        if resource in res_map:
-            for attribute_name in res_map[resource]:
-                if _is_attribute_explicitly_set(attribute_name,
-                                                res_map[resource],
-                                                target):
-                    attribute = res_map[resource][attribute_name]
-                    if 'enforce_policy' in attribute:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        # Build match entries for sub-attributes, if present
-                        validate = attribute.get('validate')
-                        if (validate and any([k.startswith('type:dict') and v
-                                              for (k, v) in
-                                              validate.iteritems()])):
-                            attr_rule = policy.AndCheck(
-                                [attr_rule, _build_subattr_match_rule(
-                                    attribute_name, attribute,
-                                    action, target)])
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
+    res_map = attributes.RESOURCE_ATTRIBUTE_MAP
+    for attribute_name, sub_attrs in _get_enforced_attributes(action,
+                                                              target):
+        attribute = res_map[resource][attribute_name]
+        attr_rule = policy.RuleCheck('rule', '%s:%s' %
+                                     (action, attribute_name))
+        # Build match entries for sub-attributes, if present
+        if sub_attrs is not None:
+            attr_rule = policy.AndCheck(
+                [attr_rule, _build_subattr_match_rule(
+                    attribute_name, attribute,
+                    action, target)])
+        match_rule = policy.AndCheck([match_rule, attr_rule])
     return match_rule
 
 
+def _get_match_rule(action, target):
+    """Return the rule to match for an action, building it only once.
+
+    Rules are cached by action and by the attributes of the target they
+    depend on, until the policy rules are reloaded.
+    """
+    _check_compiled_rules()
+    key = (action, _get_enforced_attributes(action, target))
+    if key not in _MATCH_RULES:
+        _MATCH_RULES[key] = _build_match_rule(action, target)
+    return _MATCH_RULES[key]
+
+
+def _collect_target_fields(rule, fields, seen_rules):
+    """Add the target fields a rule depends on to fields.
+
+    :returns: False if the rule contains checks whose dependencies on the
+              target are unknown, True otherwise.
+    """
+    if isinstance(rule, (policy.TrueCheck, policy.FalseCheck,
+                         policy.RoleCheck)):
+        return True
+    if isinstance(rule, policy.NotCheck):
+        return _collect_target_fields(rule.rule, fields, seen_rules)
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        return all([_collect_target_fields(r, fields, seen_rules)
+                    for r in rule.rules])
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in seen_rules:
+            return True
+        seen_rules.add(rule.match)
+        try:
+            sub_rule = policy._rules[rule.match]
+        except KeyError:
+            return True
+        return _collect_target_fields(sub_rule, fields, seen_rules)
+    if isinstance(rule, OwnerCheck):
+        fields.add(rule.target_field)
+        for separator in (':', '_'):
+            if separator in rule.target_field:
+                parent_res = rule.target_field.split(separator, 1)[0]
+                foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+                    "%ss" % parent_res)
+                if foreign_key:
+                    fields.add(foreign_key)
+        return True
+    if isinstance(rule, FieldCheck):
+        fields.add(rule.field)
+        return True
+    if type(rule) is policy.GenericCheck:
+        fields.update(re.findall('%\(([^)]+)\)s', rule.match))
+        return '%' not in re.sub('%\([^)]+\)s', '', rule.match)
+    return False
+
+
+def _get_rule_target_fields(rule):
+    """Return the target fields the result of a rule depends on, or None.
+
+    None is returned when the rule contains checks whose result cannot be
+    derived from the target fields and the credentials, like http checks.
+    """
+    if rule not in _RULE_TARGET_FIELDS:
+        fields = set()
+        if _collect_target_fields(rule, fields, set()):
+            _RULE_TARGET_FIELDS[rule] = tuple(sorted(fields))
+        else:
+            _RULE_TARGET_FIELDS[rule] = None
+    return _RULE_TARGET_FIELDS[rule]
+
+
+def _get_result_cache_key(context, rule, target):
+    fields = _get_rule_target_fields(rule)
+    if fields is None:
+        return
+    key = (rule, context.tenant_id, context.user_id,
+           tuple(sorted(context.roles)),
+           tuple(target.get(field, _MISSING) for field in fields))
+    try:
+        hash(key)
+    except TypeError:
+        return
+    return key
+
+
 # This check is registered as 'tenant_id' so that it can override
 # GenericCheck which was used for validating parent resource ownership.
 # This will prevent us from having to handling backward compatibility
@@ -321,11 +449,36 @@ def _prepare_check(context, action, target):
     # Compare with None to distinguish case in which target is {}
     if target is None:
         target = {}
-    match_rule = _build_match_rule(action, target)
+    match_rule = _get_match_rule(action, target)
     credentials = context.to_dict()
     return match_rule, target, credentials
 
 
+def _check(context, action, target):
+    """Evaluate a policy check, reusing the results of the same request.
+
+    Contexts with admin rights are granted any action. Otherwise results
+    are cached on the context, keyed by the match rule, the credentials
+    and the values of the target fields the rule depends on, so that
+    listing many resources owned by a handful of tenants only evaluates
+    the rule a handful of times.
+    """
+    if context.is_admin:
+        return True
+    match_rule, target, credentials = _prepare_check(context, action, target)
+    key = _get_result_cache_key(context, match_rule, target)
+    if key is None:
+        return policy.check(match_rule, target, credentials)
+    cache = getattr(context, '_policy_results', None)
+    if cache is None or cache[0] is not policy._rules:
+        cache = (policy._rules, {})
+        context._policy_results = cache
+    results = cache[1]
+    if key not in results:
+        results[key] = policy.check(match_rule, target, credentials)
+    return results[key]
+
+
 def check(context, action, target, plugin=None):
     """Verifies that the action is valid on the target in this context.
 
@@ -340,7 +493,7 @@ def check(context, action, target, plugin=None):
 
     :return: Returns True if access is permitted else False.
     """
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(context, action, target)
 
 
 def check_if_exists(context, action, target):
@@ -354,9 +507,10 @@ def check_if_exists(context, action, target):
     # order to allow to raise distinct exception when check fails and
     # when policy is missing
     # Raise if there's no match for requested action in the policy engine
+    init()
     if not policy._rules or action not in policy._rules:
         raise exceptions.PolicyRuleNotFound(rule=action)
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(context, action, target)
 
 
 def enforce(context, action, target, plugin=None):
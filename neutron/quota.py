@@ -55,6 +55,20 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default=QUOTA_DB_DRIVER,
                help=_('Default driver to use for quota checks')),
+    cfg.BoolOpt('track_quota_usage',
+                default=True,
+                help=_('Keep track of the resources used by each tenant in '
+                       'the database instead of counting them on every '
+                       'create. Only supported by the database driver.')),
+    cfg.IntOpt('quota_usage_max_age',
+               default=3600,
+               help=_('Number of seconds after which a tracked usage is '
+                      'counted again from the resources table. A value of '
+                      '0 disables periodic reconciliation.')),
+    cfg.IntOpt('reservation_expiration',
+               default=120,
+               help=_('Number of seconds a quota reservation is held '
+                      'before it expires.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -135,6 +149,10 @@ class ConfDriver(object):
             raise exceptions.OverQuota(overs=sorted(overs), quotas=quotas,
                                        usages={})
 
+    @staticmethod
+    def is_tracked(resource):
+        return False
+
     @staticmethod
     def get_tenant_quotas(context, resources, tenant_id):
         quotas = {}
@@ -301,6 +319,46 @@ class QuotaEngine(object):
         return self.get_driver().limit_check(context, tenant_id,
                                              self._resources, values)
 
+    def is_tracked(self, resource):
+        """Return True if the usage of resource is tracked by the driver.
+
+        Tracked resources are checked with make_reservation() instead of
+        count() and limit_check().
+        """
+        return (resource in self._resources and
+                self.get_driver().is_tracked(resource))
+
+    def make_reservation(self, context, tenant_id, plugin, **deltas):
+        """Reserve quota for resources which are about to be created.
+
+        The deltas to reserve are given as keyword arguments, where the
+        key identifies the resource and the value is the number of items
+        which will be created.  If any of the deltas would put the tenant
+        over its limit, an OverQuota exception is raised.  Otherwise a
+        list of reservation ids is returned; it must be passed to
+        commit_reservations() or cancel_reservations() once the
+        resources have been created or have failed to be created.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to reserve quota for.
+        :param plugin: The plugin used to count the resources whose usage
+                       is not tracked yet.
+        """
+
+        return self.get_driver().make_reservation(context, tenant_id,
+                                                  self._resources, deltas,
+                                                  plugin)
+
+    def commit_reservations(self, context, reservations):
+        """Release reservations whose resources have been created."""
+        if reservations:
+            self.get_driver().commit_reservations(context, reservations)
+
+    def cancel_reservations(self, context, reservations):
+        """Release reservations whose resources were not created."""
+        if reservations:
+            self.get_driver().cancel_reservations(context, reservations)
+
     @property
     def resources(self):
         return self._resources
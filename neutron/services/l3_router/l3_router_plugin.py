@@ -37,7 +37,7 @@ from neutron.plugins.common import constants
 
 class L3RouterPluginRpcCallbacks(l3_rpc_base.L3RpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.3'
 
     def create_rpc_dispatcher(self):
         """Get the rpc dispatcher for this manager.
@@ -64,6 +64,10 @@ class L3RouterPlugin(db_base_plugin_v2.CommonDbMixin,
     supported_extension_aliases = ["router", "ext-gw-mode",
                                    "extraroute", "l3_agent_scheduler"]
 
+    # The routers and floating ips are never written to the database when
+    # they are read, so they can be read from the slave database
+    __native_read_only_support = True
+
     def __init__(self):
         qdbapi.register_models(base=model_base.BASEV2)
         self.setup_rpc()
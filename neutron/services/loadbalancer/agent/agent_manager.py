@@ -16,6 +16,8 @@
 #
 # @author: Mark McClain, DreamHost
 
+import random
+
 from oslo.config import cfg
 
 from neutron.agent import rpc as agent_rpc
@@ -74,6 +76,7 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
             'configurations': {'device_drivers': self.device_drivers.keys()},
             'agent_type': n_const.AGENT_TYPE_LOADBALANCER,
             'start_flag': True}
+        self.use_call = True
         self.admin_state_up = True
 
         self._setup_state_rpc()
@@ -108,15 +111,21 @@ class LbaasAgentManager(periodic_task.PeriodicTasks):
         if report_interval:
             heartbeat = loopingcall.FixedIntervalLoopingCall(
                 self._report_state)
-            heartbeat.start(interval=report_interval)
+            # Spread over the interval the reports of the agents started at
+            # the same time
+            heartbeat.start(
+                interval=report_interval,
+                initial_delay=random.uniform(0, report_interval))
 
     def _report_state(self):
         try:
             instance_count = len(self.instance_mapping)
             self.agent_state['configurations']['instances'] = instance_count
             self.state_rpc.report_state(self.context,
-                                        self.agent_state)
+                                        self.agent_state,
+                                        self.use_call)
             self.agent_state.pop('start_flag', None)
+            self.use_call = False
         except Exception:
             LOG.exception(_("Failed reporting state!"))
 
@@ -18,6 +18,7 @@ import eventlet.event
 import mock
 
 from neutron.agent.linux import ovsdb_monitor
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 
 
@@ -110,3 +111,58 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
                 return_value=output):
             self.monitor._read_stdout()
         self.assertFalse(self.monitor.data_received)
+
+    def _get_events(self, *rows):
+        headings = ['row', 'action', 'name', 'ofport', 'external_ids']
+        output = [jsonutils.dumps({'headings': headings, 'data': [row]})
+                  for row in rows]
+        target = ('neutron.agent.linux.ovsdb_monitor.SimpleInterfaceMonitor'
+                  '.is_active')
+        with mock.patch(target,
+                        new_callable=mock.PropertyMock(return_value=True)):
+            with mock.patch.object(self.monitor, 'iter_stdout',
+                                   return_value=output):
+                return self.monitor.get_events()
+
+    def _row(self, action, name='tap1', ofport=1, iface_id='port1'):
+        return ['uuid-%s' % name, action, name, ofport,
+                ['map', [['iface-id', iface_id]]]]
+
+    def test_get_events_is_none_until_table_dumped(self):
+        self.assertIsNone(self._get_events(self._row('initial')))
+        self.assertEqual({'added': [], 'removed': [], 'modified': []},
+                         self._get_events())
+
+    def test_get_events_returns_changed_interfaces(self):
+        self.monitor.events_complete = True
+        events = self._get_events(self._row('insert', ofport=['set', []]),
+                                  self._row('old', ofport=['set', []]),
+                                  self._row('new', ofport=1),
+                                  self._row('delete', name='tap2',
+                                            iface_id='port2'))
+        self.assertEqual(
+            {'added': [{'name': 'tap1', 'ofport': [],
+                        'external_ids': {'iface-id': 'port1'}}],
+             'modified': [{'name': 'tap1', 'ofport': 1,
+                           'external_ids': {'iface-id': 'port1'}}],
+             'removed': [{'name': 'tap2', 'ofport': 1,
+                          'external_ids': {'iface-id': 'port2'}}]},
+            events)
+
+    def test_get_events_is_none_if_output_is_invalid(self):
+        self.monitor.events_complete = True
+        with mock.patch.object(self.monitor, 'iter_stdout',
+                               return_value=['foo']):
+            self.assertTrue(self.monitor.has_updates)
+        self.assertIsNone(self._get_events())
+
+    def test_get_events_is_none_if_not_active(self):
+        self.monitor.events_complete = True
+        self.assertIsNone(self.monitor.get_events())
+
+    def test__kill_sets_events_complete_to_false(self):
+        self.monitor.events_complete = True
+        with mock.patch(
+                'neutron.agent.linux.ovsdb_monitor.OvsdbMonitor._kill'):
+            self.monitor._kill()
+        self.assertFalse(self.monitor.events_complete)
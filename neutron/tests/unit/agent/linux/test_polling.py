@@ -79,6 +79,9 @@ class TestBasePollingManager(base.BaseTestCase):
         with self.mock_is_polling_required(False):
             self.assertFalse(self.pm.is_polling_required)
 
+    def test_get_events_returns_none(self):
+        self.assertIsNone(self.pm.get_events())
+
 
 class TestAlwaysPoll(base.BaseTestCase):
 
@@ -114,3 +117,8 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
     def test__is_polling_required_returns_when_updates_are_present(self):
         with self.mock_has_updates(True):
             self.assertTrue(self.pm._is_polling_required())
+
+    def test_get_events_returns_monitor_events(self):
+        with mock.patch.object(self.pm._monitor, 'get_events',
+                               return_value=mock.sentinel.events):
+            self.assertEqual(mock.sentinel.events, self.pm.get_events())
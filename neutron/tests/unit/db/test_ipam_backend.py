@@ -0,0 +1,155 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import netaddr
+from oslo.config import cfg
+
+from neutron.api.v2 import attributes
+from neutron.common import exceptions as n_exc
+from neutron import context
+from neutron.db import api as db
+from neutron.db import ipam_backend
+from neutron.db import models_v2
+from neutron.openstack.common import importutils
+from neutron.tests import base
+
+DB_PLUGIN_KLASS = 'neutron.db.db_base_plugin_v2.NeutronDbPluginV2'
+FREE_SET_BACKEND = 'neutron.db.ipam_backend.FreeSetIpamBackend'
+
+
+def _ip(address):
+    return int(netaddr.IPAddress(address))
+
+
+class TestIpFreeSet(base.BaseTestCase):
+
+    def test_from_pools(self):
+        free = ipam_backend.IpFreeSet.from_pools(
+            [('192.168.1.3', '192.168.1.10'),
+             ('192.168.1.100', '192.168.1.120')],
+            ['192.168.1.3', '192.168.1.78', '192.168.1.7', '192.168.1.110',
+             '192.168.1.11', '192.168.1.4', '192.168.1.111'])
+        self.assertEqual([(_ip('192.168.1.5'), _ip('192.168.1.6')),
+                          (_ip('192.168.1.8'), _ip('192.168.1.10')),
+                          (_ip('192.168.1.100'), _ip('192.168.1.109')),
+                          (_ip('192.168.1.112'), _ip('192.168.1.120'))],
+                         free.ranges())
+        self.assertEqual(24, len(free))
+
+    def test_adjacent_ranges_are_merged(self):
+        free = ipam_backend.IpFreeSet([(5, 9), (1, 4), (12, 12)])
+        self.assertEqual([(1, 9), (12, 12)], free.ranges())
+
+    def test_remove(self):
+        free = ipam_backend.IpFreeSet([(1, 10)])
+        free.remove(1)
+        free.remove(10)
+        free.remove(5)
+        free.remove(42)
+        self.assertEqual([(2, 4), (6, 9)], free.ranges())
+        self.assertNotIn(5, free)
+        self.assertIn(6, free)
+
+    def test_random_ip(self):
+        free = ipam_backend.IpFreeSet([(1, 2), (8, 8)])
+        with mock.patch('random.randrange', return_value=2):
+            self.assertEqual(8, free.random_ip())
+        with mock.patch('random.randrange', return_value=1):
+            self.assertEqual(2, free.random_ip())
+
+    def test_random_ip_exhausted(self):
+        free = ipam_backend.IpFreeSet([(1, 1)])
+        free.remove(1)
+        self.assertIsNone(free.random_ip())
+
+
+class TestFreeSetIpamBackend(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestFreeSetIpamBackend, self).setUp()
+        cfg.CONF.set_override('ipam_driver', FREE_SET_BACKEND)
+        self.plugin = importutils.import_object(DB_PLUGIN_KLASS)
+        self.context = context.get_admin_context()
+        self.addCleanup(db.clear_db)
+        self.net = self.plugin.create_network(
+            self.context, {'network': {'name': 'net1',
+                                       'admin_state_up': True,
+                                       'tenant_id': 'test-tenant',
+                                       'shared': False}})
+        self.subnet = self.plugin.create_subnet(
+            self.context,
+            {'subnet': {'network_id': self.net['id'],
+                        'tenant_id': 'test-tenant',
+                        'name': 'subnet1',
+                        'cidr': '10.0.0.0/29',
+                        'ip_version': 4,
+                        'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+                        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+                        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+                        'host_routes': attributes.ATTR_NOT_SPECIFIED,
+                        'enable_dhcp': False}})
+
+    def _create_port(self, fixed_ips=attributes.ATTR_NOT_SPECIFIED):
+        return self.plugin.create_port(
+            self.context, {'port': {'network_id': self.net['id'],
+                                    'tenant_id': 'test-tenant',
+                                    'name': '',
+                                    'admin_state_up': True,
+                                    'device_id': '',
+                                    'device_owner': '',
+                                    'mac_address':
+                                    attributes.ATTR_NOT_SPECIFIED,
+                                    'fixed_ips': fixed_ips}})
+
+    def test_allocate_until_exhausted(self):
+        pool = set(['10.0.0.%d' % i for i in range(2, 7)])
+        allocated = set()
+        for i in range(len(pool)):
+            port = self._create_port()
+            allocated.add(port['fixed_ips'][0]['ip_address'])
+        self.assertEqual(pool, allocated)
+        self.assertRaises(n_exc.IpAddressGenerationFailure,
+                          self._create_port)
+
+    def test_allocations_are_owned_by_port(self):
+        port = self._create_port()
+        qry = self.context.session.query(models_v2.IPAllocation)
+        self.assertEqual([port['id']], [a.port_id for a in qry])
+
+    def test_specific_ip_is_not_generated(self):
+        self._create_port([{'subnet_id': self.subnet['id'],
+                            'ip_address': '10.0.0.4'}])
+        for i in range(4):
+            port = self._create_port()
+            self.assertNotEqual('10.0.0.4',
+                                port['fixed_ips'][0]['ip_address'])
+
+    def test_deleted_ip_is_reused(self):
+        ports = [self._create_port() for i in range(5)]
+        self.plugin.delete_port(self.context, ports[2]['id'])
+        port = self._create_port()
+        self.assertEqual(ports[2]['fixed_ips'], port['fixed_ips'])
+
+    def test_concurrently_allocated_ip_is_retried(self):
+        backend = ipam_backend.get_ipam_backend()
+        with mock.patch.object(backend, '_reserve_ip',
+                               side_effect=[False, True]) as reserve:
+            ip = backend.generate_ip(self.context, [self.subnet])
+        self.assertEqual(2, reserve.call_count)
+        self.assertNotEqual(reserve.call_args_list[0][0][3],
+                            ip['ip_address'])
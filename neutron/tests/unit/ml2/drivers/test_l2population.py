@@ -30,8 +30,10 @@ from neutron import manager
 from neutron.openstack.common import timeutils
 from neutron.plugins.ml2 import config as config
 from neutron.plugins.ml2.drivers.l2pop import constants as l2_consts
+from neutron.plugins.ml2.drivers.l2pop import rpc as l2pop_rpc
 from neutron.plugins.ml2 import managers
 from neutron.plugins.ml2 import rpc
+from neutron.tests import base
 from neutron.tests.unit import test_db_plugin as test_plugin
 
 HOST = 'my_l2_host'
@@ -95,6 +97,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                      'ml2')
         super(TestL2PopulationRpcTestCase, self).setUp(PLUGIN_NAME)
         self.addCleanup(config.cfg.CONF.reset)
+        # The fdb entries are checked as they are sent by each update
+        config.cfg.CONF.set_override('fanout_delay', 0, 'l2pop')
 
         self.adminContext = context.get_admin_context()
 
@@ -723,3 +727,78 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
 
                     self.mock_fanout.assert_called_with(
                         mock.ANY, expected, topic=self.fanout_topic)
+
+
+class TestL2populationAgentNotifyAPI(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestL2populationAgentNotifyAPI, self).setUp()
+        self.notifier = l2pop_rpc.L2populationAgentNotifyAPI()
+        self.fanout_cast = mock.patch.object(self.notifier,
+                                             'fanout_cast').start()
+        self.cast = mock.patch.object(self.notifier, 'cast').start()
+        self.spawn_after = mock.patch('eventlet.spawn_after').start()
+        self.context = mock.Mock()
+
+    def _fdb_entries(self, agent_ip, *entries):
+        return {'net1': {'segment_id': 1,
+                         'network_type': 'vxlan',
+                         'ports': {agent_ip: list(entries)}}}
+
+    def _sent_fdb_entries(self):
+        return dict((call[0][1]['method'], call[0][1]['args']['fdb_entries'])
+                    for call in self.fanout_cast.call_args_list)
+
+    def test_fanout_batched(self):
+        self.notifier.add_fdb_entries(
+            self.context, self._fdb_entries('20.0.0.1',
+                                            constants.FLOODING_ENTRY,
+                                            ['mac1', '10.0.0.2']))
+        self.notifier.add_fdb_entries(
+            self.context, self._fdb_entries('20.0.0.1',
+                                            ['mac2', '10.0.0.3']))
+        self.notifier.add_fdb_entries(
+            self.context, self._fdb_entries('20.0.0.2',
+                                            ['mac3', '10.0.0.4']))
+        self.assertFalse(self.fanout_cast.called)
+        self.spawn_after.assert_called_once_with(
+            0.5, self.notifier._send_pending_fanout, self.context)
+
+        self.notifier._send_pending_fanout(self.context)
+        expected = self._fdb_entries('20.0.0.1', constants.FLOODING_ENTRY,
+                                     ['mac1', '10.0.0.2'],
+                                     ['mac2', '10.0.0.3'])
+        expected['net1']['ports']['20.0.0.2'] = [['mac3', '10.0.0.4']]
+        self.assertEqual(self._sent_fdb_entries(),
+                         {'add_fdb_entries': expected})
+
+    def test_fanout_last_change_wins(self):
+        self.notifier.add_fdb_entries(
+            self.context, self._fdb_entries('20.0.0.1',
+                                            ['mac1', '10.0.0.2'],
+                                            ['mac2', '10.0.0.3']))
+        self.notifier.remove_fdb_entries(
+            self.context, self._fdb_entries('20.0.0.1',
+                                            ['mac1', '10.0.0.2']))
+        self.notifier._send_pending_fanout(self.context)
+        self.assertEqual(
+            self._sent_fdb_entries(),
+            {'add_fdb_entries': self._fdb_entries('20.0.0.1',
+                                                  ['mac2', '10.0.0.3']),
+             'remove_fdb_entries': self._fdb_entries('20.0.0.1',
+                                                     ['mac1', '10.0.0.2'])})
+
+    def test_host_notification_not_batched(self):
+        fdb_entries = self._fdb_entries('20.0.0.1', ['mac1', '10.0.0.2'])
+        self.notifier.add_fdb_entries(self.context, fdb_entries, 'host1')
+        self.assertTrue(self.cast.called)
+        self.assertFalse(self.spawn_after.called)
+
+    def test_update_sends_pending_fanout_first(self):
+        self.notifier.add_fdb_entries(
+            self.context, self._fdb_entries('20.0.0.1',
+                                            ['mac1', '10.0.0.2']))
+        self.notifier.update_fdb_entries(self.context, {'chg_ip': {}})
+        methods = [call[0][1]['method']
+                   for call in self.fanout_cast.call_args_list]
+        self.assertEqual(methods, ['add_fdb_entries', 'update_fdb_entries'])
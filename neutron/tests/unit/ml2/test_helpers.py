@@ -0,0 +1,110 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+
+from neutron.db import api as db
+from neutron.openstack.common.db import exception as db_exc
+from neutron.plugins.ml2.drivers import helpers
+from neutron.plugins.ml2.drivers import type_vlan
+from neutron.tests import base
+
+
+PHYS_NET = 'physnet1'
+PHYS_NET_2 = 'physnet2'
+POOLS = [(PHYS_NET, 10, 19), (PHYS_NET_2, 30, 31)]
+
+
+class SegmentAllocatorTest(base.BaseTestCase):
+    def setUp(self):
+        super(SegmentAllocatorTest, self).setUp()
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.session = db.get_session()
+        self.allocator = helpers.SegmentAllocator(
+            type_vlan.VlanAllocation, 'vlan_id', 'physical_network')
+
+    def _get_allocations(self):
+        return sorted((alloc.physical_network, alloc.vlan_id)
+                      for alloc in
+                      self.session.query(type_vlan.VlanAllocation))
+
+    def test_sync_removes_free_rows(self):
+        with self.session.begin():
+            for vlan_id, allocated in ((10, False), (11, True)):
+                self.session.add(type_vlan.VlanAllocation(
+                    physical_network=PHYS_NET, vlan_id=vlan_id,
+                    allocated=allocated))
+        self.allocator.sync(self.session)
+        self.assertEqual([(PHYS_NET, 11)], self._get_allocations())
+
+    def test_get(self):
+        self.allocator.reserve(self.session, PHYS_NET, 11)
+        self.assertTrue(
+            self.allocator.get(self.session, POOLS, PHYS_NET, 11).allocated)
+        self.assertFalse(
+            self.allocator.get(self.session, POOLS, PHYS_NET, 12).allocated)
+        self.assertIsNone(
+            self.allocator.get(self.session, POOLS, PHYS_NET, 30))
+
+    def test_reserve_and_release(self):
+        self.assertTrue(self.allocator.reserve(self.session, PHYS_NET, 11))
+        self.assertFalse(self.allocator.reserve(self.session, PHYS_NET, 11))
+        self.assertTrue(self.allocator.reserve(self.session, PHYS_NET_2, 11))
+        self.assertTrue(self.allocator.release(self.session, PHYS_NET, 11))
+        self.assertFalse(self.allocator.release(self.session, PHYS_NET, 11))
+        self.assertEqual([(PHYS_NET_2, 11)], self._get_allocations())
+
+    def test_reserve_allocated_concurrently(self):
+        with contextlib.nested(
+            mock.patch.object(self.session.bind.dialect, 'name', 'mysql'),
+            mock.patch.object(self.session, 'execute',
+                              side_effect=db_exc.DBDuplicateEntry),
+            mock.patch.object(self.session, 'begin',
+                              wraps=self.session.begin)
+        ) as (dialect_name, execute, begin):
+            self.assertFalse(self.allocator.reserve(self.session,
+                                                    PHYS_NET, 11))
+        begin.assert_called_with(nested=True)
+
+    def test_allocate_all(self):
+        allocs = [self.allocator.allocate(self.session, POOLS)
+                  for i in range(12)]
+        expected = ([(PHYS_NET, vlan_id) for vlan_id in range(10, 20)] +
+                    [(PHYS_NET_2, 30), (PHYS_NET_2, 31)])
+        self.assertEqual(expected, sorted(allocs))
+        self.assertEqual(expected, self._get_allocations())
+        self.assertIsNone(self.allocator.allocate(self.session, POOLS))
+
+    def test_allocate_random(self):
+        with mock.patch.object(helpers.random, 'randrange',
+                               return_value=10):
+            alloc = self.allocator.allocate(self.session, POOLS)
+        self.assertEqual((PHYS_NET_2, 30), alloc)
+
+    def test_allocate_in_order_after_random_attempts(self):
+        self.allocator.reserve(self.session, PHYS_NET, 10)
+        self.allocator.reserve(self.session, PHYS_NET, 12)
+        # All the random attempts pick the allocated 10
+        with mock.patch.object(helpers.random, 'randrange',
+                               return_value=0):
+            allocs = [self.allocator.allocate(self.session, POOLS)
+                      for i in range(2)]
+        self.assertEqual([(PHYS_NET, 11), (PHYS_NET, 13)], allocs)
+
+    def test_allocate_without_pools(self):
+        self.assertIsNone(self.allocator.allocate(self.session, []))
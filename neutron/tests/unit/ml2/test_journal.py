@@ -0,0 +1,168 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.db import api as db
+from neutron.openstack.common import jsonutils
+from neutron.plugins.ml2.common import exceptions as ml2_exc
+from neutron.plugins.ml2 import journal
+from neutron.plugins.ml2 import managers
+from neutron.plugins.ml2 import models
+from neutron.tests import base
+
+
+NETWORK = {'id': 'net-id', 'name': 'net'}
+SUBNET = {'id': 'subnet-id', 'network_id': 'net-id'}
+SUBNET_2 = {'id': 'subnet-id-2', 'network_id': 'net-id'}
+SEGMENTS = [{'network_type': 'local'}]
+PORT = {'id': 'port-id', 'network_id': 'net-id'}
+
+
+class JournalTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(JournalTestCase, self).setUp()
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.addCleanup(cfg.CONF.reset)
+        self.session = db.get_session()
+        self.driver = mock.Mock()
+
+    def _get_entries(self):
+        return (self.session.query(models.PostcommitJournalEntry).
+                order_by(models.PostcommitJournalEntry.id).all())
+
+
+class JournalTest(JournalTestCase):
+    def setUp(self):
+        super(JournalTest, self).setUp()
+        cfg.CONF.set_override('journal_retry_interval', 0, group='ml2')
+        mechanism_manager = mock.Mock()
+        mechanism_manager.mech_drivers = {'async': mock.Mock(obj=self.driver)}
+        self.worker = journal.JournalWorker(mechanism_manager)
+
+    def _record_network(self, method='create_network_postcommit'):
+        context = journal.JournalNetworkContext(NETWORK, None, SEGMENTS)
+        journal.record(self.session, 'async', method, context)
+
+    def test_run_calls_driver_and_deletes_entry(self):
+        self._record_network()
+        self.worker.run()
+        context = self.driver.create_network_postcommit.call_args[0][0]
+        self.assertEqual(NETWORK, context.current)
+        self.assertEqual(SEGMENTS, context.network_segments)
+        self.assertEqual([], self._get_entries())
+
+    def test_run_keeps_network_order(self):
+        self._record_network()
+        context = journal.JournalSubnetContext(SUBNET, None)
+        journal.record(self.session, 'async', 'create_subnet_postcommit',
+                       context)
+        self.driver.create_network_postcommit.side_effect = Exception
+        self.worker.run()
+        self.assertFalse(self.driver.create_subnet_postcommit.called)
+        entries = self._get_entries()
+        self.assertEqual([journal.PENDING, journal.PENDING],
+                         [entry.state for entry in entries])
+        self.assertEqual(1, entries[0].attempts)
+
+    def test_run_gives_up_after_max_attempts(self):
+        cfg.CONF.set_override('journal_max_attempts', 2, group='ml2')
+        self._record_network()
+        self._record_network('update_network_postcommit')
+        self.driver.create_network_postcommit.side_effect = Exception
+        for i in range(3):
+            self.worker.run()
+        self.assertEqual(2, self.driver.create_network_postcommit.call_count)
+        self.assertTrue(self.driver.update_network_postcommit.called)
+        self.assertEqual([journal.FAILED],
+                         [entry.state for entry in self._get_entries()])
+
+    def test_claim_fails_when_already_claimed(self):
+        self._record_network()
+        entry = mock.Mock(id=self._get_entries()[0].id, attempts=0)
+        self.assertTrue(self.worker._claim(self.session, entry))
+        self.assertFalse(self.worker._claim(self.session, entry))
+
+    def test_get_stats(self):
+        self._record_network()
+        self._record_network('update_network_postcommit')
+        stats = journal.get_stats(self.session)
+        self.assertEqual(2, stats['depth'])
+        self.assertEqual(0, stats['failed'])
+
+    def test_port_context_set_binding(self):
+        network = {'current': NETWORK, 'original': None,
+                   'segments': SEGMENTS}
+        context = journal.JournalPortContext(
+            PORT, None, network, 'host', None, None, None, None,
+            method='update_port_postcommit')
+        self.assertRaises(ml2_exc.JournaledPortBindingError,
+                          context.set_binding, 'segment-id', 'ovs', {})
+
+
+class MechanismManagerJournalTest(JournalTestCase):
+    def setUp(self):
+        super(MechanismManagerJournalTest, self).setUp()
+        self.manager = managers.MechanismManager.__new__(
+            managers.MechanismManager)
+        driver = mock.Mock(obj=self.driver)
+        driver.name = 'async'
+        self.manager.ordered_mech_drivers = [driver]
+        self.manager.async_drivers = set(['async'])
+        self.plugin_context = mock.Mock(session=self.session)
+
+    def _make_context(self, context_class, *args):
+        context = context_class(*args)
+        context._plugin_context = self.plugin_context
+        return context
+
+    def test_precommit_records_postcommit(self):
+        context = self._make_context(journal.JournalNetworkContext,
+                                     NETWORK, None, SEGMENTS)
+        self.manager.create_network_precommit(context)
+        self.driver.create_network_precommit.assert_called_once_with(context)
+        self.assertEqual(['create_network_postcommit'],
+                         [entry.method for entry in self._get_entries()])
+
+    def test_precommit_failure_not_recorded(self):
+        context = self._make_context(journal.JournalNetworkContext,
+                                     NETWORK, None, SEGMENTS)
+        self.driver.create_network_precommit.side_effect = Exception
+        self.assertRaises(ml2_exc.MechanismDriverError,
+                          self.manager.create_network_precommit, context)
+        self.assertEqual([], self._get_entries())
+
+    def test_postcommit_skips_async_driver(self):
+        context = self._make_context(journal.JournalNetworkContext,
+                                     NETWORK, None, SEGMENTS)
+        self.manager.create_network_postcommit(context)
+        self.assertFalse(self.driver.create_network_postcommit.called)
+        self.assertEqual([], self._get_entries())
+
+    def test_batch_precommit_records_each_resource(self):
+        contexts = [self._make_context(journal.JournalSubnetContext,
+                                       subnet, None)
+                    for subnet in (SUBNET, SUBNET_2)]
+        self.manager.delete_subnets_precommit(contexts)
+        self.driver.delete_subnets_precommit.assert_called_once_with(
+            contexts)
+        entries = self._get_entries()
+        self.assertEqual(['delete_subnet_postcommit'] * 2,
+                         [entry.method for entry in entries])
+        self.assertEqual([SUBNET, SUBNET_2],
+                         [jsonutils.loads(entry.context)['current']
+                          for entry in entries])
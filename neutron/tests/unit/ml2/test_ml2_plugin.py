@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import mock
 import testtools
 import webob
@@ -25,6 +26,7 @@ from neutron.extensions import providernet as pnet
 from neutron import manager
 from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import config
+from neutron.plugins.ml2 import db as ml2_db
 from neutron.plugins.ml2 import plugin as ml2_plugin
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
@@ -92,7 +94,35 @@ class TestMl2V2HTTPResponse(test_plugin.TestV2HTTPResponse,
 
 class TestMl2NetworksV2(test_plugin.TestNetworksV2,
                         Ml2PluginV2TestCase):
-    pass
+
+    def test_delete_network_batches_auto_deleted_ports(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with self.network(do_delete=False) as network:
+            net_id = network['network']['id']
+            with self.subnet(network=network, do_delete=False):
+                for i in range(3):
+                    self._create_port(self.fmt, net_id,
+                                      device_owner='network:dhcp')
+                mech_manager = plugin.mechanism_manager
+                with contextlib.nested(
+                    mock.patch.object(mech_manager,
+                                      'delete_ports_postcommit'),
+                    mock.patch.object(mech_manager,
+                                      'delete_subnets_postcommit'),
+                    mock.patch.object(plugin, 'delete_port'),
+                    mock.patch.object(plugin.notifier,
+                                      'security_groups_provider_updated')
+                ) as (ports_postcommit, subnets_postcommit, delete_port,
+                      provider_updated):
+                    req = self.new_delete_request('networks', net_id)
+                    res = req.get_response(self.api)
+                    self.assertEqual(204, res.status_int)
+        self.assertFalse(delete_port.called)
+        self.assertEqual(3, len(ports_postcommit.call_args[0][0]))
+        self.assertEqual(1, len(subnets_postcommit.call_args[0][0]))
+        self.assertEqual(1, provider_updated.call_count)
+        self.assertEqual([], plugin.get_ports(
+            self.context, filters={'network_id': [net_id]}))
 
 
 class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
@@ -315,6 +345,64 @@ class TestMultiSegmentNetworks(Ml2PluginV2TestCase):
         self.assertIsNone(network[pnet.PHYSICAL_NETWORK])
         self.assertIsNone(network[pnet.SEGMENTATION_ID])
 
+    def _create_provider_network(self, name, segments):
+        data = {'network': {'name': name,
+                            mpnet.SEGMENTS:
+                            [{pnet.NETWORK_TYPE: 'vlan',
+                              pnet.PHYSICAL_NETWORK: 'physnet1',
+                              pnet.SEGMENTATION_ID: segmentation_id}
+                             for segmentation_id in segments],
+                            'tenant_id': 'tenant_one'}}
+        network_req = self.new_create_request('networks', data)
+        return self.deserialize(self.fmt, network_req.get_response(self.api))
+
+    def test_list_networks_provider_filters(self):
+        self._create_provider_network('net1', [1])
+        self._create_provider_network('net2', [2])
+        self._create_provider_network('net3', [3, 4])
+
+        def _list_names(query_params):
+            networks = self._list('networks', query_params=query_params)
+            return sorted(net['name'] for net in networks['networks'])
+
+        self.assertEqual(['net1', 'net2', 'net3'],
+                         _list_names('%s=vlan' % pnet.NETWORK_TYPE))
+        self.assertEqual(['net2'],
+                         _list_names('%s=2' % pnet.SEGMENTATION_ID))
+        self.assertEqual(['net1', 'net3'],
+                         _list_names('%s=1&%s=4' % (pnet.SEGMENTATION_ID,
+                                                    pnet.SEGMENTATION_ID)))
+        self.assertEqual([], _list_names('%s=physnet2&%s=1' %
+                                         (pnet.PHYSICAL_NETWORK,
+                                          pnet.SEGMENTATION_ID)))
+
+    def test_get_networks_batches_segments_query(self):
+        self._create_provider_network('net1', [1])
+        self._create_provider_network('net2', [2, 3])
+        with contextlib.nested(
+            mock.patch.object(ml2_db, 'get_network_segments'),
+            mock.patch.object(ml2_db, 'get_networks_segments',
+                              wraps=ml2_db.get_networks_segments)
+        ) as (get_segments, get_networks_segments):
+            networks = self.driver.get_networks(self.context)
+        self.assertFalse(get_segments.called)
+        self.assertEqual(1, get_networks_segments.call_count)
+        networks = dict((net['name'], net) for net in networks)
+        self.assertEqual(1, networks['net1'][pnet.SEGMENTATION_ID])
+        self.assertEqual([2, 3], sorted(
+            segment[pnet.SEGMENTATION_ID]
+            for segment in networks['net2'][mpnet.SEGMENTS]))
+
+    def test_get_networks_segments_in_batches(self):
+        net1 = self._create_provider_network('net1', [1])['network']
+        net2 = self._create_provider_network('net2', [2, 3])['network']
+        with mock.patch.object(ml2_db, 'SEGMENTS_QUERY_BATCH_SIZE', new=2):
+            segments = ml2_db.get_networks_segments(
+                self.context.session, [net1['id'], 'fake', net2['id']])
+        self.assertEqual(1, len(segments[net1['id']]))
+        self.assertEqual(2, len(segments[net2['id']]))
+        self.assertEqual([], segments['fake'])
+
 
 class TestMl2AllowedAddressPairs(Ml2PluginV2TestCase,
                                  test_pair.TestAllowedAddressPairs):
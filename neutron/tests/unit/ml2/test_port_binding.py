@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import mock
 
 from neutron import context
@@ -65,6 +67,26 @@ class PortBindingTestCase(test_plugin.NeutronDbPluginV2TestCase):
             else:
                 self.assertNotIn('network_type', details)
 
+    def test_devices_details_list(self):
+        neutron_context = context.get_admin_context()
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **{portbindings.HOST_ID: 'host-ovs-no_filter'}),
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **{portbindings.HOST_ID: ''})
+            ) as (bound, unbound):
+                devices = ['tap' + bound['port']['id'][:11],
+                           unbound['port']['id'],
+                           'tap' + 'f' * 11]
+                details = self.plugin.callbacks.get_devices_details_list(
+                    neutron_context, agent_id="theAgentId", devices=devices)
+                self.assertEqual(devices, [d['device'] for d in details])
+                self.assertEqual(bound['port']['id'], details[0]['port_id'])
+                self.assertEqual('local', details[0]['network_type'])
+                self.assertNotIn('port_id', details[1])
+                self.assertNotIn('port_id', details[2])
+
     def test_unbound(self):
         self._test_port_binding("",
                                 portbindings.VIF_TYPE_UNBOUND,
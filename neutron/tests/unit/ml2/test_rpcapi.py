@@ -17,12 +17,17 @@
 Unit Tests for ml2 rpc
 """
 
+import contextlib
+
 import mock
+from oslo.config import cfg
 
 from neutron.agent import rpc as agent_rpc
 from neutron.common import topics
+from neutron.extensions import portbindings
 from neutron.openstack.common import context
 from neutron.openstack.common import rpc
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.plugins.ml2.drivers import type_tunnel
 from neutron.plugins.ml2 import rpc as plugin_rpc
 from neutron.tests import base
@@ -30,11 +35,12 @@ from neutron.tests import base
 
 class RpcApiTestCase(base.BaseTestCase):
 
-    def _test_rpc_api(self, rpcapi, topic, method, rpc_method, **kwargs):
+    def _test_rpc_api(self, rpcapi, topic, method, rpc_method,
+                      version=None, **kwargs):
         ctxt = context.RequestContext('fake_user', 'fake_project')
         expected_retval = 'foo' if method == 'call' else None
         expected_msg = rpcapi.make_msg(method, **kwargs)
-        expected_msg['version'] = rpcapi.BASE_RPC_API_VERSION
+        expected_msg['version'] = version or rpcapi.BASE_RPC_API_VERSION
         if rpc_method == 'cast' and method == 'run_instance':
             kwargs['call'] = False
 
@@ -72,6 +78,48 @@ class RpcApiTestCase(base.BaseTestCase):
                            segmentation_id='fake_segmentation_id',
                            physical_network='fake_physical_network')
 
+    def _test_host_targeted_cast(self, method, hosts, expected_topics,
+                                 **kwargs):
+        cfg.CONF.set_override('host_targeted_notifications', True, 'ml2')
+        self.addCleanup(cfg.CONF.reset)
+        rpcapi = plugin_rpc.AgentNotifierApi(topics.AGENT)
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with contextlib.nested(
+            mock.patch.object(rpcapi, 'cast'),
+            mock.patch.object(rpcapi, 'fanout_cast'),
+            mock.patch.object(plugin_rpc.db, 'get_security_group_hosts',
+                              return_value=hosts)
+        ) as (cast, fanout_cast, get_hosts):
+            getattr(rpcapi, method)(ctxt, **kwargs)
+        self.assertFalse(fanout_cast.called)
+        self.assertEqual(expected_topics,
+                         [call[1]['topic'] for call in cast.call_args_list])
+
+    def test_delete_network_host_targeted(self):
+        topic = topics.get_topic_name(topics.AGENT, topics.NETWORK,
+                                      topics.DELETE)
+        self._test_host_targeted_cast(
+            'network_delete', None,
+            [topic + '.host1', topic + '.host2'],
+            network_id='fake_network_id', hosts=['host1', 'host2'])
+
+    def test_port_update_host_targeted(self):
+        topic = topics.get_topic_name(topics.AGENT, topics.PORT,
+                                      topics.UPDATE)
+        self._test_host_targeted_cast(
+            'port_update', None, [topic + '.host1'],
+            port={'id': 'fake_port', portbindings.HOST_ID: 'host1'},
+            network_type='fake_network_type',
+            segmentation_id='fake_segmentation_id',
+            physical_network='fake_physical_network')
+
+    def test_security_groups_member_updated_host_targeted(self):
+        topic = topics.get_topic_name(topics.AGENT, topics.SECURITY_GROUP,
+                                      topics.UPDATE)
+        self._test_host_targeted_cast(
+            'security_groups_member_updated', ['host1'], [topic + '.host1'],
+            security_groups=['fake_sg'])
+
     def test_tunnel_update(self):
         rpcapi = plugin_rpc.AgentNotifierApi(topics.AGENT)
         self._test_rpc_api(rpcapi,
@@ -110,3 +158,53 @@ class RpcApiTestCase(base.BaseTestCase):
                            device='fake_device',
                            agent_id='fake_agent_id',
                            host='fake_host')
+
+    def test_devices_details_list(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, topics.PLUGIN,
+                           'get_devices_details_list', rpc_method='call',
+                           version='1.2',
+                           devices=['fake_device1', 'fake_device2'],
+                           agent_id='fake_agent_id')
+
+    def test_update_devices_down(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, topics.PLUGIN,
+                           'update_devices_down', rpc_method='call',
+                           version='1.2',
+                           devices=['fake_device1', 'fake_device2'],
+                           agent_id='fake_agent_id',
+                           host='fake_host')
+
+    def test_update_devices_up(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, topics.PLUGIN,
+                           'update_devices_up', rpc_method='call',
+                           version='1.2',
+                           devices=['fake_device1', 'fake_device2'],
+                           agent_id='fake_agent_id',
+                           host='fake_host')
+
+    def test_devices_details_list_unsupported(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+
+        def fake_call(context, msg, topic, version=None):
+            if msg['method'] == 'get_devices_details_list':
+                raise rpc_common.RemoteError('UnsupportedRpcVersion')
+            return {'device': msg['args']['device']}
+
+        with mock.patch.object(rpcapi, 'call', side_effect=fake_call):
+            retval = rpcapi.get_devices_details_list(
+                ctxt, ['fake_device1', 'fake_device2'], 'fake_agent_id')
+        self.assertEqual([{'device': 'fake_device1'},
+                          {'device': 'fake_device2'}], retval)
+
+    def test_devices_details_list_remote_error(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(rpcapi, 'call',
+                               side_effect=rpc_common.RemoteError('Error')):
+            self.assertRaises(rpc_common.RemoteError,
+                              rpcapi.get_devices_details_list,
+                              ctxt, ['fake_device1'], 'fake_agent_id')
@@ -116,6 +116,17 @@ class VxlanTypeTest(base.BaseTestCase):
                           get_vxlan_allocation(self.session,
                                                (TUN_MAX + 5 + 1)))
 
+    def test_sync_full_vni_range(self):
+        self.driver.vxlan_vni_ranges = [(1, type_vxlan.MAX_VXLAN_VNI)]
+        self.driver._sync_vxlan_allocations()
+        self.assertEqual(
+            0, self.session.query(type_vxlan.VxlanAllocation).count())
+        segment = self.driver.allocate_tenant_segment(self.session)
+        self.assertTrue(self.driver.get_vxlan_allocation(
+            self.session, segment[api.SEGMENTATION_ID]).allocated)
+        self.assertEqual(
+            1, self.session.query(type_vxlan.VxlanAllocation).count())
+
     def test_reserve_provider_segment(self):
         segment = {api.NETWORK_TYPE: 'vxlan',
                    api.PHYSICAL_NETWORK: 'None',
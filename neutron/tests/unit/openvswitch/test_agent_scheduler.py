@@ -603,6 +603,81 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
         self.assertEqual(1, len(l3_agents['agents']))
         self.assertEqual(L3_HOSTA, l3_agents['agents'][0]['host'])
 
+    def test_get_router_ids_with_hosted(self):
+        with self.router() as router:
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            self._register_agent_states()
+            ret_a = l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTA)
+            ret_b = l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTB)
+            self.assertEqual([router['router']['id']], ret_a)
+            self.assertEqual([], ret_b)
+
+    def test_get_router_ids_skips_admin_down_routers(self):
+        with self.router() as router:
+            self._update('routers', router['router']['id'],
+                         {'router': {'admin_state_up': False}})
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            self._register_agent_states()
+            self.assertEqual(
+                [], l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTA))
+
+    def test_sync_routers_with_revisions(self):
+        with contextlib.nested(self.router(),
+                               self.router()) as (router1, router2):
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            self._register_agent_states()
+            router_ids = [router1['router']['id'], router2['router']['id']]
+            routers = l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA,
+                                          router_ids=router_ids)
+            revisions = dict((r['id'], r['revision']) for r in routers)
+            self.assertEqual(sorted(router_ids), sorted(revisions))
+            # Only the router which changed is returned
+            self._update('routers', router_ids[1],
+                         {'router': {'name': 'new_name'}})
+            routers = l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA,
+                                          router_ids=router_ids,
+                                          revisions=revisions)
+            self.assertEqual([router_ids[1]], [r['id'] for r in routers])
+            self.assertEqual(revisions[router_ids[1]] + 1,
+                             routers[0]['revision'])
+            revisions[router_ids[1]] = routers[0]['revision']
+            self.assertEqual([], l3_rpc.sync_routers(self.adminContext,
+                                                     host=L3_HOSTA,
+                                                     router_ids=router_ids,
+                                                     revisions=revisions))
+
+    def test_sync_routers_with_revisions_from_stale_slave(self):
+        with contextlib.nested(self.router(),
+                               self.router()) as (router1, router2):
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            self._register_agent_states()
+            router_ids = [router1['router']['id'], router2['router']['id']]
+            stale_routers = l3_rpc.sync_routers(self.adminContext,
+                                                host=L3_HOSTA,
+                                                router_ids=router_ids)
+            revisions = dict((r['id'], r['revision']) for r in stale_routers)
+            self._update('routers', router_ids[1],
+                         {'router': {'name': 'new_name'}})
+            list_sync_routers = l3_rpc._list_sync_routers
+            with contextlib.nested(
+                mock.patch('neutron.db.api.slave_usable', return_value=True),
+                mock.patch.object(l3_rpc, '_list_sync_routers')
+            ) as (slave_usable, list_routers):
+                # The slave database returns the routers as they were before
+                # the update, the master database the updated router
+                list_routers.side_effect = lambda *args: (
+                    stale_routers if list_routers.call_count == 1
+                    else list_sync_routers(*args))
+                routers = l3_rpc.sync_routers(self.adminContext,
+                                              host=L3_HOSTA,
+                                              router_ids=router_ids,
+                                              revisions=revisions)
+            self.assertEqual([router_ids[1]], [r['id'] for r in routers])
+            self.assertEqual('new_name', routers[0]['name'])
+            self.assertEqual(2, list_routers.call_count)
+            self.assertEqual([router_ids[1]],
+                             list_routers.call_args[0][3])
+
     def test_router_auto_schedule_restart_l3_agent(self):
         with self.router():
             l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
@@ -312,6 +312,7 @@ class OVS_Lib_Test(base.BaseTestCase):
         flow_expr = mock.patch.object(self.br, '_build_flow_expr_arr').start()
         flow_expr.return_value = ['deleted_flow_1']
         run_ofctl = mock.patch.object(self.br, 'run_ofctl').start()
+        self.br.bundle_supported = False
 
         self.br.defer_apply_on()
         self.br.add_flow(flow='added_flow_1')
@@ -326,9 +327,115 @@ class OVS_Lib_Test(base.BaseTestCase):
         ])
         flow_expr.assert_called_once_with(delete=True, flow='deleted_flow_1')
         run_ofctl.assert_has_calls([
-            mock.call('add-flows', ['-'], 'added_flow_1\nadded_flow_2\n'),
-            mock.call('del-flows', ['-'], 'deleted_flow_1\n')
+            mock.call('add-flows', ['-'], 'added_flow_1\nadded_flow_2\n',
+                      check_error=True),
+            mock.call('del-flows', ['-'], 'deleted_flow_1\n',
+                      check_error=True)
         ])
+        self.assertFalse(self.execute.called)
+
+    def _defer_flows(self):
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, actions='normal')
+        self.br.delete_flows(in_port=1)
+        self.br.add_flow(priority=2, in_port=1, actions='drop')
+        return self.br.defer_apply_off()
+
+    def test_defer_apply_flows_keeps_order(self):
+        run_ofctl = mock.patch.object(self.br, 'run_ofctl').start()
+        self.br.bundle_supported = False
+        self._defer_flows()
+        self.assertEqual([
+            mock.call('add-flows', ['-'], 'hard_timeout=0,idle_timeout=0,'
+                      'priority=1,actions=normal\n', check_error=True),
+            mock.call('del-flows', ['-'], 'in_port=1\n', check_error=True),
+            mock.call('add-flows', ['-'], 'hard_timeout=0,idle_timeout=0,'
+                      'priority=2,in_port=1,actions=drop\n',
+                      check_error=True)],
+            run_ofctl.call_args_list)
+
+    def test_defer_apply_flows_bundle(self):
+        self.assertTrue(self._defer_flows())
+        self.execute.assert_called_once_with(
+            ["ovs-ofctl", "--bundle", "add-flows", self.BR_NAME, "-"],
+            root_helper=self.root_helper,
+            process_input="add hard_timeout=0,idle_timeout=0,"
+                          "priority=1,actions=normal\n"
+                          "delete in_port=1\n"
+                          "add hard_timeout=0,idle_timeout=0,"
+                          "priority=2,in_port=1,actions=drop\n")
+        self.assertTrue(self.br.bundle_supported)
+        self.assertEqual(1, self.br.pop_ofctl_calls())
+        self.assertEqual(0, self.br.pop_ofctl_calls())
+
+    def test_defer_apply_flows_bundle_not_supported(self):
+        self.execute.side_effect = [
+            RuntimeError("ovs-ofctl: unrecognized option '--bundle'"),
+            None, None, None]
+        self._defer_flows()
+        self.assertFalse(self.br.bundle_supported)
+        self.assertEqual(4, self.br.pop_ofctl_calls())
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+        self._defer_flows()
+        self.assertEqual(3, self.execute.call_count)
+        self.assertNotIn("--bundle", self.execute.call_args_list[0][0][0])
+
+    def test_defer_apply_flows_first_bundle_flow_error(self):
+        self.execute.side_effect = [RuntimeError("OFPBAC_BAD_OUT_PORT"),
+                                    None, None, None]
+        self._defer_flows()
+        self.assertIsNone(self.br.bundle_supported)
+        self.assertEqual(4, self.execute.call_count)
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+        self._defer_flows()
+        self.assertIn("--bundle", self.execute.call_args_list[0][0][0])
+        self.assertTrue(self.br.bundle_supported)
+
+    def test_defer_apply_flows_bundle_error_after_success(self):
+        self.br.bundle_supported = True
+        self.execute.side_effect = [RuntimeError(), None, None, None]
+        self.assertTrue(self._defer_flows())
+        self.assertTrue(self.br.bundle_supported)
+        self.assertEqual(4, self.execute.call_count)
+
+    def test_defer_apply_flows_error(self):
+        self.br.bundle_supported = False
+        self.execute.side_effect = [None, RuntimeError(), None]
+        self.assertFalse(self._defer_flows())
+        self.assertEqual(3, self.execute.call_count)
+
+    def test_apply_deferred_flows_keeps_deferring(self):
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, actions='normal')
+        self.assertTrue(self.br.apply_deferred_flows())
+        self.assertEqual(1, self.execute.call_count)
+        self.br.delete_flows(in_port=1)
+        self.assertEqual(1, self.execute.call_count)
+        self.assertTrue(self.br.defer_apply_off())
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_deferred_ovs_bridge(self):
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, actions='normal')
+        deferred_br = ovs_lib.DeferredOVSBridge(self.br)
+        deferred_br.add_flow(priority=2, in_port=1, actions='drop')
+        deferred_br.mod_flow(priority=2, in_port=2, actions='drop')
+        deferred_br.delete_flows(in_port=3)
+        self.assertFalse(self.execute.called)
+        self.assertTrue(deferred_br.apply_flows())
+        self.execute.assert_called_once_with(
+            ["ovs-ofctl", "--bundle", "add-flows", self.BR_NAME, "-"],
+            root_helper=self.root_helper,
+            process_input="add hard_timeout=0,idle_timeout=0,"
+                          "priority=2,in_port=1,actions=drop\n"
+                          "modify hard_timeout=0,idle_timeout=0,"
+                          "priority=2,in_port=2,actions=drop\n"
+                          "delete in_port=3\n")
+        # The bridge still defers its own flows
+        self.assertTrue(self.br.defer_apply_flows)
+        self.assertEqual(1, len(self.br.deferred_flows))
 
     def test_add_tunnel_port(self):
         pname = "tap99"
@@ -103,7 +103,7 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             def __init__(self, f):
                 self.f = f
 
-            def start(self, interval=0):
+            def start(self, interval=0, initial_delay=None):
                 self.f()
 
         with contextlib.nested(
@@ -252,6 +252,111 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                                       updated_ports)
         self.assertEqual(expected, actual)
 
+    def _device(self, name, vif_id, ofport=1):
+        return {'name': name, 'ofport': ofport,
+                'external_ids': {'iface-id': vif_id,
+                                 'attached-mac': 'fa:16:3e:00:00:01'}}
+
+    def mock_process_port_events(self, events, registered_ports,
+                                 updated_ports=None, bridges=None):
+        events = dict({'added': [], 'removed': [], 'modified': []}, **events)
+        bridges = bridges or {}
+        with contextlib.nested(
+            mock.patch.object(ovs_lib, 'get_bridge_for_iface',
+                              side_effect=lambda root_helper, name:
+                              bridges.get(name, self.agent.int_br.br_name)),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_set'),
+            mock.patch.object(self.agent.int_br, 'get_port_tag_dict')
+        ) as (get_bridge, get_vif_port_set, get_port_tag_dict):
+            port_info = self.agent.process_port_events(
+                events, registered_ports, updated_ports)
+        self.assertFalse(get_vif_port_set.called)
+        self.assertFalse(get_port_tag_dict.called)
+        return port_info
+
+    def test_process_port_events_no_changes(self):
+        actual = self.mock_process_port_events({}, set([1, 2]))
+        self.assertEqual({'current': set([1, 2])}, actual)
+
+    def test_process_port_events_returns_port_changes(self):
+        events = {'added': [self._device('tap3', 3),
+                            self._device('qg-4', 4)],
+                  'removed': [self._device('tap2', 2)]}
+        actual = self.mock_process_port_events(
+            events, set([1, 2]), bridges={'qg-4': 'br-ex'})
+        self.assertEqual(dict(current=set([1, 3]), added=set([3]),
+                              removed=set([2])), actual)
+
+    def test_process_port_events_waits_for_ofport(self):
+        events = {'added': [self._device('tap3', 3, ofport=[])]}
+        actual = self.mock_process_port_events(events, set([1]))
+        self.assertEqual({'current': set([1])}, actual)
+        events = {'modified': [self._device('tap3', 3)]}
+        actual = self.mock_process_port_events(events, set([1]))
+        self.assertEqual(dict(current=set([1, 3]), added=set([3]),
+                              removed=set()), actual)
+
+    def test_process_port_events_removes_failed_port(self):
+        events = {'modified': [self._device('tap1', 1, ofport=-1)]}
+        actual = self.mock_process_port_events(events, set([1, 2]))
+        self.assertEqual(dict(current=set([2]), added=set(),
+                              removed=set([1])), actual)
+
+    def test_process_port_events_ignores_updated_port_if_removed(self):
+        events = {'removed': [self._device('tap2', 2)]}
+        actual = self.mock_process_port_events(events, set([1, 2]),
+                                               set([1, 2]))
+        self.assertEqual(dict(current=set([1]), added=set(),
+                              removed=set([2]), updated=set([1])), actual)
+
+    def test_process_port_events_returns_none_for_xenserver_vifs(self):
+        device = {'name': 'vif1', 'ofport': 1,
+                  'external_ids': {'xs-vif-uuid': 'uuid',
+                                   'attached-mac': 'fa:16:3e:00:00:01'}}
+        self.assertIsNone(self.mock_process_port_events(
+            {'added': [device]}, set([1])))
+
+    def test_rpc_loop_processes_port_events_after_full_scan(self):
+        polling_manager = mock.Mock()
+        polling_manager.get_events.return_value = mock.sentinel.events
+        port_info = {'current': set([1])}
+        with contextlib.nested(
+            mock.patch.object(self.agent, '_agent_has_updates',
+                              side_effect=[True, True, RuntimeError]),
+            mock.patch.object(self.agent, 'scan_ports',
+                              return_value=port_info),
+            mock.patch.object(self.agent, 'process_port_events',
+                              return_value=port_info),
+            mock.patch.object(ovs_neutron_agent.time, 'sleep')
+        ) as (has_updates, scan_ports, process_port_events, sleep):
+            self.agent.enable_tunneling = False
+            self.assertRaises(RuntimeError, self.agent.rpc_loop,
+                              polling_manager)
+        scan_ports.assert_called_once_with(set(), set())
+        process_port_events.assert_called_once_with(
+            mock.sentinel.events, set([1]), set())
+
+    def test_rpc_loop_resyncs_when_flows_not_applied(self):
+        polling_manager = mock.Mock()
+        polling_manager.get_events.return_value = mock.sentinel.events
+        port_info = {'current': set([1])}
+        with contextlib.nested(
+            mock.patch.object(self.agent, '_agent_has_updates',
+                              side_effect=[True, True, RuntimeError]),
+            mock.patch.object(self.agent, 'scan_ports',
+                              return_value=port_info),
+            mock.patch.object(self.agent, 'process_port_events'),
+            mock.patch.object(self.agent, '_apply_deferred_flows',
+                              side_effect=[False, True]),
+            mock.patch.object(ovs_neutron_agent.time, 'sleep')
+        ) as (has_updates, scan_ports, process_port_events, apply_flows,
+              sleep):
+            self.agent.enable_tunneling = False
+            self.assertRaises(RuntimeError, self.agent.rpc_loop,
+                              polling_manager)
+        self.assertEqual(2, scan_ports.call_count)
+        self.assertFalse(process_port_events.called)
+
     def test_update_ports_returns_changed_vlan(self):
         br = ovs_lib.OVSBridge('br-int', 'sudo')
         mac = "ca:fe:de:ad:be:ef"
@@ -273,11 +378,13 @@ class TestOvsNeutronAgent(base.BaseTestCase):
 
     def test_treat_devices_added_returns_true_for_missing_device(self):
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
                               side_effect=Exception()),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=mock.Mock())):
-            self.assertTrue(self.agent.treat_devices_added_or_updated([{}]))
+            self.assertTrue(self.agent.treat_devices_added_or_updated(
+                ['xxx']))
 
     def _mock_treat_devices_added_updated(self, details, port, func_name):
         """Mock treat devices added or updated.
@@ -288,40 +395,46 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, func_name)
         ) as (get_dev_fn, get_vif_func, upd_dev_up, upd_dev_down, func):
-            self.assertFalse(self.agent.treat_devices_added_or_updated([{}]))
+            self.assertFalse(self.agent.treat_devices_added_or_updated(
+                ['xxx']))
         return func.called
 
     def test_treat_devices_added_updated_ignores_invalid_ofport(self):
         port = mock.Mock()
         port.ofport = -1
         self.assertFalse(self._mock_treat_devices_added_updated(
-            mock.MagicMock(), port, 'port_dead'))
+            {'device': 'xxx'}, port, 'port_dead'))
 
     def test_treat_devices_added_updated_marks_unknown_port_as_dead(self):
         port = mock.Mock()
         port.ofport = 1
         self.assertTrue(self._mock_treat_devices_added_updated(
-            mock.MagicMock(), port, 'port_dead'))
+            {'device': 'xxx'}, port, 'port_dead'))
 
     def test_treat_devices_added_does_not_process_missing_port(self):
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details'),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list'),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=None)
         ) as (get_dev_fn, get_vif_func):
+            self.assertFalse(self.agent.treat_devices_added_or_updated(
+                ['xxx']))
             self.assertFalse(get_dev_fn.called)
 
     def test_treat_devices_added__updated_updates_known_port(self):
         details = mock.MagicMock()
         details.__contains__.side_effect = lambda x: True
+        details.__getitem__.side_effect = lambda x: 'xxx'
         self.assertTrue(self._mock_treat_devices_added_updated(
             details, mock.Mock(), 'treat_vif_port'))
 
@@ -334,31 +447,100 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                              'segmentation_id': 'bar',
                              'network_type': 'baz'}
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=fake_details_dict),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[fake_details_dict]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=mock.MagicMock()),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, 'treat_vif_port')
         ) as (get_dev_fn, get_vif_func, upd_dev_up,
               upd_dev_down, treat_vif_port):
-            self.assertFalse(self.agent.treat_devices_added_or_updated([{}]))
+            self.assertFalse(self.agent.treat_devices_added_or_updated(
+                ['xxx']))
             self.assertTrue(treat_vif_port.called)
-            self.assertTrue(upd_dev_down.called)
+            upd_dev_down.assert_called_once_with(
+                self.agent.context, ['xxx'], self.agent.agent_id,
+                cfg.CONF.host)
+            self.assertFalse(upd_dev_up.called)
+
+    def test_treat_devices_added_updated_uses_single_rpc_calls(self):
+        details = [{'admin_state_up': True,
+                    'port_id': device,
+                    'device': device,
+                    'network_id': 'yyy',
+                    'physical_network': 'foo',
+                    'segmentation_id': 'bar',
+                    'network_type': 'baz'} for device in ('xxx', 'zzz')]
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=details),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=mock.MagicMock()),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ) as (get_dev_fn, get_vif_func, upd_dev_up, treat_vif_port):
+            self.assertFalse(self.agent.treat_devices_added_or_updated(
+                ['xxx', 'zzz']))
+            self.assertEqual(1, get_dev_fn.call_count)
+            self.assertEqual(2, treat_vif_port.call_count)
+            upd_dev_up.assert_called_once_with(
+                self.agent.context, ['xxx', 'zzz'], self.agent.agent_id,
+                cfg.CONF.host)
+
+    def test_treat_devices_added_updated_applies_flows_before_status(self):
+        details = [{'admin_state_up': True,
+                    'port_id': 'xxx',
+                    'device': 'xxx',
+                    'network_id': 'yyy',
+                    'physical_network': 'foo',
+                    'segmentation_id': 'bar',
+                    'network_type': 'baz'}]
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=details),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=mock.MagicMock()),
+            mock.patch.object(self.agent.int_br, 'apply_deferred_flows',
+                              return_value=False),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ) as (get_dev_fn, get_vif_func, apply_flows, upd_dev_up,
+              treat_vif_port):
+            self.assertTrue(self.agent.treat_devices_added_or_updated(
+                ['xxx']))
+            self.assertTrue(treat_vif_port.called)
+            apply_flows.assert_called_once_with()
+            self.assertFalse(upd_dev_up.called)
+
+    def test_treat_ancillary_devices_added_applies_flows_before_status(self):
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list'),
+            mock.patch.object(self.agent.int_br, 'apply_deferred_flows',
+                              return_value=False),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up')
+        ) as (get_dev_fn, apply_flows, upd_dev_up):
+            self.assertTrue(self.agent.treat_ancillary_devices_added(
+                ['xxx']))
+            apply_flows.assert_called_once_with()
+            self.assertFalse(upd_dev_up.called)
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
-            self.assertTrue(self.agent.treat_devices_removed([{}]))
+            self.assertTrue(self.agent.treat_devices_removed(['xxx']))
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        details = [dict(device='xxx', exists=port_exists)]
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                return_value=details):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
-                self.assertFalse(self.agent.treat_devices_removed([{}]))
-        self.assertTrue(port_unbound.called)
+                self.assertFalse(self.agent.treat_devices_removed(['xxx']))
+        port_unbound.assert_called_once_with('xxx')
 
     def test_treat_devices_removed_unbinds_port(self):
         self._mock_treat_devices_removed(True)
@@ -398,14 +580,18 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         with mock.patch.object(self.agent.state_rpc,
                                "report_state") as report_st:
             self.agent.int_br_device_count = 5
+            self.agent.use_call = True
             self.agent._report_state()
             report_st.assert_called_with(self.agent.context,
-                                         self.agent.agent_state)
+                                         self.agent.agent_state, True)
             self.assertNotIn("start_flag", self.agent.agent_state)
             self.assertEqual(
                 self.agent.agent_state["configurations"]["devices"],
                 self.agent.int_br_device_count
             )
+            self.agent._report_state()
+            report_st.assert_called_with(self.agent.context,
+                                         self.agent.agent_state, False)
 
     def test_network_delete(self):
         with contextlib.nested(
@@ -555,16 +741,15 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         self._prepare_l2_pop_ofports()
         fdb_entry = {'net3': {}}
         with contextlib.nested(
-            mock.patch.object(self.agent.tun_br, 'add_flow'),
-            mock.patch.object(self.agent.tun_br, 'delete_flows'),
+            mock.patch.object(ovs_lib, 'DeferredOVSBridge'),
             mock.patch.object(self.agent, 'setup_tunnel_port'),
             mock.patch.object(self.agent, 'cleanup_tunnel_port')
-        ) as (add_flow_fn, del_flow_fn, add_tun_fn, clean_tun_fn):
+        ) as (deferred_br_cls, add_tun_fn, clean_tun_fn):
             self.agent.fdb_add(None, fdb_entry)
-            self.assertFalse(add_flow_fn.called)
+            self.assertFalse(deferred_br_cls.called)
             self.assertFalse(add_tun_fn.called)
             self.agent.fdb_remove(None, fdb_entry)
-            self.assertFalse(del_flow_fn.called)
+            self.assertFalse(deferred_br_cls.called)
             self.assertFalse(clean_tun_fn.called)
 
     def test_fdb_ignore_self(self):
@@ -577,13 +762,13 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                       {'agent_ip':
                        [['mac', 'ip'],
                         n_const.FLOODING_ENTRY]}}}
-        with mock.patch.object(self.agent.tun_br,
-                               "defer_apply_on") as defer_fn:
+        with mock.patch.object(ovs_lib,
+                               "DeferredOVSBridge") as deferred_br_cls:
             self.agent.fdb_add(None, fdb_entry)
-            self.assertFalse(defer_fn.called)
+            self.assertFalse(deferred_br_cls.called)
 
             self.agent.fdb_remove(None, fdb_entry)
-            self.assertFalse(defer_fn.called)
+            self.assertFalse(deferred_br_cls.called)
 
     def test_fdb_add_flows(self):
         self._prepare_l2_pop_ofports()
@@ -595,23 +780,27 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                        [['mac', 'ip'],
                         n_const.FLOODING_ENTRY]}}}
         with contextlib.nested(
-            mock.patch.object(self.agent.tun_br, 'add_flow'),
-            mock.patch.object(self.agent.tun_br, 'mod_flow'),
+            mock.patch.object(ovs_lib, 'DeferredOVSBridge'),
             mock.patch.object(self.agent.tun_br, 'setup_tunnel_port'),
-        ) as (add_flow_fn, mod_flow_fn, add_tun_fn):
+        ) as (deferred_br_cls, add_tun_fn):
             add_tun_fn.return_value = '2'
             self.agent.fdb_add(None, fdb_entry)
-            add_flow_fn.assert_called_with(table=constants.UCAST_TO_TUN,
-                                           priority=2,
-                                           dl_vlan='vlan1',
-                                           dl_dst='mac',
-                                           actions='strip_vlan,'
-                                           'set_tunnel:seg1,output:2')
-            mod_flow_fn.assert_called_with(table=constants.FLOOD_TO_TUN,
-                                           priority=1,
-                                           dl_vlan='vlan1',
-                                           actions='strip_vlan,'
-                                           'set_tunnel:seg1,output:1,2')
+            deferred_br_cls.assert_called_once_with(self.agent.tun_br)
+            deferred_br = deferred_br_cls.return_value
+            deferred_br.add_flow.assert_called_with(
+                table=constants.UCAST_TO_TUN,
+                priority=2,
+                dl_vlan='vlan1',
+                dl_dst='mac',
+                actions='strip_vlan,set_tunnel:seg1,output:2')
+            deferred_br.mod_flow.assert_called_with(
+                table=constants.FLOOD_TO_TUN,
+                priority=1,
+                dl_vlan='vlan1',
+                actions='strip_vlan,set_tunnel:seg1,output:1,2')
+            deferred_br.apply_flows.assert_called_once_with()
+            self.assertFalse(self.agent.tun_br.add_flow.called)
+            self.assertFalse(self.agent.tun_br.defer_apply_off.called)
 
     def test_fdb_del_flows(self):
         self._prepare_l2_pop_ofports()
@@ -622,19 +811,21 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                       {'2.2.2.2':
                        [['mac', 'ip'],
                         n_const.FLOODING_ENTRY]}}}
-        with contextlib.nested(
-            mock.patch.object(self.agent.tun_br, 'mod_flow'),
-            mock.patch.object(self.agent.tun_br, 'delete_flows'),
-        ) as (mod_flow_fn, del_flow_fn):
+        with mock.patch.object(ovs_lib,
+                               'DeferredOVSBridge') as deferred_br_cls:
             self.agent.fdb_remove(None, fdb_entry)
-            del_flow_fn.assert_called_with(table=constants.UCAST_TO_TUN,
-                                           dl_vlan='vlan2',
-                                           dl_dst='mac')
-            mod_flow_fn.assert_called_with(table=constants.FLOOD_TO_TUN,
-                                           priority=1,
-                                           dl_vlan='vlan2',
-                                           actions='strip_vlan,'
-                                           'set_tunnel:seg2,output:1')
+            deferred_br_cls.assert_called_once_with(self.agent.tun_br)
+            deferred_br = deferred_br_cls.return_value
+            deferred_br.delete_flows.assert_called_with(
+                table=constants.UCAST_TO_TUN, dl_vlan='vlan2', dl_dst='mac')
+            deferred_br.mod_flow.assert_called_with(
+                table=constants.FLOOD_TO_TUN,
+                priority=1,
+                dl_vlan='vlan2',
+                actions='strip_vlan,set_tunnel:seg2,output:1')
+            deferred_br.apply_flows.assert_called_once_with()
+            self.assertFalse(self.agent.tun_br.delete_flows.called)
+            self.assertFalse(self.agent.tun_br.defer_apply_off.called)
 
     def test_fdb_add_port(self):
         self._prepare_l2_pop_ofports()
@@ -545,6 +545,15 @@ class TunnelTest(base.BaseTestCase):
                        'removed': set(['tap0']),
                        'added': set([])})
         ])
+        # The flows of the first iteration are applied at its end, the
+        # second one is interrupted by the fake exception
+        deferred_flows_calls = [mock.call.defer_apply_on(),
+                                mock.call.defer_apply_off(),
+                                mock.call.pop_ofctl_calls(),
+                                mock.call.defer_apply_on()]
+        self.mock_int_bridge_expected += deferred_flows_calls
+        self.mock_map_tun_bridge_expected += deferred_flows_calls
+        self.mock_tun_bridge_expected += deferred_flows_calls
         self._verify_mock_calls()
 
 
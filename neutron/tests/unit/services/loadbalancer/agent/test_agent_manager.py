@@ -31,6 +31,7 @@ class TestManager(base.BaseTestCase):
 
         mock_conf = mock.Mock()
         mock_conf.device_driver = ['devdriver']
+        mock_conf.AGENT.report_interval = 0
 
         self.mock_importer = mock.patch.object(manager, 'importutils').start()
 
@@ -51,6 +52,17 @@ class TestManager(base.BaseTestCase):
             self.mgr.initialize_service_hook(mock.Mock())
             sync.assert_called_once_with()
 
+    def test_report_state_first_report_is_call(self):
+        with mock.patch.object(self.mgr.state_rpc,
+                               'report_state') as report_state:
+            self.mgr._report_state()
+            report_state.assert_called_with(mock.ANY, self.mgr.agent_state,
+                                            True)
+            self.assertNotIn('start_flag', self.mgr.agent_state)
+            self.mgr._report_state()
+            report_state.assert_called_with(mock.ANY, self.mgr.agent_state,
+                                            False)
+
     def test_periodic_resync_needs_sync(self):
         with mock.patch.object(self.mgr, 'sync_state') as sync:
             self.mgr.needs_resync = True
@@ -15,9 +15,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -28,6 +30,7 @@ from neutron import context
 from neutron.db import agents_db
 from neutron.db import db_base_plugin_v2
 from neutron.extensions import agent
+from neutron import manager
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
@@ -236,6 +239,97 @@ class AgentDBTestCase(AgentDBTestMixIn,
             query_string='binary=neutron-l3-agent&host=' + L3_HOSTB)
         self.assertFalse(agents['agents'][0]['alive'])
 
+    def _report_heartbeats(self, callback, agent_states):
+        for agent_state in agent_states:
+            heartbeat = dict(agent_state)
+            del heartbeat['configurations']
+            callback.report_state(self.adminContext,
+                                  agent_state={'agent_state': heartbeat},
+                                  time=timeutils.strtime())
+
+    def _get_agent_db(self, agent_state):
+        plugin = manager.NeutronManager.get_plugin()
+        return plugin._get_agent_by_type_and_host(
+            self.adminContext, agent_state['agent_type'], agent_state['host'])
+
+    def test_heartbeats_are_batched(self):
+        agent_states = self._register_agent_states()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.advance_time_seconds(60)
+        plugin = manager.NeutronManager.get_plugin()
+        callback = agents_db.AgentExtRpcCallback()
+        with contextlib.nested(
+            mock.patch.object(agents_db.greenthread, 'spawn_after'),
+            mock.patch.object(plugin, 'update_agents_heartbeat',
+                              wraps=plugin.update_agents_heartbeat)
+        ) as (spawn_after, update_heartbeat):
+            self._report_heartbeats(callback, agent_states)
+            spawn_after.assert_called_once_with(
+                cfg.CONF.agent_heartbeat_batch_interval,
+                callback._update_heartbeats)
+            self.assertFalse(update_heartbeat.called)
+            callback._update_heartbeats()
+        # One update for the L3 agents and one for the DHCP agents
+        self.assertEqual(2, update_heartbeat.call_count)
+        self.assertEqual({}, callback.heartbeats)
+        for agent_state in agent_states:
+            agent_db = self._get_agent_db(agent_state)
+            self.assertEqual(timeutils.utcnow(),
+                             agent_db.heartbeat_timestamp)
+            self.assertEqual(agent_state['configurations'],
+                             plugin.get_configuration_dict(agent_db))
+
+    def _delete_agent_and_report_heartbeat(self, callback, agent_state):
+        plugin = manager.NeutronManager.get_plugin()
+        plugin.delete_agent(self.adminContext,
+                            self._get_agent_db(agent_state).id)
+        with mock.patch.object(agents_db.greenthread, 'spawn_after'):
+            self._report_heartbeats(callback, [agent_state])
+            if callback.heartbeats:
+                callback._update_heartbeats()
+
+    def _test_heartbeat_of_deleted_agent(self):
+        agent_state = self._register_agent_states()[0]
+        callback = agents_db.AgentExtRpcCallback()
+        callback.report_state(self.adminContext,
+                              agent_state={'agent_state': agent_state},
+                              time=timeutils.strtime())
+        self._delete_agent_and_report_heartbeat(callback, agent_state)
+        # The agent is created again from its last full report
+        plugin = manager.NeutronManager.get_plugin()
+        agent_db = self._get_agent_db(agent_state)
+        self.assertEqual(agent_state['configurations'],
+                         plugin.get_configuration_dict(agent_db))
+
+    def test_heartbeat_of_deleted_agent(self):
+        self._test_heartbeat_of_deleted_agent()
+
+    def test_heartbeat_of_deleted_agent_not_batched(self):
+        cfg.CONF.set_override('agent_heartbeat_batch_interval', 0)
+        self._test_heartbeat_of_deleted_agent()
+
+    def test_heartbeat_of_deleted_agent_without_full_report(self):
+        agent_state = self._register_agent_states()[0]
+        callback = agents_db.AgentExtRpcCallback()
+        self._delete_agent_and_report_heartbeat(callback, agent_state)
+        self.assertRaises(agent.AgentNotFoundByTypeHost,
+                          self._get_agent_db, agent_state)
+
+    def test_heartbeats_not_batched(self):
+        cfg.CONF.set_override('agent_heartbeat_batch_interval', 0)
+        agent_state = self._register_agent_states()[0]
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.advance_time_seconds(60)
+        plugin = manager.NeutronManager.get_plugin()
+        callback = agents_db.AgentExtRpcCallback()
+        self._report_heartbeats(callback, [agent_state])
+        agent_db = self._get_agent_db(agent_state)
+        self.assertEqual(timeutils.utcnow(), agent_db.heartbeat_timestamp)
+        self.assertEqual(agent_state['configurations'],
+                         plugin.get_configuration_dict(agent_db))
+
 
 class AgentDBTestCaseXML(AgentDBTestCase):
     fmt = 'xml'
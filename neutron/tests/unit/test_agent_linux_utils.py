@@ -14,8 +14,10 @@
 
 import fixtures
 import mock
+from oslo.config import cfg
 import testtools
 
+from neutron.agent.common import config
 from neutron.agent.linux import utils
 from neutron.tests import base
 
@@ -77,6 +79,71 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
         self.assertEqual(result, expected)
 
 
+class AgentUtilsExecuteRootwrapDaemonTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsExecuteRootwrapDaemonTest, self).setUp()
+        config.register_root_helper(cfg.CONF)
+        cfg.CONF.set_override('root_helper_daemon', 'sudo rootwrap-daemon',
+                              'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        client_p = mock.patch.object(utils.rootwrap_client, 'Client')
+        self.client_cls = client_p.start()
+        self.addCleanup(client_p.stop)
+        self.client = self.client_cls.return_value
+        self.addCleanup(setattr, utils.RootwrapDaemonHelper, '_clients', {})
+        self.addCleanup(setattr, utils.RootwrapDaemonHelper, '_semaphore',
+                        None)
+        popen_p = mock.patch("subprocess.Popen.communicate")
+        self.mock_popen = popen_p.start()
+        self.addCleanup(popen_p.stop)
+
+    def test_with_helper_uses_daemon(self):
+        self.client.execute.return_value = (0, "out", "")
+        result = utils.execute(["ls", "/tmp"], "sudo")
+        self.assertEqual(result, "out")
+        self.client_cls.assert_called_once_with(['sudo', 'rootwrap-daemon'])
+        self.client.execute.assert_called_once_with(["ls", "/tmp"],
+                                                    stdin=None)
+        self.assertFalse(self.mock_popen.called)
+
+    def test_daemon_client_reused(self):
+        self.client.execute.return_value = (0, "", "")
+        utils.execute(["ls"], "sudo")
+        utils.execute(["ls"], "sudo")
+        self.assertEqual(self.client_cls.call_count, 1)
+        self.assertEqual(self.client.execute.call_count, 2)
+
+    def test_without_helper_does_not_use_daemon(self):
+        self.mock_popen.return_value = ["out", ""]
+        result = utils.execute(["ls"])
+        self.assertEqual(result, "out")
+        self.assertFalse(self.client.execute.called)
+
+    def test_daemon_not_configured(self):
+        cfg.CONF.set_override('root_helper_daemon', None, 'AGENT')
+        self.mock_popen.return_value = ["out", ""]
+        utils.execute(["ls"], "echo")
+        self.assertFalse(self.client.execute.called)
+
+    def test_daemon_addl_env_and_input(self):
+        self.client.execute.return_value = (0, "", "")
+        utils.execute(["ls"], "sudo", process_input="data",
+                      addl_env={'foo': 'bar'})
+        self.client.execute.assert_called_once_with(
+            ['env', 'foo=bar', 'ls'], stdin="data")
+
+    def test_daemon_exit_code(self):
+        self.client.execute.return_value = (1, "", "error")
+        self.assertRaises(RuntimeError, utils.execute, ["ls"], "sudo")
+        result = utils.execute(["ls"], "sudo", check_exit_code=False,
+                               return_stderr=True)
+        self.assertEqual(result, ("", "error"))
+
+    def test_daemon_unauthorized_command(self):
+        self.client.execute.side_effect = Exception("no filter matched")
+        self.assertRaises(RuntimeError, utils.execute, ["rm", "-rf"], "sudo")
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
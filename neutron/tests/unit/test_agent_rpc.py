@@ -19,6 +19,7 @@ import mock
 
 from neutron.agent import rpc
 from neutron.openstack.common import context
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.tests import base
 
 
@@ -80,6 +81,60 @@ class AgentPluginReportState(base.BaseTestCase):
                                   str)
             self.assertEqual(cast.call_args[1]['topic'], topic)
 
+    def _report_state(self, report_state_api, agent_state, use_call=False):
+        method = 'call' if use_call else 'cast'
+        with mock.patch.object(report_state_api, method) as send:
+            ctxt = context.RequestContext('fake_user', 'fake_project')
+            report_state_api.report_state(ctxt, agent_state,
+                                          use_call=use_call)
+        return (send.call_args[0][1]['args']['agent_state']['agent_state'],
+                send.call_args[1]['version'])
+
+    def test_plugin_report_state_partial(self):
+        report_state_api = rpc.PluginReportStateAPI('test')
+        agent_state = {'agent': 'test', 'configurations': {'ports': 1},
+                       'start_flag': True}
+        # The full state is reported until the plugin is known to support
+        # partial reports
+        self.assertEqual((agent_state, '1.0'),
+                         self._report_state(report_state_api, agent_state))
+        self.assertEqual((agent_state, '1.1'),
+                         self._report_state(report_state_api, agent_state,
+                                            use_call=True))
+        del agent_state['start_flag']
+        self.assertEqual(({'agent': 'test'}, '1.1'),
+                         self._report_state(report_state_api, agent_state))
+        agent_state['configurations']['ports'] = 2
+        self.assertEqual((agent_state, '1.1'),
+                         self._report_state(report_state_api, agent_state))
+        self.assertEqual(({'agent': 'test'}, '1.1'),
+                         self._report_state(report_state_api, agent_state))
+
+    def test_plugin_report_state_full_periodically(self):
+        report_state_api = rpc.PluginReportStateAPI('test')
+        agent_state = {'agent': 'test', 'configurations': {'ports': 1}}
+        self._report_state(report_state_api, agent_state, use_call=True)
+        for i in range(report_state_api.FULL_REPORT_COUNT):
+            report, _version = self._report_state(report_state_api,
+                                                  agent_state)
+            self.assertNotIn('configurations', report)
+        report, _version = self._report_state(report_state_api, agent_state)
+        self.assertEqual(agent_state, report)
+
+    def test_plugin_report_state_partial_not_supported(self):
+        report_state_api = rpc.PluginReportStateAPI('test')
+        agent_state = {'agent': 'test', 'configurations': {'ports': 1}}
+        with mock.patch.object(report_state_api, 'call') as call:
+            call.side_effect = [
+                rpc_common.RemoteError('UnsupportedRpcVersion'), None]
+            ctxt = context.RequestContext('fake_user', 'fake_project')
+            report_state_api.report_state(ctxt, agent_state, use_call=True)
+        self.assertEqual(['1.1', '1.0'],
+                         [c[1]['version'] for c in call.call_args_list])
+        self.assertFalse(report_state_api.partial_report_supported)
+        self.assertEqual((agent_state, '1.0'),
+                         self._report_state(report_state_api, agent_state))
+
 
 class AgentRPCMethods(base.BaseTestCase):
     def test_create_consumers(self):
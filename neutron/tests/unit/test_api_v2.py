@@ -569,6 +569,31 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
         tenant_id = _uuid()
         self._test_list(tenant_id + "bad", tenant_id)
 
+    def test_list_policy_error_before_response(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = [{'id': _uuid(),
+                                               'tenant_id': _uuid()}]
+        with mock.patch.object(policy, 'check', side_effect=ValueError):
+            res = self.api.get(_get_path('networks', fmt=self.fmt),
+                               expect_errors=True)
+        self.assertEqual(exc.HTTPInternalServerError.code, res.status_int)
+
+    def _test_list_read_only(self, native_read_only):
+        instance = self.plugin.return_value
+        instance._NeutronPluginBaseV2__native_read_only_support = (
+            native_read_only)
+        instance.get_networks.return_value = []
+        api = webtest.TestApp(router.APIRouter())
+        api.get(_get_path('networks', fmt=self.fmt))
+        ctx = instance.get_networks.call_args[0][0]
+        self.assertEqual(native_read_only, ctx.read_only)
+
+    def test_list_read_only(self):
+        self._test_list_read_only(True)
+
+    def test_list_without_native_read_only(self):
+        self._test_list_read_only(False)
+
     def test_list_pagination(self):
         id1 = str(_uuid())
         id2 = str(_uuid())
@@ -1399,6 +1424,45 @@ class QuotaTest(APIv2TestBase):
             _get_path('networks'), initial_input)
         self.assertEqual(res.status_int, exc.HTTPCreated.code)
 
+    def _test_create_networks_tracked_quota(self, create_error=None):
+        tenant_id = _uuid()
+        initial_input = {'networks': [{'name': 'net1',
+                                       'tenant_id': tenant_id},
+                                      {'name': 'net2',
+                                       'tenant_id': tenant_id}]}
+        instance = self.plugin.return_value
+        instance.create_network.side_effect = create_error
+        instance.create_network.return_value = {'id': _uuid(),
+                                                'tenant_id': tenant_id}
+        with mock.patch.multiple(quota.QUOTAS,
+                                 is_tracked=mock.DEFAULT,
+                                 make_reservation=mock.DEFAULT,
+                                 commit_reservations=mock.DEFAULT,
+                                 cancel_reservations=mock.DEFAULT) as mocks:
+            mocks['is_tracked'].return_value = True
+            mocks['make_reservation'].return_value = ['r1']
+            res = self.api.post_json(_get_path('networks'), initial_input,
+                                     expect_errors=True)
+        mocks['make_reservation'].assert_called_once_with(
+            mock.ANY, tenant_id, instance, network=2)
+        self.assertFalse(instance.get_networks_count.called)
+        return res, mocks
+
+    def test_create_networks_tracked_quota_committed(self):
+        res, mocks = self._test_create_networks_tracked_quota()
+        self.assertEqual(exc.HTTPCreated.code, res.status_int)
+        mocks['commit_reservations'].assert_called_once_with(mock.ANY,
+                                                             ['r1'])
+        self.assertFalse(mocks['cancel_reservations'].called)
+
+    def test_create_networks_tracked_quota_cancelled(self):
+        res, mocks = self._test_create_networks_tracked_quota(
+            create_error=n_exc.BadRequest(resource='network', msg='fail'))
+        self.assertEqual(exc.HTTPBadRequest.code, res.status_int)
+        mocks['cancel_reservations'].assert_called_once_with(mock.ANY,
+                                                             ['r1'])
+        self.assertFalse(mocks['commit_reservations'].called)
+
 
 class ExtensionTestCase(base.BaseTestCase):
     def setUp(self):
@@ -124,6 +124,23 @@ class RequestTestCase(base.BaseTestCase):
 
 class ResourceTestCase(base.BaseTestCase):
 
+    def test_generated_collection_streamed(self):
+        controller = mock.MagicMock()
+        controller.index.return_value = {
+            'networks': wsgi.StreamedCollection([{'id': 'a'}, {'id': 'b'}])}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        with mock.patch.object(wsgi.JSONDictSerializer,
+                               'serialize') as serialize:
+            res = resource.get('', extra_environ=environ)
+        self.assertFalse(serialize.called)
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(wsgi.JSONDeserializer().deserialize(res.body),
+                         {'body': {'networks': [{'id': 'a'}, {'id': 'b'}]}})
+
     def test_unmapped_neutron_error_with_json(self):
         msg = u'\u7f51\u7edc'
 
@@ -0,0 +1,107 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.db import api as db_api
+from neutron.openstack.common import timeutils
+from neutron.tests import base
+
+
+class TestSlaveDatabase(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSlaveDatabase, self).setUp()
+        cfg.CONF.set_override('slave_connection', 'mysql://slave/neutron',
+                              group='database')
+        db_api.reset_slave_status()
+        self.addCleanup(db_api.reset_slave_status)
+        self.engine = mock.Mock()
+        self.engine.name = 'mysql'
+        self.get_engine = mock.patch(
+            'neutron.openstack.common.db.sqlalchemy.session.get_engine',
+            return_value=self.engine).start()
+        self.get_session = mock.patch(
+            'neutron.openstack.common.db.sqlalchemy.session.get_session'
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+
+    def _set_lag(self, lag):
+        self.engine.execute.return_value.first.return_value = {
+            'Seconds_Behind_Master': lag}
+
+    def test_slave_not_configured(self):
+        cfg.CONF.set_override('slave_connection', '', group='database')
+        self.assertFalse(db_api.slave_usable())
+        self.assertFalse(self.get_engine.called)
+
+    def test_slave_usable(self):
+        self._set_lag(1)
+        self.assertTrue(db_api.slave_usable())
+        self.get_engine.assert_called_once_with(sqlite_fk=True,
+                                                slave_engine=True)
+        self.engine.execute.assert_called_once_with('SHOW SLAVE STATUS')
+
+    def test_slave_lagging(self):
+        self._set_lag(cfg.CONF.database.slave_max_lag + 1)
+        self.assertFalse(db_api.slave_usable())
+
+    def test_slave_replication_stopped(self):
+        self._set_lag(None)
+        self.assertFalse(db_api.slave_usable())
+
+    def test_slave_not_a_slave(self):
+        self.engine.execute.return_value.first.return_value = None
+        self.assertTrue(db_api.slave_usable())
+
+    def test_slave_not_mysql(self):
+        self.engine.name = 'postgresql'
+        self.assertTrue(db_api.slave_usable())
+        self.engine.execute.assert_called_once_with('SELECT 1')
+
+    def test_slave_unreachable(self):
+        self.engine.execute.side_effect = Exception
+        self.assertFalse(db_api.slave_usable())
+
+    def test_slave_status_is_cached(self):
+        self._set_lag(1)
+        self.assertTrue(db_api.slave_usable())
+        self._set_lag(None)
+        timeutils.advance_time_seconds(db_api.SLAVE_CHECK_INTERVAL - 1)
+        self.assertTrue(db_api.slave_usable())
+        timeutils.advance_time_seconds(1)
+        self.assertFalse(db_api.slave_usable())
+        self.assertEqual(2, self.engine.execute.call_count)
+
+    def test_get_session_read_only(self):
+        self._set_lag(1)
+        db_api.get_session(read_only=True)
+        self.get_session.assert_called_once_with(
+            autocommit=True, expire_on_commit=False, sqlite_fk=True,
+            slave_session=True)
+
+    def test_get_session_read_only_slave_lagging(self):
+        self._set_lag(None)
+        db_api.get_session(read_only=True)
+        self.get_session.assert_called_once_with(
+            autocommit=True, expire_on_commit=False, sqlite_fk=True,
+            slave_session=False)
+
+    def test_get_session(self):
+        db_api.get_session()
+        self.get_session.assert_called_once_with(
+            autocommit=True, expire_on_commit=False, sqlite_fk=True,
+            slave_session=False)
+        self.assertFalse(self.get_engine.called)
@@ -17,6 +17,9 @@
 
 # @author Mark McClain (DreamHost)
 
+import imp
+import os
+import re
 import sys
 
 import mock
@@ -26,6 +29,17 @@ from neutron.db.migration import cli
 from neutron.tests import base
 
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(migration.__file__),
+                              'alembic_migrations', 'versions')
+PLUGINS_DIR = os.path.join(os.path.dirname(migration.__file__),
+                           '..', '..', 'plugins')
+L3_DB_MODULES = re.compile(r'\b(l3_db|l3_gwmode_db|extraroute_db)\b')
+
+
+def _load_migration(name):
+    return imp.load_source(name, os.path.join(MIGRATIONS_DIR, name + '.py'))
+
+
 class TestDbMigration(base.BaseTestCase):
     def test_should_run_plugin_in_list(self):
         self.assertTrue(migration.should_run(['foo'], ['foo', 'bar']))
@@ -35,6 +49,33 @@ class TestDbMigration(base.BaseTestCase):
         self.assertTrue(migration.should_run(['foo'], ['*']))
 
 
+class TestRouterRevisionMigration(base.BaseTestCase):
+    def setUp(self):
+        super(TestRouterRevisionMigration, self).setUp()
+        self.plugins = _load_migration(
+            'bf86af8a28cb_router_revision').migration_for_plugins
+
+    def test_plugins_creating_routers_are_migrated(self):
+        # The routers table is created by these migrations only
+        creators = set(_load_migration('folsom_initial').L3_CAPABLE)
+        for name in ('2c4af419145b_l3_support', '40b0aff0302e_mlnx_initial',
+                     'e766b19a3bb_nuage_initial'):
+            creators.update(_load_migration(name).migration_for_plugins)
+        self.assertEqual(set(), creators - set(self.plugins))
+
+    def test_plugins_using_l3_db_are_migrated(self):
+        migrated = set(plugin.split('.')[2] for plugin in self.plugins)
+        for package in os.listdir(PLUGINS_DIR):
+            for dirpath, dirnames, filenames in os.walk(
+                    os.path.join(PLUGINS_DIR, package)):
+                sources = [os.path.join(dirpath, f)
+                           for f in filenames if f.endswith('.py')]
+                if any(L3_DB_MODULES.search(open(source).read())
+                       for source in sources):
+                    self.assertIn(package, migrated)
+                    break
+
+
 class TestCli(base.BaseTestCase):
     def setUp(self):
         super(TestCli, self).setUp()
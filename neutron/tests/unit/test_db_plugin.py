@@ -956,6 +956,31 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
             self._test_list_resources('port', [port1],
                                       query_params=query_params)
 
+    def test_list_ports_with_fields(self):
+        cfg.CONF.set_default('allow_overlapping_ips', True)
+        with contextlib.nested(self.port(device_id='dev1'),
+                               self.port(device_id='dev2')) as ports:
+            req = self.new_list_request('ports',
+                                        params='fields=id&fields=device_id')
+            res = self.deserialize(self.fmt, req.get_response(self.api))
+            expected = [{'id': p['port']['id'], 'device_id': p['port'][
+                'device_id']} for p in ports]
+            self.assertEqual(sorted(expected), sorted(res['ports']))
+
+    def test_list_ports_with_fields_filtered_by_fixed_ips(self):
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id']},
+                         {'subnet_id': subnet['subnet']['id']}]
+            with self.port(subnet, fixed_ips=fixed_ips) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual(2, len(ips))
+                query_params = ('fixed_ips=ip_address%%3D%s&'
+                                'fixed_ips=ip_address%%3D%s&fields=id' %
+                                (ips[0]['ip_address'], ips[1]['ip_address']))
+                req = self.new_list_request('ports', params=query_params)
+                res = self.deserialize(self.fmt, req.get_response(self.api))
+                self.assertEqual([{'id': port['port']['id']}], res['ports'])
+
     def test_list_ports_public_network(self):
         with self.network(shared=True) as network:
             with self.subnet(network) as subnet:
@@ -3676,6 +3701,20 @@ class NeutronDbPluginV2AsMixinTestCase(base.BaseTestCase):
         net = self.plugin.create_network(self.context, self.net_data)
         self.assertEqual(net['status'], 'BUILD')
 
+    def test_get_networks_with_column_fields_skips_objects(self):
+        self.plugin.create_network(self.context, self.net_data)
+        with mock.patch.object(self.plugin, '_make_network_dict') as make:
+            nets = self.plugin.get_networks(self.context,
+                                            fields=['name', 'id', 'name'])
+        self.assertFalse(make.called)
+        self.assertEqual([{'id': 'fake-id', 'name': 'net1'}], nets)
+
+    def test_get_networks_with_other_fields_builds_dicts(self):
+        self.plugin.create_network(self.context, self.net_data)
+        nets = self.plugin.get_networks(self.context,
+                                        fields=['name', 'subnets'])
+        self.assertEqual([{'name': 'net1', 'subnets': []}], nets)
+
 
 class TestBasicGetXML(TestBasicGet):
     fmt = 'xml'
@@ -47,6 +47,20 @@ class TestDhcpRpcCallbackMixin(base.BaseTestCase):
 
         self.assertEqual(len(self.log.mock_calls), 1)
 
+    def test_get_active_networks_info_paged(self):
+        self.plugin.get_networks.return_value = [
+            dict(id='c'), dict(id='a'), dict(id='d'), dict(id='b')]
+        self.plugin.get_ports.return_value = []
+        self.plugin.get_subnets.return_value = []
+
+        networks = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host', limit=2, marker='a')
+
+        self.assertEqual([net['id'] for net in networks], ['b', 'c'])
+        self.plugin.get_subnets.assert_called_once_with(
+            mock.ANY, filters={'network_id': ['b', 'c'],
+                               'enable_dhcp': [True]})
+
     def _test__port_action_with_failures(self, exc=None, action=None):
         port = {
             'network_id': 'foo_network_id',
@@ -482,6 +482,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
             'neutron.agent.linux.external_process.ProcessManager'
         )
         self.external_process = self.external_process_p.start()
+        self.spawn_after = mock.patch('eventlet.spawn_after').start()
 
     def tearDown(self):
         self.external_process_p.stop()
@@ -743,6 +744,8 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = fake_network
 
         self.dhcp.subnet_update_end(None, payload)
+        self.assertFalse(self.plugin.get_network_info.called)
+        self.dhcp._process_dirty_networks()
 
         self.cache.assert_has_calls([mock.call.put(fake_network)])
         self.call_driver.assert_called_once_with('reload_allocations',
@@ -760,6 +763,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = new_state
 
         self.dhcp.subnet_update_end(None, payload)
+        self.dhcp._process_dirty_networks()
 
         self.cache.assert_has_calls([mock.call.put(new_state)])
         self.call_driver.assert_called_once_with('restart',
@@ -778,6 +782,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = fake_network
 
         self.dhcp.subnet_delete_end(None, payload)
+        self.dhcp._process_dirty_networks()
 
         self.cache.assert_has_calls([
             mock.call.get_network_by_subnet_id(
@@ -795,8 +800,54 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port2.network_id),
              mock.call.put_port(mock.ANY)])
+        self.assertFalse(self.call_driver.called)
+        self.spawn_after.assert_called_once_with(
+            0.5, self.dhcp._process_dirty_networks)
+        self.dhcp._process_dirty_networks()
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_port_update_end_no_delay(self):
+        cfg.CONF.set_override('event_coalesce_delay', 0)
+        payload = dict(port=vars(fake_port2))
+        self.cache.get_network_by_id.return_value = fake_network
+        self.dhcp.port_update_end(None, payload)
+        self.assertFalse(self.spawn_after.called)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_port_events_coalesced(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        self.dhcp.port_update_end(None, dict(port=vars(fake_port1)))
+        self.dhcp.port_update_end(None, dict(port=vars(fake_port2)))
+        self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+        self.assertEqual(self.spawn_after.call_count, 1)
+        self.dhcp._process_dirty_networks()
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
+        self.assertEqual(self.dhcp.dirty_networks, {})
+
+    def test_events_refresh_network_once(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.plugin.get_network_info.return_value = fake_network
+        payload = dict(subnet=dict(network_id=fake_network.id))
+        self.dhcp.port_update_end(None, dict(port=vars(fake_port1)))
+        self.dhcp.subnet_update_end(None, payload)
+        self.dhcp.port_update_end(None, dict(port=vars(fake_port2)))
+        self.dhcp.subnet_update_end(None, payload)
+        self.assertEqual(self.dhcp.dirty_networks,
+                         {fake_network.id: 'refresh'})
+        self.dhcp._process_dirty_networks()
+        self.plugin.get_network_info.assert_called_once_with(fake_network.id)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_process_dirty_networks_network_removed(self):
+        self.dhcp.dirty_networks = {fake_network.id: 'reload_allocations'}
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp._process_dirty_networks()
+        self.assertFalse(self.call_driver.called)
 
     def test_port_update_change_ip_on_port(self):
         payload = dict(port=vars(fake_port1))
@@ -808,6 +859,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port1.network_id),
              mock.call.put_port(mock.ANY)])
+        self.dhcp._process_dirty_networks()
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
@@ -821,6 +873,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
             [mock.call.get_port_by_id(fake_port2.id),
              mock.call.get_network_by_id(fake_network.id),
              mock.call.remove_port(fake_port2)])
+        self.dhcp._process_dirty_networks()
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
@@ -878,6 +931,23 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
         self.make_msg.assert_called_once_with('get_active_networks_info',
                                               host='foo')
 
+    def test_get_active_networks_info_paged(self):
+        self.call.side_effect = [[dict(id='a'), dict(id='b')],
+                                 [dict(id='c')]]
+        retval = self.proxy.get_active_networks_info(page_size=2)
+        self.assertEqual([n.id for n in retval], ['a', 'b', 'c'])
+        self.make_msg.assert_has_calls([
+            mock.call('get_active_networks_info', host='foo',
+                      limit=2, marker=None),
+            mock.call('get_active_networks_info', host='foo',
+                      limit=2, marker='b')])
+
+    def test_get_active_networks_info_paging_not_supported(self):
+        self.call.return_value = [dict(id='a'), dict(id='b')]
+        retval = self.proxy.get_active_networks_info(page_size=2)
+        self.assertEqual([n.id for n in retval], ['a', 'b'])
+        self.assertEqual(self.call.call_count, 2)
+
     def test_create_dhcp_port(self):
         port_body = (
             {'port':
@@ -0,0 +1,87 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+FAKE_SG_ID = 'fake-sg-id-0123456789abcdef'
+
+
+class IpsetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(root_helper='sudo',
+                                                execute=self.execute)
+        self.set_name = self.ipset.get_name(FAKE_SG_ID, 'IPv4')
+
+    def _assert_restore(self, lines):
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='\n'.join(lines) + '\n',
+            root_helper='sudo')
+
+    def test_get_name(self):
+        self.assertEqual(self.set_name, 'IPv4fake-sg-id-0123456789a')
+        # Leave room for the suffix of the swap set
+        self.assertTrue(len(self.set_name + ipset_manager.SWAP_SUFFIX) <= 31)
+
+    def test_set_members_new_set(self):
+        self.ipset.set_members(self.set_name, 'IPv4', ['10.0.0.2/32'])
+        swap_name = self.set_name + ipset_manager.SWAP_SUFFIX
+        self._assert_restore(
+            ['create %s hash:net family inet' % self.set_name,
+             'create %s hash:net family inet' % swap_name,
+             'flush %s' % swap_name,
+             'add %s 10.0.0.2/32' % swap_name,
+             'swap %s %s' % (swap_name, self.set_name),
+             'destroy %s' % swap_name])
+        self.assertTrue(self.ipset.set_exists(self.set_name))
+
+    def test_set_members_ipv6(self):
+        self.ipset.set_members(self.set_name, 'IPv6', [])
+        self.assertIn('family inet6',
+                      self.execute.call_args[1]['process_input'])
+
+    def test_set_members_existing_set(self):
+        self.ipset.set_members(self.set_name, 'IPv4',
+                               ['10.0.0.2/32', '10.0.0.3/32'])
+        self.execute.reset_mock()
+        self.ipset.set_members(self.set_name, 'IPv4',
+                               ['10.0.0.3/32', '10.0.0.4/32'])
+        self._assert_restore(['add %s 10.0.0.4/32' % self.set_name,
+                              'del %s 10.0.0.2/32' % self.set_name])
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members(self.set_name, 'IPv4', ['10.0.0.2/32'])
+        self.execute.reset_mock()
+        self.ipset.set_members(self.set_name, 'IPv4', ['10.0.0.2/32'])
+        self.assertFalse(self.execute.called)
+
+    def test_destroy(self):
+        self.ipset.set_members(self.set_name, 'IPv4', [])
+        self.execute.reset_mock()
+        self.ipset.destroy(self.set_name)
+        self.execute.assert_called_once_with(
+            ['ipset', 'destroy', self.set_name], root_helper='sudo')
+        self.assertFalse(self.ipset.set_exists(self.set_name))
+
+    def test_destroy_failure(self):
+        self.ipset.set_members(self.set_name, 'IPv4', [])
+        self.execute.side_effect = RuntimeError
+        self.ipset.destroy(self.set_name)
+        self.assertTrue(self.ipset.set_exists(self.set_name))
@@ -716,6 +716,150 @@ class IptablesFirewallTestCase(base.BaseTestCase):
         ingress = None
         self._test_prepare_port_filter(rule, ingress, egress)
 
+    def _test_filter_remote_group(self, direction, ipset_direction,
+                                  chain_name):
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.get_name.return_value = 'IPv4fake_sgid'
+        self.firewall.ipset.set_exists.return_value = False
+        self.firewall.ipset.ipsets = {}
+        members = {'IPv4': ['10.0.0.2/32'], 'IPv6': []}
+        self.firewall.update_security_group_members('fake_sgid', members)
+        self.assertFalse(self.firewall.ipset.set_members.called)
+
+        rule = {'ethertype': 'IPv4',
+                'direction': direction,
+                'protocol': 'tcp',
+                'port_range_min': 22,
+                'port_range_max': 22,
+                'remote_group_id': 'fake_sgid'}
+        expected = call.add_rule(
+            chain_name, '-p tcp -m tcp --dport 22 -m set --match-set '
+            'IPv4fake_sgid %s -j RETURN' % ipset_direction)
+        if direction == 'ingress':
+            self._test_prepare_port_filter(rule, expected, None)
+        else:
+            self._test_prepare_port_filter(rule, None, expected)
+        self.firewall.ipset.get_name.assert_called_with('fake_sgid', 'IPv4')
+        self.firewall.ipset.set_members.assert_called_once_with(
+            'IPv4fake_sgid', 'IPv4', ['10.0.0.2/32'])
+
+    def test_filter_ipv4_ingress_remote_group(self):
+        self._test_filter_remote_group('ingress', 'src', 'ifake_dev')
+
+    def test_filter_ipv4_egress_remote_group(self):
+        self._test_filter_remote_group('egress', 'dst', 'ofake_dev')
+
+    def test_filter_remote_group_ipset_disabled(self):
+        self.firewall.enable_ipset = False
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.ipsets = {}
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'remote_group_id': 'fake_sgid'}
+        ingress = call.add_rule('ifake_dev', '-j RETURN')
+        self._test_prepare_port_filter(rule, ingress, None)
+        self.assertFalse(self.firewall.ipset.set_members.called)
+
+    def test_filter_remote_group_converted_prefix(self):
+        # Rules converted to IP prefixes on server side don't use ipsets
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.ipsets = {}
+        prefix = FAKE_PREFIX['IPv4']
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'source_ip_prefix': prefix,
+                'remote_group_id': 'fake_sgid'}
+        ingress = call.add_rule('ifake_dev', '-s %s -j RETURN' % prefix)
+        self._test_prepare_port_filter(rule, ingress, None)
+        self.assertFalse(self.firewall.ipset.set_members.called)
+
+    def test_update_security_group_members(self):
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.get_name.side_effect = (
+            lambda id, ethertype: ethertype + id)
+        self.firewall.ipset.set_exists.side_effect = (
+            lambda name: name == 'IPv4fake_sgid')
+        self.v4filter_inst.reset_mock()
+        self.v6filter_inst.reset_mock()
+        members = {'IPv4': ['10.0.0.2/32'], 'IPv6': ['fe80::2/128']}
+        self.firewall.update_security_group_members('fake_sgid', members)
+        # Only the ipsets in use are updated, and the rules untouched
+        self.firewall.ipset.set_members.assert_called_once_with(
+            'IPv4fake_sgid', 'IPv4', ['10.0.0.2/32'])
+        self.assertFalse(self.v4filter_inst.mock_calls)
+        self.assertFalse(self.v6filter_inst.mock_calls)
+        self.assertFalse(self.iptables_inst.apply.called)
+
+    def test_remove_port_filter_destroys_unused_ipsets(self):
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.get_name.return_value = 'IPv4fake_sgid'
+        self.firewall.ipset.set_exists.return_value = False
+        self.firewall.ipset.ipsets = {}
+        port = self._fake_port()
+        port['security_group_rules'] = [{'ethertype': 'IPv4',
+                                         'direction': 'ingress',
+                                         'remote_group_id': 'fake_sgid'}]
+        self.firewall.prepare_port_filter(port)
+        self.firewall.ipset.ipsets = {'IPv4fake_sgid': set()}
+        self.firewall.update_port_filter(port)
+        self.assertFalse(self.firewall.ipset.destroy.called)
+        self.firewall.remove_port_filter(port)
+        self.firewall.ipset.destroy.assert_called_once_with('IPv4fake_sgid')
+
+    def test_prepare_port_filter_with_security_group_rules(self):
+        self.firewall.sg_rules = {'fake_sgid': [{'ethertype': 'IPv4',
+                                                 'direction': 'ingress',
+                                                 'protocol': 'tcp',
+                                                 'port_range_min': 22,
+                                                 'port_range_max': 22}]}
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid']
+        port['security_group_rules'] = []
+        self.firewall.prepare_port_filter(port)
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev', '-p tcp -m tcp --dport 22 -j RETURN')
+
+    def test_update_security_group_rules(self):
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid']
+        self.firewall.prepare_port_filter(port)
+        self.iptables_inst.apply.reset_mock()
+        self.v4filter_inst.reset_mock()
+        rules = [{'ethertype': 'IPv4',
+                  'direction': 'ingress',
+                  'protocol': 'udp'}]
+        self.firewall.update_security_group_rules('fake_sgid', rules)
+        self.assertEqual(self.firewall.sg_rules['fake_sgid'], rules)
+        self.v4filter_inst.add_rule.assert_any_call('ifake_dev',
+                                                    '-p udp -m udp -j RETURN')
+        self.assertTrue(self.iptables_inst.apply.called)
+
+    def test_update_security_group_rules_not_in_use(self):
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid']
+        self.firewall.prepare_port_filter(port)
+        self.iptables_inst.apply.reset_mock()
+        self.firewall.update_security_group_rules('fake_sgid2', [])
+        self.assertFalse(self.iptables_inst.apply.called)
+
+    def test_remove_port_filter_removes_unused_security_groups(self):
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.get_name.return_value = 'IPv4fake_sgid2'
+        self.firewall.ipset.ipsets = {}
+        self.firewall.sg_rules = {'fake_sgid': [
+            {'ethertype': 'IPv4',
+             'direction': 'ingress',
+             'remote_group_id': 'fake_sgid2'}]}
+        self.firewall.sg_members = {'fake_sgid2': {'IPv4': [], 'IPv6': []}}
+        port = self._fake_port()
+        port['security_groups'] = ['fake_sgid']
+        self.firewall.prepare_port_filter(port)
+        self.assertEqual(['fake_sgid'], self.firewall.sg_rules.keys())
+        self.assertEqual(['fake_sgid2'], self.firewall.sg_members.keys())
+        self.firewall.remove_port_filter(port)
+        self.assertFalse(self.firewall.sg_rules)
+        self.assertFalse(self.firewall.sg_members)
+
     def _test_prepare_port_filter(self,
                                   rule,
                                   ingress_expected_call=None,
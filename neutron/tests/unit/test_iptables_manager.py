@@ -97,23 +97,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
         iptables_args = {'bn': bn[:16]}
 
-        filter_dump = ('# Generated by iptables_manager\n'
-                       '*filter\n'
-                       ':neutron-filter-top - [0:0]\n'
-                       ':%(bn)s-FORWARD - [0:0]\n'
-                       ':%(bn)s-INPUT - [0:0]\n'
-                       ':%(bn)s-local - [0:0]\n'
-                       ':%(bn)s-filter - [0:0]\n'
-                       ':%(bn)s-OUTPUT - [0:0]\n'
-                       '[0:0] -A FORWARD -j neutron-filter-top\n'
-                       '[0:0] -A OUTPUT -j neutron-filter-top\n'
-                       '[0:0] -A neutron-filter-top -j %(bn)s-local\n'
-                       '[0:0] -A INPUT -j %(bn)s-INPUT\n'
-                       '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
-                       '[0:0] -A FORWARD -j %(bn)s-FORWARD\n'
-                       'COMMIT\n'
-                       '# Completed by iptables_manager\n' % iptables_args)
-
         filter_dump_mod = ('# Generated by iptables_manager\n'
                            '*filter\n'
                            ':neutron-filter-top - [0:0]\n'
@@ -158,13 +141,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                        process_input=nat_dump + filter_dump_mod,
                        root_helper=self.root_helper),
              None),
-            (mock.call(['iptables-save', '-c'],
-                       root_helper=self.root_helper),
-             ''),
-            (mock.call(['iptables-restore', '-c'],
-                       process_input=nat_dump + filter_dump,
-                       root_helper=self.root_helper),
-             None),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
 
@@ -186,22 +162,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
         iptables_args = {'bn': bn}
 
-        filter_dump = ('# Generated by iptables_manager\n'
-                       '*filter\n'
-                       ':neutron-filter-top - [0:0]\n'
-                       ':%(bn)s-FORWARD - [0:0]\n'
-                       ':%(bn)s-INPUT - [0:0]\n'
-                       ':%(bn)s-local - [0:0]\n'
-                       ':%(bn)s-OUTPUT - [0:0]\n'
-                       '[0:0] -A FORWARD -j neutron-filter-top\n'
-                       '[0:0] -A OUTPUT -j neutron-filter-top\n'
-                       '[0:0] -A neutron-filter-top -j %(bn)s-local\n'
-                       '[0:0] -A INPUT -j %(bn)s-INPUT\n'
-                       '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
-                       '[0:0] -A FORWARD -j %(bn)s-FORWARD\n'
-                       'COMMIT\n'
-                       '# Completed by iptables_manager\n' % iptables_args)
-
         filter_dump_mod = ('# Generated by iptables_manager\n'
                            '*filter\n'
                            ':neutron-filter-top - [0:0]\n'
@@ -247,11 +207,15 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                        process_input=nat_dump + filter_dump_mod,
                        root_helper=self.root_helper),
              None),
-            (mock.call(['iptables-save', '-c'],
-                       root_helper=self.root_helper),
-             ''),
-            (mock.call(['iptables-restore', '-c'],
-                       process_input=nat_dump + filter_dump,
+            (mock.call(['iptables-restore', '-n'],
+                       process_input=(
+                           '# Generated by iptables_manager\n'
+                           '*filter\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-X %(bn)s-filter\n'
+                           'COMMIT\n'
+                           '# Completed by iptables_manager\n'
+                           % iptables_args),
                        root_helper=self.root_helper),
              None),
         ]
@@ -294,11 +258,15 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                        process_input=NAT_DUMP + filter_dump_mod,
                        root_helper=self.root_helper),
              None),
-            (mock.call(['iptables-save', '-c'],
-                       root_helper=self.root_helper),
-             ''),
-            (mock.call(['iptables-restore', '-c'],
-                       process_input=NAT_DUMP + FILTER_DUMP,
+            (mock.call(['iptables-restore', '-n'],
+                       process_input=(
+                           '# Generated by iptables_manager\n'
+                           '*filter\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-X %(bn)s-filter\n'
+                           'COMMIT\n'
+                           '# Completed by iptables_manager\n'
+                           % IPTABLES_ARG),
                        root_helper=self.root_helper),
              None),
         ]
@@ -342,13 +310,17 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                        process_input=NAT_DUMP + filter_dump_mod,
                        root_helper=self.root_helper),
              None),
-            (mock.call(['iptables-save', '-c'],
+            (mock.call(['iptables-restore', '-n'],
+                       process_input=(
+                           '# Generated by iptables_manager\n'
+                           '*filter\n'
+                           ':%(bn)s-INPUT - [0:0]\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-X %(bn)s-filter\n'
+                           'COMMIT\n'
+                           '# Completed by iptables_manager\n'
+                           % IPTABLES_ARG),
                        root_helper=self.root_helper),
-             ''),
-            (mock.call(['iptables-restore', '-c'],
-                       process_input=NAT_DUMP + FILTER_DUMP,
-                       root_helper=self.root_helper
-                       ),
              None),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
@@ -407,11 +379,16 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                        process_input=NAT_DUMP + filter_dump_mod,
                        root_helper=self.root_helper),
              None),
-            (mock.call(['iptables-save', '-c'],
-                       root_helper=self.root_helper),
-             ''),
-            (mock.call(['iptables-restore', '-c'],
-                       process_input=NAT_DUMP + FILTER_DUMP,
+            (mock.call(['iptables-restore', '-n'],
+                       process_input=(
+                           '# Generated by iptables_manager\n'
+                           '*filter\n'
+                           ':%(wrap)s - [0:0]\n'
+                           ':%(bn)s-INPUT - [0:0]\n'
+                           '-X %(wrap)s\n'
+                           'COMMIT\n'
+                           '# Completed by iptables_manager\n'
+                           % iptables_args),
                        root_helper=self.root_helper),
              None),
         ]
@@ -433,24 +410,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
     def test_add_nat_rule(self):
-        nat_dump = ('# Generated by iptables_manager\n'
-                    '*nat\n'
-                    ':neutron-postrouting-bottom - [0:0]\n'
-                    ':%(bn)s-float-snat - [0:0]\n'
-                    ':%(bn)s-POSTROUTING - [0:0]\n'
-                    ':%(bn)s-PREROUTING - [0:0]\n'
-                    ':%(bn)s-OUTPUT - [0:0]\n'
-                    ':%(bn)s-snat - [0:0]\n'
-                    '[0:0] -A PREROUTING -j %(bn)s-PREROUTING\n'
-                    '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
-                    '[0:0] -A POSTROUTING -j %(bn)s-POSTROUTING\n'
-                    '[0:0] -A POSTROUTING -j neutron-postrouting-bottom\n'
-                    '[0:0] -A neutron-postrouting-bottom -j %(bn)s-snat\n'
-                    '[0:0] -A %(bn)s-snat -j %(bn)s-float-snat\n'
-                    'COMMIT\n'
-                    '# Completed by iptables_manager\n'
-                    % IPTABLES_ARG)
-
         nat_dump_mod = ('# Generated by iptables_manager\n'
                         '*nat\n'
                         ':neutron-postrouting-bottom - [0:0]\n'
@@ -482,11 +441,16 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                        process_input=nat_dump_mod + FILTER_DUMP,
                        root_helper=self.root_helper),
              None),
-            (mock.call(['iptables-save', '-c'],
-                       root_helper=self.root_helper),
-             ''),
-            (mock.call(['iptables-restore', '-c'],
-                       process_input=nat_dump + FILTER_DUMP,
+            (mock.call(['iptables-restore', '-n'],
+                       process_input=(
+                           '# Generated by iptables_manager\n'
+                           '*nat\n'
+                           ':%(bn)s-PREROUTING - [0:0]\n'
+                           ':%(bn)s-nat - [0:0]\n'
+                           '-X %(bn)s-nat\n'
+                           'COMMIT\n'
+                           '# Completed by iptables_manager\n'
+                           % IPTABLES_ARG),
                        root_helper=self.root_helper),
              None),
         ]
@@ -514,6 +478,94 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
+    def test_apply_without_changes_is_skipped(self):
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.apply()
+
+        self.assertFalse(self.execute.called)
+
+    def test_incremental_apply_only_rewrites_changed_chains(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        # Removing and adding back the same rule leaves INPUT unchanged
+        self.iptables.ipv4['filter'].remove_rule('INPUT', '-j $filter')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-s 10.0.0.2 -j '
+                                              'ACCEPT', top=True)
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '-n'],
+            process_input=('# Generated by iptables_manager\n'
+                           '*filter\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-A %(bn)s-filter -s 10.0.0.2 -j ACCEPT\n'
+                           '-A %(bn)s-filter -j DROP\n'
+                           'COMMIT\n'
+                           '# Completed by iptables_manager\n'
+                           % IPTABLES_ARG),
+            root_helper=self.root_helper)
+
+    def test_incremental_apply_in_namespace(self):
+        self.iptables.namespace = 'qrouter'
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.ipv4['nat'].add_rule('float-snat', '-j ACCEPT')
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'qrouter', 'iptables-restore', '-n'],
+            process_input=('# Generated by iptables_manager\n'
+                           '*nat\n'
+                           ':%(bn)s-float-snat - [0:0]\n'
+                           '-A %(bn)s-float-snat -j ACCEPT\n'
+                           'COMMIT\n'
+                           '# Completed by iptables_manager\n'
+                           % IPTABLES_ARG),
+            root_helper=self.root_helper)
+
+    def test_unwrapped_change_forces_full_apply(self):
+        self.iptables.apply()
+        self.execute.reset_mock()
+        self.execute.return_value = ''
+
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+
+        self.assertEqual(
+            [mock.call(['iptables-save', '-c'],
+                       root_helper=self.root_helper),
+             mock.call(['iptables-restore', '-c'], process_input=mock.ANY,
+                       root_helper=self.root_helper)],
+            self.execute.call_args_list)
+
+    def test_failed_incremental_apply_falls_back_to_full_apply(self):
+        self.iptables.apply()
+        self.execute.reset_mock()
+        self.execute.side_effect = [RuntimeError(), '', None]
+
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP')
+        self.iptables.apply()
+
+        self.assertEqual(
+            [mock.call(['iptables-restore', '-n'], process_input=mock.ANY,
+                       root_helper=self.root_helper),
+             mock.call(['iptables-save', '-c'],
+                       root_helper=self.root_helper),
+             mock.call(['iptables-restore', '-c'], process_input=mock.ANY,
+                       root_helper=self.root_helper)],
+            self.execute.call_args_list)
+        self.assertFalse(self.iptables.ipv4['filter'].dirty)
+
     def test_add_rule_to_a_nonexistent_chain(self):
         self.assertRaises(LookupError, self.iptables.ipv4['filter'].add_rule,
                           'nonexistent', '-j DROP')
@@ -14,6 +14,7 @@
 #    under the License.
 
 import copy
+import datetime
 
 import mock
 from oslo.config import cfg
@@ -26,6 +27,8 @@ from neutron.common import config as base_config
 from neutron.common import constants as l3_constants
 from neutron.common import exceptions as n_exc
 from neutron.openstack.common import processutils
+from neutron.openstack.common.rpc import common as rpc_common
+from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
 
@@ -796,29 +799,192 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent._process_routers(routers)
         self.assertNotIn(routers[0]['id'], agent.router_info)
 
+    def _assert_router_update_queued(self, agent, router_id, action=None):
+        self.assertEqual(agent._queue.add.call_count, 1)
+        update = agent._queue.add.call_args[0][0]
+        self.assertEqual(update.id, router_id)
+        self.assertEqual(update.priority, l3_agent.PRIORITY_RPC)
+        self.assertEqual(update.action, action)
+
     def test_router_deleted(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
         agent.router_deleted(None, FAKE_ID)
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self._assert_router_update_queued(agent, FAKE_ID,
+                                          l3_agent.DELETE_ROUTER)
 
     def test_routers_updated(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
         agent.routers_updated(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self._assert_router_update_queued(agent, FAKE_ID)
 
     def test_removed_from_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
         agent.router_removed_from_agent(None, {'router_id': FAKE_ID})
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self._assert_router_update_queued(agent, FAKE_ID,
+                                          l3_agent.DELETE_ROUTER)
 
     def test_added_to_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
         agent.router_added_to_agent(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self._assert_router_update_queued(agent, FAKE_ID)
+
+    def test_process_router_update(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid(), 'admin_state_up': True,
+                  'external_gateway_info': {}}
+        self.conf.set_override('router_id', router['id'])
+        self.plugin_api.get_routers.return_value = [router]
+        with mock.patch.object(agent, 'process_router') as process_router:
+            agent.routers_updated(None, [router['id']])
+            agent._process_router_update()
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, [router['id']])
+        self.assertIn(router['id'], agent.router_info)
+        process_router.assert_called_once_with(
+            agent.router_info[router['id']])
+
+    def test_process_router_update_coalesces_updates(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid(), 'admin_state_up': True,
+                  'external_gateway_info': {}}
+        self.conf.set_override('router_id', router['id'])
+        self.plugin_api.get_routers.return_value = [router]
+        with mock.patch.object(agent, 'process_router') as process_router:
+            for i in range(3):
+                agent.routers_updated(None, [router['id']])
+            for i in range(3):
+                agent._process_router_update()
+        # The data fetched for the first update is newer than the other
+        # updates, which are skipped
+        self.assertEqual(self.plugin_api.get_routers.call_count, 1)
+        self.assertEqual(process_router.call_count, 1)
+
+    def test_process_router_update_router_gone(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_routers.return_value = []
+        with mock.patch.object(agent, '_router_removed') as router_removed:
+            agent.routers_updated(None, [FAKE_ID])
+            agent._process_router_update()
+        router_removed.assert_called_once_with(FAKE_ID)
+
+    def test_process_router_update_fetch_error(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        self.plugin_api.get_routers.side_effect = rpc_common.RPCException
+        with mock.patch.object(agent, '_process_routers') as process_routers:
+            agent.routers_updated(None, [_uuid()])
+            agent._process_router_update()
+        self.assertFalse(process_routers.called)
+        self.assertTrue(agent.fullsync)
+
+    def test_sync_routers_task_queues_routers_in_chunks(self):
+        self.conf.set_override('router_id', None)
+        self.conf.set_override('sync_routers_chunk_size', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        router_ids = [_uuid() for i in range(3)]
+        self.plugin_api.get_router_ids.return_value = router_ids
+        self.plugin_api.get_routers.side_effect = (
+            lambda context, ids: [{'id': id} for id in ids])
+        stale_router_id = _uuid()
+        agent.router_info[stale_router_id] = mock.Mock()
+
+        agent._sync_routers_task(agent.context)
+
+        self.plugin_api.get_routers.assert_has_calls([
+            mock.call(agent.context, router_ids[:2]),
+            mock.call(agent.context, router_ids[2:])])
+        updates = [c[0][0] for c in agent._queue.add.call_args_list]
+        self.assertEqual([u.id for u in updates],
+                         router_ids + [stale_router_id])
+        for update in updates:
+            self.assertEqual(update.priority,
+                             l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        self.assertEqual(updates[-1].action, l3_agent.DELETE_ROUTER)
+        self.assertFalse(agent.fullsync)
+
+    def test_sync_routers_task_fetches_changed_routers(self):
+        self.conf.set_override('router_id', None)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        router_ids = [_uuid(), _uuid()]
+        agent.router_info[router_ids[0]] = mock.Mock(revision=3)
+        self.plugin_api.get_router_ids.return_value = router_ids
+        self.plugin_api.get_routers.return_value = [{'id': router_ids[1]}]
+
+        agent._sync_routers_task(agent.context)
+
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, router_ids, {router_ids[0]: 3})
+        # The unchanged router is neither processed nor removed
+        updates = [c[0][0] for c in agent._queue.add.call_args_list]
+        self.assertEqual([router_ids[1]], [u.id for u in updates])
+        self.assertIsNone(updates[0].action)
+
+    def test_sync_routers_task_without_revisions_support(self):
+        self.conf.set_override('router_id', None)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        agent.router_info[FAKE_ID] = mock.Mock(revision=3)
+        self.plugin_api.get_router_ids.return_value = [FAKE_ID]
+
+        def get_routers(context, router_ids, revisions=None):
+            if revisions is not None:
+                raise rpc_common.RemoteError('UnsupportedRpcVersion')
+            return [{'id': FAKE_ID}]
+        self.plugin_api.get_routers.side_effect = get_routers
+
+        agent._sync_routers_task(agent.context)
+
+        self.plugin_api.get_routers.assert_called_with(agent.context,
+                                                       [FAKE_ID])
+        self.assertEqual(agent._queue.add.call_count, 1)
+        self.assertFalse(agent.sync_revisions_supported)
+        self.assertFalse(agent.fullsync)
+
+    def test_process_routers_records_revision(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid(),
+                  'admin_state_up': True,
+                  'external_gateway_info': {},
+                  'routes': [],
+                  'revision': 5}
+        with mock.patch.object(agent, 'process_router') as process_router:
+            agent._process_routers([router])
+            self.assertEqual(5, agent.router_info[router['id']].revision)
+            process_router.side_effect = RuntimeError
+            router['revision'] = 6
+            self.assertRaises(RuntimeError, agent._process_routers, [router])
+        # The router is fetched again on the next resync
+        self.assertIsNone(agent.router_info[router['id']].revision)
+
+    def test_sync_routers_task_without_router_ids_support(self):
+        self.conf.set_override('router_id', None)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        self.plugin_api.get_router_ids.side_effect = (
+            rpc_common.UnsupportedRpcVersion(version='1.2'))
+        self.plugin_api.get_routers.return_value = [{'id': FAKE_ID}]
+
+        agent._sync_routers_task(agent.context)
+
+        self.plugin_api.get_routers.assert_called_once_with(agent.context)
+        self.assertEqual(agent._queue.add.call_count, 1)
+        self.assertFalse(agent.fullsync)
+
+    def test_sync_routers_task_rpc_error(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        self.plugin_api.get_routers.side_effect = rpc_common.RPCException
+
+        agent._sync_routers_task(agent.context)
+
+        self.assertFalse(agent._queue.add.called)
+        self.assertTrue(agent.fullsync)
 
     def test_process_router_delete(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -835,8 +1001,8 @@ class TestBasicRouterOperations(base.BaseTestCase):
             'gw_port': ex_gw_port}
         agent._router_added(router['id'], router)
         agent.router_deleted(None, router['id'])
-        agent._process_router_delete()
-        self.assertFalse(list(agent.removed_routers))
+        agent._process_router_update()
+        self.assertNotIn(router['id'], agent.router_info)
 
     def test_destroy_router_namespace_skips_ns_removal(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -1051,7 +1217,7 @@ class TestBasicRouterOperations(base.BaseTestCase):
         pm.reset_mock()
 
         agent._destroy_router_namespace = mock.MagicMock()
-        agent._cleanup_namespaces(router_list)
+        agent._cleanup_namespaces([r['id'] for r in router_list])
 
         self.assertEqual(pm.disable.call_count, len(stale_namespace_list))
         self.assertEqual(agent._destroy_router_namespace.call_count,
@@ -1095,6 +1261,69 @@ class TestBasicRouterOperations(base.BaseTestCase):
                                      other_namespaces)
 
 
+class TestRouterProcessingQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterProcessingQueue, self).setUp()
+        self.queue = l3_agent.RouterProcessingQueue()
+
+    def test_rpc_updates_before_sync_updates(self):
+        now = timeutils.utcnow()
+        sync_update = l3_agent.RouterUpdate(
+            _uuid(), l3_agent.PRIORITY_SYNC_ROUTERS_TASK, timestamp=now)
+        rpc_update = l3_agent.RouterUpdate(
+            _uuid(), l3_agent.PRIORITY_RPC,
+            timestamp=now + datetime.timedelta(seconds=1))
+        self.queue.add(sync_update)
+        self.queue.add(rpc_update)
+        updates = [u for rp, u in self.queue.each_update_to_next_router()]
+        self.assertEqual(updates, [rpc_update])
+        updates = [u for rp, u in self.queue.each_update_to_next_router()]
+        self.assertEqual(updates, [sync_update])
+
+    def test_oldest_update_first(self):
+        now = timeutils.utcnow()
+        updates = [l3_agent.RouterUpdate(
+            _uuid(), l3_agent.PRIORITY_RPC,
+            timestamp=now - datetime.timedelta(seconds=i))
+            for i in range(3)]
+        for update in updates:
+            self.queue.add(update)
+        processed = []
+        for i in range(3):
+            processed.extend(
+                u for rp, u in self.queue.each_update_to_next_router())
+        self.assertEqual(processed, list(reversed(updates)))
+
+    def test_updates_handed_over_to_master(self):
+        router_id = _uuid()
+        master_update = l3_agent.RouterUpdate(router_id,
+                                              l3_agent.PRIORITY_RPC)
+        other_update = l3_agent.RouterUpdate(router_id,
+                                             l3_agent.PRIORITY_RPC)
+        self.queue.add(master_update)
+        processed = []
+        for rp, update in self.queue.each_update_to_next_router():
+            processed.append(update)
+            if update is master_update:
+                # Another worker gets an update while the router is
+                # being processed
+                self.queue.add(other_update)
+                self.assertEqual(
+                    [], list(self.queue.each_update_to_next_router()))
+        self.assertEqual(processed, [master_update, other_update])
+
+    def test_outdated_updates_skipped(self):
+        router_id = _uuid()
+        update = l3_agent.RouterUpdate(router_id, l3_agent.PRIORITY_RPC)
+        self.queue.add(update)
+        for rp, u in self.queue.each_update_to_next_router():
+            rp.fetched_and_processed(
+                update.timestamp + datetime.timedelta(seconds=1))
+        self.queue.add(update)
+        self.assertEqual([], list(self.queue.each_update_to_next_router()))
+
+
 class TestL3AgentEventHandler(base.BaseTestCase):
 
     def setUp(self):
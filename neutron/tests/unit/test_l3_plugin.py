@@ -1649,6 +1649,50 @@ class L3AgentDbTestCaseBase(L3NatTestCaseMixin):
             self.assertIsNotNone(floatingips[0]['fixed_ip_address'])
             self.assertIsNotNone(floatingips[0]['router_id'])
 
+    def test_l3_agent_routers_query_revision(self):
+        with self.router() as r:
+            router_id = r['router']['id']
+            ctx = context.get_admin_context()
+            routers = self.plugin.get_sync_data(ctx, [router_id])
+            revision = routers[0]['revision']
+            with self.port(no_delete=True) as p:
+                self._router_interface_action('add', router_id, None,
+                                              p['port']['id'])
+                routers = self.plugin.get_sync_data(ctx, [router_id])
+                self.assertEqual(revision + 1, routers[0]['revision'])
+                self._router_interface_action('remove', router_id, None,
+                                              p['port']['id'])
+            self.assertEqual({router_id: revision + 2},
+                             self.plugin.get_router_revisions(ctx,
+                                                              [router_id]))
+
+    def test_floatingip_bumps_router_revision(self):
+        with self.floatingip_with_assoc() as fip:
+            router_id = fip['floatingip']['router_id']
+            ctx = context.get_admin_context()
+            revision = self.plugin.get_router_revisions(
+                ctx, [router_id])[router_id]
+            self._update('floatingips', fip['floatingip']['id'],
+                         {'floatingip': {'port_id': None}})
+            self.assertEqual(
+                {router_id: revision + 1},
+                self.plugin.get_router_revisions(ctx, [router_id]))
+
+    def test_get_changed_router_ids(self):
+        with contextlib.nested(self.router(), self.router()) as (r1, r2):
+            ctx = context.get_admin_context()
+            router_ids = [r1['router']['id'], r2['router']['id']]
+            revisions = self.plugin.get_router_revisions(ctx, router_ids)
+            self.assertEqual(
+                [], self.plugin.get_changed_router_ids(ctx, router_ids,
+                                                       revisions))
+            revisions[router_ids[0]] -= 1
+            del revisions[router_ids[1]]
+            self.assertEqual(
+                router_ids, self.plugin.get_changed_router_ids(ctx,
+                                                               router_ids,
+                                                               revisions))
+
     def _test_notify_op_agent(self, target_func, *args):
         l3_rpc_agent_api_str = (
             'neutron.api.rpc.agentnotifiers.l3_rpc_agent_api.L3AgentNotifyAPI')
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 
 import mock
@@ -408,6 +409,8 @@ class TestBase(base.BaseTestCase):
         self.execute_p = mock.patch('neutron.agent.linux.utils.execute')
         self.safe = self.replace_p.start()
         self.execute = self.execute_p.start()
+        mock.patch.dict(dhcp.DhcpLocalProcess._conf_files, clear=True).start()
+        mock.patch.dict(dhcp.Dnsmasq._host_leases, clear=True).start()
 
 
 class TestDhcpBase(TestBase):
@@ -1062,6 +1065,66 @@ tag:tag1,249,%s,%s""".lstrip() % (fake_v6,
                                         mock.call(exp_opt_name, exp_opt_data)])
             mock_open.assert_called_once_with('/proc/5/cmdline', 'r')
 
+    def _reload_allocations(self, dm):
+        with contextlib.nested(
+            mock.patch('os.path.isdir', return_value=True),
+            mock.patch('os.path.exists', return_value=True),
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid'),
+            mock.patch.object(dhcp.Dnsmasq, '_make_subnet_interface_ip_map',
+                              return_value={}),
+            mock.patch.object(dhcp.Dnsmasq, '_read_hosts_file_leases',
+                              return_value=set())
+        ) as (isdir, exists, active, pid, ip_map, read_leases):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            dm.reload_allocations()
+
+    def test_reload_allocations_unchanged(self):
+        network = FakeDualNetwork()
+        self._reload_allocations(dhcp.Dnsmasq(self.conf, network,
+                                              version=float(2.59)))
+        self.assertEqual(self.safe.call_count, 2)
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+        dm = dhcp.Dnsmasq(self.conf, network, version=float(2.59))
+        dm._read_hosts_file_leases = mock.Mock()
+        self._reload_allocations(dm)
+        self.assertFalse(self.safe.called)
+        self.assertFalse(self.execute.called)
+        # the leases are taken from the entries last written
+        self.assertFalse(dm._read_hosts_file_leases.called)
+
+    def test_reload_allocations_port_removed(self):
+        network = FakeDualNetwork()
+        self._reload_allocations(dhcp.Dnsmasq(self.conf, network,
+                                              version=float(2.59)))
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+
+        network.ports = network.ports[1:]
+        self._reload_allocations(dhcp.Dnsmasq(self.conf, network,
+                                              version=float(2.59)))
+        exp_host_name = '/dhcp/cccccccc-cccc-cccc-cccc-cccccccccccc/host'
+        self.safe.assert_called_once_with(exp_host_name, mock.ANY)
+        self.execute.assert_has_calls([
+            mock.call(['ip', 'netns', 'exec', 'qdhcp-ns', 'dhcp_release',
+                       mock.ANY, '192.168.0.2', '00:00:80:aa:bb:cc'],
+                      root_helper='sudo', check_exit_code=True),
+            mock.call(['kill', '-HUP', 5], 'sudo')], any_order=True)
+
+    def test_remove_config_files_clears_cache(self):
+        network = FakeDualNetwork()
+        self._reload_allocations(dhcp.Dnsmasq(self.conf, network,
+                                              version=float(2.59)))
+        dm = dhcp.Dnsmasq(self.conf, network, version=float(2.59))
+        with mock.patch('shutil.rmtree'):
+            dm._remove_config_files()
+        self.assertNotIn(network.id, dhcp.DhcpLocalProcess._conf_files)
+        self.assertNotIn(network.id, dhcp.Dnsmasq._host_leases)
+
     def test_release_unused_leases(self):
         dnsmasq = dhcp.Dnsmasq(self.conf, FakeDualNetwork())
 
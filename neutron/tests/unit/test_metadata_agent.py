@@ -25,6 +25,7 @@ import webob
 from neutron.agent.metadata import agent
 from neutron.common import constants
 from neutron.common import utils
+from neutron.openstack.common import timeutils
 from neutron.tests import base
 
 
@@ -41,6 +42,60 @@ class FakeConf(object):
     nova_metadata_ip = '9.9.9.9'
     nova_metadata_port = 8775
     metadata_proxy_shared_secret = 'secret'
+    metadata_cache_ttl = 0
+    metadata_cache_size = 10
+    nova_metadata_pool_size = 2
+
+
+class FakeCachedConf(FakeConf):
+    metadata_cache_ttl = 5
+
+
+class TestInstanceCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestInstanceCache, self).setUp()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.cache = agent.InstanceCache(ttl=5, size=2)
+
+    def test_get(self):
+        self.cache.set('a', ('instance', 'tenant'))
+        self.assertEqual(self.cache.get('a'), ('instance', 'tenant'))
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_get_expired(self):
+        self.cache.set('a', ('instance', 'tenant'))
+        timeutils.advance_time_seconds(5)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_set_evicts_oldest(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_set_replaced_entry_not_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.set('a', 3)
+        self.cache.set('c', 4)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 3)
+        self.assertEqual(self.cache.get('c'), 4)
+
+    def test_set_invalidated_entries_not_kept(self):
+        for i in range(10):
+            self.cache.set('a', i)
+            self.cache.invalidate('a')
+        self.assertTrue(len(self.cache._order) <= 4)
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.invalidate('a')
+        self.cache.invalidate('b')
+        self.assertIsNone(self.cache.get('a'))
 
 
 class TestMetadataProxyHandler(base.BaseTestCase):
@@ -195,6 +250,42 @@ class TestMetadataProxyHandler(base.BaseTestCase):
             (None, None)
         )
 
+    def test_cache_disabled_by_zero_size(self):
+        class FakeZeroSizeConf(FakeCachedConf):
+            metadata_cache_size = 0
+
+        handler = agent.MetadataProxyHandler(FakeZeroSizeConf)
+        self.assertIsNone(handler.instance_cache)
+
+    def _get_instance_and_tenant_id_cached(self, ports):
+        handler = agent.MetadataProxyHandler(FakeCachedConf)
+        headers = {'X-Forwarded-For': '192.168.1.1',
+                   'X-Neutron-Network-ID': 'the_id'}
+        req = mock.Mock(headers=headers)
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.return_value = {'ports': ports}
+        ids = [handler._get_instance_and_tenant_id(req) for i in range(2)]
+        return handler, req, ids
+
+    def test_get_instance_id_cached(self):
+        ports = [{'device_id': 'device_id', 'tenant_id': 'tenant_id'}]
+        handler, req, ids = self._get_instance_and_tenant_id_cached(ports)
+        self.assertEqual(ids, [('device_id', 'tenant_id')] * 2)
+        self.assertEqual(self.qclient.return_value.list_ports.call_count, 1)
+
+    def test_get_instance_id_no_match_not_cached(self):
+        handler, req, ids = self._get_instance_and_tenant_id_cached([])
+        self.assertEqual(ids, [(None, None)] * 2)
+        self.assertEqual(self.qclient.return_value.list_ports.call_count, 2)
+
+    def test_call_not_found_invalidates_cache(self):
+        ports = [{'device_id': 'device_id', 'tenant_id': 'tenant_id'}]
+        handler, req, ids = self._get_instance_and_tenant_id_cached(ports)
+        with mock.patch.object(handler, '_proxy_request') as proxy:
+            proxy.return_value = webob.exc.HTTPNotFound()
+            handler(req)
+        self.assertIsNone(handler.instance_cache.get(handler._cache_key(req)))
+
     def _proxy_request_test_helper(self, response_code=200, method='GET'):
         hdrs = {'X-Forwarded-For': '8.8.8.8'}
         body = 'body'
@@ -257,6 +348,17 @@ class TestMetadataProxyHandler(base.BaseTestCase):
         with testtools.ExpectedException(Exception):
             self._proxy_request_test_helper(302)
 
+    def test_proxy_request_reuses_connection(self):
+        req = mock.Mock(path_info='/the_path', query_string='',
+                        headers={'X-Forwarded-For': '8.8.8.8'})
+        with mock.patch('httplib2.Http') as mock_http:
+            resp = mock.MagicMock(status=200)
+            mock_http.return_value.request.return_value = (resp, 'content')
+            self.handler._proxy_request('the_id', 'tenant_id', req)
+            self.handler._proxy_request('the_id', 'tenant_id', req)
+        self.assertEqual(mock_http.call_count, 1)
+        self.assertEqual(mock_http.return_value.request.call_count, 2)
+
     def test_sign_instance_id(self):
         self.assertEqual(
             self.handler._sign_instance_id('foo'),
@@ -135,3 +135,15 @@ class TestNeutronContext(base.BaseTestCase):
         ctx_admin = context.get_admin_context()
         self.assertEqual(req_id_before, local.store.context.request_id)
         self.assertNotEqual(req_id_before, ctx_admin.request_id)
+
+    def test_neutron_context_read_only_copy(self):
+        ctx = context.Context('user_id', 'tenant_id')
+        ctx_read_only = ctx.read_only_copy()
+        self.assertEqual(ctx.request_id, ctx_read_only.request_id)
+        self.assertFalse(ctx.read_only)
+        self.assertTrue(ctx_read_only.read_only)
+        ctx.session
+        self.db_api_session.assert_called_once_with(read_only=False)
+        self.db_api_session.reset_mock()
+        ctx_read_only.session
+        self.db_api_session.assert_called_once_with(read_only=True)
@@ -548,3 +548,83 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             {'extension:provider_network:set': 'rule:admin_only'},
             dict((policy, 'rule:admin_only') for policy in
                  expected_policies))
+
+    def _set_rules_once(self):
+        # Keep the same rules for the whole test, as when the policy file
+        # does not change between checks
+        common_policy.set_rules(common_policy.Rules(self.rules))
+        init_patcher = mock.patch.object(neutron.policy, 'init')
+        init_patcher.start()
+        self.addCleanup(init_patcher.stop)
+
+    def test_check_results_are_cached_per_context(self):
+        self._set_rules_once()
+        targets = [{'tenant_id': 'fake', 'shared': False},
+                   {'tenant_id': 'somebody_else', 'shared': False},
+                   {'tenant_id': 'fake', 'shared': False},
+                   {'tenant_id': 'somebody_else', 'shared': False}]
+        with mock.patch.object(common_policy, 'check',
+                               wraps=common_policy.check) as check:
+            results = [policy.check(self.context, 'get_network', target)
+                       for target in targets]
+        self.assertEqual([True, False, True, False], results)
+        self.assertEqual(2, check.call_count)
+
+    def test_check_results_are_not_shared_between_contexts(self):
+        self._set_rules_once()
+        target = {'tenant_id': 'fake', 'shared': False}
+        self.assertTrue(policy.check(self.context, 'get_network', target))
+        other_context = context.Context('other', 'other', roles=['user'])
+        self.assertFalse(policy.check(other_context, 'get_network', target))
+
+    def test_check_results_are_dropped_on_rules_reload(self):
+        self._set_rules_once()
+        target = {'tenant_id': 'somebody_else', 'shared': False}
+        self.assertFalse(policy.check(self.context, 'get_network', target))
+        self.rules['get_network'] = common_policy.parse_rule('@')
+        common_policy.set_rules(common_policy.Rules(self.rules))
+        self.assertTrue(policy.check(self.context, 'get_network', target))
+
+    def test_check_with_parent_resource_owner(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            'rule:admin_or_network_owner')
+        self._set_rules_once()
+        networks = {'net1': {'tenant_id': 'fake'},
+                    'net2': {'tenant_id': 'somebody_else'}}
+        plugin = manager.NeutronManager.get_instance().plugin
+        with mock.patch.object(plugin, 'get_network',
+                               side_effect=lambda ctx, id, fields:
+                               networks[id]):
+            results = [policy.check(self.context, 'get_port',
+                                    {'network_id': net, 'tenant_id': 'x'})
+                       for net in ('net1', 'net2', 'net1')]
+        self.assertEqual([True, False, True], results)
+
+    def test_check_admin_context_short_circuits(self):
+        self.rules['get_network'] = common_policy.parse_rule('!')
+        self._set_rules_once()
+        admin_context = context.get_admin_context()
+        with mock.patch.object(common_policy, 'check') as check:
+            self.assertTrue(policy.check(admin_context, 'get_network', {}))
+        self.assertFalse(check.called)
+
+    def test_check_with_http_rule_is_not_cached(self):
+        self.rules['get_network'] = common_policy.parse_rule(
+            'http://www.example.com')
+        self._set_rules_once()
+        with mock.patch.object(common_policy, 'check',
+                               return_value=True) as check:
+            for i in range(2):
+                policy.check(self.context, 'get_network', {})
+        self.assertEqual(2, check.call_count)
+
+    def test_match_rule_is_built_once(self):
+        self._set_rules_once()
+        target = {'tenant_id': 'fake', 'attr': {'sub_attr_1': 'x'}}
+        rule = policy._get_match_rule('create_something', target)
+        self.assertIs(rule, policy._get_match_rule(
+            'create_something', {'tenant_id': 'other',
+                                 'attr': {'sub_attr_1': 'y'}}))
+        self.assertIsNot(rule, policy._get_match_rule(
+            'create_something', {'tenant_id': 'fake',
+                                 'attr': {'sub_attr_2': 'x'}}))
@@ -28,7 +28,9 @@ from neutron.common import config
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import api as db
+from neutron.db import models_v2
 from neutron.db import quota_db
+from neutron.openstack.common import timeutils
 from neutron import quota
 from neutron.tests import base
 from neutron.tests.unit import test_api_v2
@@ -407,6 +409,139 @@ class TestDbQuotaDriver(base.BaseTestCase):
                                                       target_tenant)
 
 
+class TestDbQuotaDriverUsageTracking(base.BaseTestCase):
+    """Test the usage tracking and reservations of DbQuotaDriver."""
+
+    def setUp(self):
+        super(TestDbQuotaDriverUsageTracking, self).setUp()
+        cfg.CONF.set_override('quota_network', 3, group='QUOTAS')
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.driver = quota_db.DbQuotaDriver()
+        self.ctx = context.get_admin_context()
+        self.count = mock.Mock(return_value=0)
+        self.resources = {'network': quota.CountableResource(
+            'network', self.count, 'quota_network')}
+        self.plugin = mock.Mock()
+
+    def _reserve(self, tenant_id='foo', delta=1):
+        return self.driver.make_reservation(self.ctx, tenant_id,
+                                            self.resources,
+                                            {'network': delta}, self.plugin)
+
+    def _get_usage(self, tenant_id='foo'):
+        return self.ctx.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource='network').one()
+
+    def _add_network(self, tenant_id='foo'):
+        with self.ctx.session.begin():
+            network = models_v2.Network(tenant_id=tenant_id, name='net',
+                                        status='ACTIVE',
+                                        admin_state_up=True, shared=False)
+            self.ctx.session.add(network)
+        return network
+
+    def test_is_tracked(self):
+        self.assertTrue(self.driver.is_tracked('network'))
+        self.assertFalse(self.driver.is_tracked('extra1'))
+        cfg.CONF.set_override('track_quota_usage', False, group='QUOTAS')
+        self.assertFalse(self.driver.is_tracked('network'))
+
+    def test_usage_counted_once(self):
+        self.count.return_value = 1
+        self.driver.commit_reservations(self.ctx, self._reserve())
+        self.driver.commit_reservations(self.ctx, self._reserve())
+        self.count.assert_called_once_with(self.ctx, self.plugin,
+                                           'networks', 'foo')
+        self.assertEqual(1, self._get_usage().in_use)
+
+    def test_reservation_over_quota(self):
+        self.count.return_value = 2
+        self.assertRaises(exceptions.OverQuota, self._reserve, delta=2)
+        self.assertEqual(1, len(self._reserve()))
+
+    def test_pending_reservations_held(self):
+        reservations = self._reserve(delta=3)
+        self.assertRaises(exceptions.OverQuota, self._reserve)
+        self.driver.cancel_reservations(self.ctx, reservations)
+        self._reserve()
+
+    def test_expired_reservations_released(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self._reserve(delta=3)
+        timeutils.advance_time_seconds(
+            cfg.CONF.QUOTAS.reservation_expiration)
+        self._reserve(delta=3)
+        self.assertEqual(
+            1, self.ctx.session.query(quota_db.QuotaReservation).count())
+
+    def test_unlimited_resource_not_reserved(self):
+        cfg.CONF.set_override('quota_network', -1, group='QUOTAS')
+        self.assertEqual([], self._reserve(delta=100))
+        self.assertFalse(self.count.called)
+
+    def test_usage_follows_create_and_delete(self):
+        self._reserve()
+        network = self._add_network()
+        self._add_network(tenant_id='bar')
+        self.assertEqual(1, self._get_usage().in_use)
+        with self.ctx.session.begin():
+            self.ctx.session.delete(network)
+        self.assertEqual(0, self._get_usage().in_use)
+
+    def test_bulk_delete_marks_usage_dirty(self):
+        self._reserve()
+        self._add_network()
+        with self.ctx.session.begin():
+            self.ctx.session.query(models_v2.Network).filter_by(
+                tenant_id='foo').delete()
+        self.assertTrue(self._get_usage().dirty)
+        self.count.reset_mock()
+        self._reserve()
+        self.assertEqual(1, self.count.call_count)
+        self.assertFalse(self._get_usage().dirty)
+
+    def test_bulk_delete_marks_only_tenant_usage_dirty(self):
+        self._reserve()
+        self._reserve(tenant_id='bar')
+        self._add_network()
+        with self.ctx.session.begin():
+            self.ctx.session.query(models_v2.Network).filter_by(
+                tenant_id='foo', shared=False).delete()
+        self.assertTrue(self._get_usage().dirty)
+        self.assertFalse(self._get_usage(tenant_id='bar').dirty)
+
+    def test_bulk_delete_without_tenant_marks_all_usages_dirty(self):
+        self._reserve()
+        self._reserve(tenant_id='bar')
+        network = self._add_network()
+        with self.ctx.session.begin():
+            self.ctx.session.query(models_v2.Network).filter_by(
+                id=network.id).delete()
+        self.assertTrue(self._get_usage().dirty)
+        self.assertTrue(self._get_usage(tenant_id='bar').dirty)
+
+    def test_stale_usage_counted_again(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self._reserve()
+        self.count.reset_mock()
+        self._reserve()
+        self.assertFalse(self.count.called)
+        timeutils.advance_time_seconds(
+            cfg.CONF.QUOTAS.quota_usage_max_age + 1)
+        self._reserve()
+        self.assertEqual(1, self.count.call_count)
+
+    def test_mark_usages_dirty(self):
+        self._reserve()
+        self._reserve(tenant_id='bar')
+        self.driver.mark_usages_dirty(self.ctx, tenant_id='foo')
+        self.assertTrue(self._get_usage().dirty)
+        self.assertFalse(self._get_usage(tenant_id='bar').dirty)
+
+
 class TestQuotaDriverLoad(base.BaseTestCase):
     def setUp(self):
         super(TestQuotaDriverLoad, self).setUp()
@@ -34,6 +34,7 @@ from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.manager import NeutronManager
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.tests import base
 from neutron.tests.unit import test_extension_security_group as test_sg
@@ -286,6 +287,123 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_info_for_devices_ipv4_source_group(self):
+
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', const.PROTO_NAME_TCP, '24',
+                    '25', remote_group_id=sg2['security_group']['id'])
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id,
+                                     sg2_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                # RPC 1.3 returns the rules of each port
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                port_rpc = sg_info['devices'][port_id1]
+                expected = [{'direction': 'egress', 'ethertype': const.IPv4,
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': const.IPv6,
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': const.IPv4,
+                             'security_group_id': sg2_id},
+                            {'direction': 'egress', 'ethertype': const.IPv6,
+                             'security_group_id': sg2_id},
+                            {'direction': u'ingress',
+                             'protocol': const.PROTO_NAME_TCP,
+                             'ethertype': const.IPv4,
+                             'port_range_max': 25, 'port_range_min': 24,
+                             'remote_group_id': sg2_id,
+                             'security_group_id': sg1_id},
+                            ]
+                self.assertEqual(port_rpc['security_group_rules'],
+                                 expected)
+                self.assertNotIn('security_groups', sg_info)
+                member_ips_v1 = sg_info['sg_member_ips']
+
+                sg_info = self.rpc.security_group_info_for_devices_v2(
+                    ctx, devices=devices)
+                port_rpc = sg_info['devices'][port_id1]
+                # the rules are returned by security group, not by port
+                self.assertEqual(port_rpc['security_group_rules'], [])
+                self.assertEqual(port_rpc['security_group_source_groups'],
+                                 [sg2_id])
+                expected = {
+                    sg1_id: [{'direction': 'egress',
+                              'ethertype': const.IPv4,
+                              'security_group_id': sg1_id},
+                             {'direction': 'egress',
+                              'ethertype': const.IPv6,
+                              'security_group_id': sg1_id},
+                             {'direction': u'ingress',
+                              'protocol': const.PROTO_NAME_TCP,
+                              'ethertype': const.IPv4,
+                              'port_range_max': 25, 'port_range_min': 24,
+                              'remote_group_id': sg2_id,
+                              'security_group_id': sg1_id}],
+                    sg2_id: [{'direction': 'egress',
+                              'ethertype': const.IPv4,
+                              'security_group_id': sg2_id},
+                             {'direction': 'egress',
+                              'ethertype': const.IPv6,
+                              'security_group_id': sg2_id}]}
+                key = lambda rule: (rule['direction'], rule['ethertype'])
+                self.assertEqual(sorted(sg_info['security_groups']),
+                                 sorted(expected))
+                for sg_id, rules in expected.items():
+                    self.assertEqual(
+                        sorted(sg_info['security_groups'][sg_id], key=key),
+                        rules)
+                self.assertEqual(sg_info['sg_member_ips'].keys(), [sg2_id])
+                self.assertEqual(sg_info['sg_member_ips'], member_ips_v1)
+                member_ips = sg_info['sg_member_ips'][sg2_id]
+                self.assertEqual(sorted(member_ips[const.IPv4]),
+                                 ['10.0.0.2/32', '10.0.0.3/32'])
+                self.assertEqual(member_ips[const.IPv6], [])
+                self.assertEqual(
+                    self.rpc.security_group_member_ips(
+                        ctx, security_groups=[sg2_id]),
+                    sg_info['sg_member_ips'])
+
+                sg1_info = self.rpc.security_group_info_for_groups(
+                    ctx, security_groups=[sg1_id])
+                self.assertEqual(sorted(sg1_info),
+                                 ['security_groups', 'sg_member_ips'])
+                self.assertEqual(sg1_info['security_groups'].keys(),
+                                 [sg1_id])
+                self.assertEqual(
+                    sorted(sg1_info['security_groups'][sg1_id], key=key),
+                    expected[sg1_id])
+                self.assertEqual(sg1_info['sg_member_ips'],
+                                 sg_info['sg_member_ips'])
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX[const.IPv6]
         with self.network() as n:
@@ -593,6 +711,189 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall.assert_has_calls([])
 
 
+class SecurityGroupAgentEnhancedRpcTestCase(base.BaseTestCase):
+    def setUp(self, defer_refresh_firewall=False):
+        super(SecurityGroupAgentEnhancedRpcTestCase, self).setUp()
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.agent.root_helper = 'sudo'
+        self.agent.init_firewall(defer_refresh_firewall=defer_refresh_firewall)
+        self.firewall = mock.Mock()
+        firewall_object = firewall_base.FirewallDriver()
+        self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.agent.firewall = self.firewall
+        self.agent.use_enhanced_rpc = True
+        rpc = mock.Mock()
+        self.agent.plugin_rpc = rpc
+        self.fake_device = {'device': 'fake_device',
+                            'security_groups': ['fake_sgid1', 'fake_sgid2'],
+                            'security_group_source_groups': ['fake_sgid2'],
+                            'security_group_rules': []}
+        fake_devices = {'fake_device': self.fake_device}
+        self.firewall.ports = fake_devices
+        self.sg_rules = {'fake_sgid1': [{'security_group_id': 'fake_sgid1',
+                                         'remote_group_id': 'fake_sgid2'}],
+                         'fake_sgid2': []}
+        self.sg_members = {'fake_sgid2': {const.IPv4: ['10.0.0.2/32'],
+                                          const.IPv6: []}}
+        self.firewall.sg_rules = self.sg_rules
+        self.firewall.sg_members = self.sg_members
+        rpc.security_group_info_for_devices_v2.return_value = {
+            'devices': fake_devices,
+            'security_groups': self.sg_rules,
+            'sg_member_ips': self.sg_members}
+        rpc.security_group_info_for_groups.return_value = {
+            'security_groups': {'fake_sgid1': self.sg_rules['fake_sgid1']},
+            'sg_member_ips': self.sg_members}
+        rpc.security_group_member_ips.return_value = self.sg_members
+
+    def test_init_firewall_with_ipset(self):
+        cfg.CONF.set_override('firewall_driver', FIREWALL_IPTABLES_DRIVER,
+                              group='SECURITYGROUP')
+        with mock.patch(FIREWALL_IPTABLES_DRIVER) as driver:
+            driver.return_value.enable_ipset = True
+            self.agent.init_firewall()
+        self.assertTrue(self.agent.use_enhanced_rpc)
+
+    def test_init_firewall_without_ipset(self):
+        self.agent.init_firewall()
+        self.assertFalse(self.agent.use_enhanced_rpc)
+
+    def test_prepare_devices_filter(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.plugin_rpc.security_group_info_for_devices_v2.\
+            assert_called_once_with(None, ['fake_device'])
+        self.firewall.update_security_group_rules.assert_has_calls(
+            [call('fake_sgid1', self.sg_rules['fake_sgid1']),
+             call('fake_sgid2', [])], any_order=True)
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.sg_members['fake_sgid2'])
+        self.firewall.prepare_port_filter.assert_called_once_with(
+            self.fake_device)
+
+    def test_prepare_devices_filter_unsupported_by_server(self):
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices_v2.side_effect = (
+            rpc_common.RemoteError('UnsupportedRpcVersion'))
+        rpc.security_group_rules_for_devices.return_value = {
+            'fake_device': self.fake_device}
+        self.agent.prepare_devices_filter(['fake_device'])
+        rpc.security_group_rules_for_devices.assert_called_once_with(
+            None, ['fake_device'])
+        self.assertFalse(self.agent.use_enhanced_rpc)
+        self.assertFalse(self.firewall.update_security_group_rules.called)
+        self.assertFalse(self.firewall.update_security_group_members.called)
+        self.firewall.prepare_port_filter.assert_called_once_with(
+            self.fake_device)
+
+    def test_prepare_devices_filter_rpc_error(self):
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices_v2.side_effect = (
+            rpc_common.Timeout)
+        self.assertRaises(rpc_common.Timeout,
+                          self.agent.prepare_devices_filter, ['fake_device'])
+        self.assertTrue(self.agent.use_enhanced_rpc)
+
+    def test_security_groups_member_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid2',
+                                                   'fake_sgid3'])
+        self.agent.plugin_rpc.security_group_member_ips.\
+            assert_called_once_with(None, ['fake_sgid2'])
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.sg_members['fake_sgid2'])
+        # The port chains are left untouched
+        self.assertFalse(self.firewall.update_port_filter.called)
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_info_for_devices_v2.called)
+
+    def test_security_groups_member_not_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid1',
+                                                   'fake_sgid3'])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_member_ips.called)
+        self.assertFalse(self.firewall.update_security_group_members.called)
+
+    def test_security_groups_rule_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid1',
+                                                 'fake_sgid3'])
+        self.agent.plugin_rpc.security_group_info_for_groups.\
+            assert_called_once_with(None, ['fake_sgid1'])
+        sg_members = self.sg_members['fake_sgid2']
+        self.firewall.assert_has_calls(
+            [call.defer_apply(),
+             call.update_security_group_rules('fake_sgid1',
+                                              self.sg_rules['fake_sgid1']),
+             call.update_security_group_members('fake_sgid2', sg_members)])
+        # The ports are not fetched again
+        self.assertFalse(self.firewall.update_port_filter.called)
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_info_for_devices_v2.called)
+
+    def test_security_groups_rule_not_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid3'])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_info_for_groups.called)
+        self.assertFalse(self.firewall.update_security_group_rules.called)
+
+    def test_refresh_firewall(self):
+        self.agent.refresh_firewall()
+        self.firewall.update_security_group_rules.assert_has_calls(
+            [call('fake_sgid1', self.sg_rules['fake_sgid1']),
+             call('fake_sgid2', [])], any_order=True)
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.sg_members['fake_sgid2'])
+        self.firewall.update_port_filter.assert_called_once_with(
+            self.fake_device)
+
+
+class SecurityGroupAgentEnhancedRpcWithDeferredRefreshTestCase(
+    SecurityGroupAgentEnhancedRpcTestCase):
+
+    def setUp(self):
+        super(SecurityGroupAgentEnhancedRpcWithDeferredRefreshTestCase,
+              self).setUp(defer_refresh_firewall=True)
+
+    def test_security_groups_member_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_member_ips.called)
+        self.assertEqual(set(['fake_sgid2']),
+                         self.agent.sg_members_to_refresh)
+        self.assertTrue(self.agent.firewall_refresh_needed())
+
+        self.agent.setup_port_filters(set(), set())
+        self.agent.plugin_rpc.security_group_member_ips.\
+            assert_called_once_with(None, ['fake_sgid2'])
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.sg_members['fake_sgid2'])
+        self.assertFalse(self.firewall.update_port_filter.called)
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_security_groups_member_not_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid1'])
+        self.assertFalse(self.agent.sg_members_to_refresh)
+
+    def test_security_groups_rule_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_info_for_groups.called)
+        self.assertEqual(set(['fake_sgid1']),
+                         self.agent.sg_rules_to_refresh)
+        self.assertTrue(self.agent.firewall_refresh_needed())
+
+        self.agent.setup_port_filters(set(), set())
+        self.agent.plugin_rpc.security_group_info_for_groups.\
+            assert_called_once_with(None, ['fake_sgid1'])
+        self.firewall.update_security_group_rules.assert_called_once_with(
+            'fake_sgid1', self.sg_rules['fake_sgid1'])
+        self.assertFalse(self.firewall.update_port_filter.called)
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_security_groups_rule_not_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid3'])
+        self.assertFalse(self.agent.sg_rules_to_refresh)
+
+
 class SecurityGroupAgentRpcWithDeferredRefreshTestCase(
     SecurityGroupAgentRpcTestCase):
 
@@ -1436,6 +1737,9 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
             'firewall_driver',
             self.FIREWALL_DRIVER,
             group='SECURITYGROUP')
+        # These tests cover the rules generated for each member of the
+        # remote security groups
+        cfg.CONF.set_override('enable_ipset', False, group='SECURITYGROUP')
 
         self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
         self.agent.context = None
@@ -1445,6 +1749,10 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
         self.agent.init_firewall(defer_refresh_firewall=defer_refresh_firewall)
 
         self.iptables = self.agent.firewall.iptables
+        # These tests compare the complete rulesets, which are only
+        # generated by full applies.
+        mock.patch.object(self.iptables, '_can_apply_incrementally',
+                          return_value=False).start()
         self.iptables_execute = mock.patch.object(self.iptables,
                                                   "execute").start()
         self.iptables_execute_return_values = []
@@ -604,6 +604,53 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_json_iter(self):
+        servers = [dict(id=i, name=u'\u7f51\u7edc') for i in range(100)]
+        input_dict = dict(servers=wsgi.StreamedCollection(servers),
+                          servers_links=[])
+        serializer = wsgi.JSONDictSerializer()
+        serializer.CHUNK_SIZE = 256
+        chunks = list(serializer.serialize_iter(input_dict))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(wsgi.JSONDeserializer().deserialize(''.join(chunks)),
+                         {'body': dict(servers=servers, servers_links=[])})
+
+    def test_json_iter_empty_collection(self):
+        input_dict = dict(servers=wsgi.StreamedCollection([]))
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_iter(input_dict))
+
+        self.assertEqual(result, '{"servers": []}')
+
+    def test_json_iter_item_error_truncates(self):
+        def servers():
+            yield dict(id='1')
+            raise ValueError()
+
+        input_dict = dict(servers=wsgi.StreamedCollection(servers()))
+        serializer = wsgi.JSONDictSerializer()
+        with mock.patch.object(wsgi, 'LOG') as log:
+            result = ''.join(serializer.serialize_iter(input_dict))
+
+        self.assertEqual(result, '{"servers": [{"id": "1"}')
+        self.assertTrue(log.exception.called)
+
+    def test_streamed_collection_first_item_error(self):
+        def servers():
+            raise ValueError()
+            yield
+
+        self.assertRaises(ValueError, wsgi.StreamedCollection, servers())
+
+    def test_xml_iter(self):
+        input_dict = dict(servers=wsgi.StreamedCollection([dict(id='1')]))
+        serializer = wsgi.XMLDictSerializer(xmlns="fooXMLNS")
+        result = serializer.serialize_iter(input_dict)
+
+        self.assertEqual(result, [serializer.serialize(
+            dict(servers=[dict(id='1')]))])
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
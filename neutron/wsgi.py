@@ -21,6 +21,7 @@ Utility methods for working with WSGI servers
 from __future__ import print_function
 
 import errno
+import itertools
 import os
 import socket
 import ssl
@@ -378,12 +379,42 @@ class ActionDispatcher(object):
         raise NotImplementedError()
 
 
+class StreamedCollection(object):
+    """Collection of a response whose items are produced as it is sent.
+
+    The first item is produced when the collection is created, so that
+    the errors it raises are reported before the response starts.
+    """
+
+    def __init__(self, items):
+        self._items = iter(items)
+        self._first = []
+        for item in self._items:
+            self._first.append(item)
+            break
+
+    def __iter__(self):
+        return itertools.chain(self._first, self._items)
+
+
 class DictSerializer(ActionDispatcher):
     """Default request body serialization."""
 
     def serialize(self, data, action='default'):
         return self.dispatch(data, action=action)
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize data into an iterable of strings.
+
+        The values of data may be StreamedCollection instances, which
+        stand for the lists of their items.
+        """
+        if isinstance(data, dict):
+            data = dict((key, list(value)
+                         if isinstance(value, StreamedCollection) else value)
+                        for key, value in data.iteritems())
+        return [self.serialize(data, action)]
+
     def default(self, data):
         return ""
 
@@ -391,11 +422,62 @@ class DictSerializer(ActionDispatcher):
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    # Size of the chunks of the responses serialized by serialize_iter
+    CHUNK_SIZE = 65536
+
     def default(self, data):
         def sanitizer(obj):
             return unicode(obj)
         return jsonutils.dumps(data, default=sanitizer)
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize data into an iterable of JSON chunks.
+
+        The items of the StreamedCollection instances in data are
+        produced and serialized one at a time, so that the whole document
+        is never held in memory. An error raised by an item after the
+        first one truncates the document, the response having started.
+        """
+        if action != 'default' or not isinstance(data, dict):
+            return super(JSONDictSerializer, self).serialize_iter(data,
+                                                                  action)
+        return self._chunks(self._iter_json(data))
+
+    def _iter_json(self, data):
+        yield '{'
+        for i, (key, value) in enumerate(data.iteritems()):
+            if i:
+                yield ', '
+            yield self.default(key) + ': '
+            if isinstance(value, StreamedCollection):
+                yield '['
+                try:
+                    for j, item in enumerate(value):
+                        if j:
+                            yield ', '
+                        yield self.default(item)
+                except Exception:
+                    LOG.exception(_("Failed to produce an item of %s, "
+                                    "truncating the response"), key)
+                    return
+                yield ']'
+            else:
+                yield self.default(value)
+        yield '}'
+
+    def _chunks(self, parts):
+        chunk = []
+        size = 0
+        for part in parts:
+            chunk.append(part)
+            size += len(part)
+            if size >= self.CHUNK_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield ''.join(chunk)
+
 
 class XMLDictSerializer(DictSerializer):
 